@@ -1,92 +1,326 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pathlib import Path
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-from app.models.schemas import QueryRequest, QueryResponse, ProcessingStatus, SearchResult
-from app.models.documents import Product, Page
+from app.models.schemas import (
+    QueryRequest, QueryResponse, ProcessingStatus, ProcessingJob,
+    BatchQueryRequest, BatchQueryResponse, QueryFilters
+)
+from app.models.payloads import (
+    RenderedResults, render_results, render_query_response, render_batch_response
+)
 from app.services.document_processor import DocumentProcessor
 from app.services.embeddings import EmbeddingService
-from app.services.vector_store import VectorStore
+from app.services.backends.base import MetadataFilter
+from app.services.corpora import Corpus, CorpusRegistry
+from app.services.cache import LRUCache, SingleFlight
+from app.services.batcher import QueryEmbeddingBatcher
+from app.services.jobs import JobManager, IndexingJob
 from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.metrics import metrics
+from app.api.timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 logger = logging.getLogger(__name__)
 
 # Initialize services
 document_processor = DocumentProcessor()
 embedding_service = EmbeddingService()
-vector_store = VectorStore()
+# Each corpus's store, lexical index and indexer are loaded on first use
+corpora = CorpusRegistry(document_processor, embedding_service)
+result_cache = LRUCache(settings.QUERY_RESULT_CACHE_SIZE)
+single_flight = SingleFlight()
+query_batcher = QueryEmbeddingBatcher(embedding_service)
+# Under app.serve, jobs are queued through files for the writer process
+job_manager = JobManager(directory=Path(settings.CHROMADB_DIR) / "jobs" if settings.WORKERS > 1 else None)
 
-@router.post("/process", response_model=ProcessingStatus)
-async def process_documents():
-    """Process all documents in the documents directory and store them in the vector store."""
-    try:
-        # Process documents into chunks
-        chunks: Dict[str, List[str]] = document_processor.process_directory()
-        
-        if not chunks:
-            raise HTTPException(status_code=404, detail="No documents found in the documents directory")
-        
-        # Generate embeddings for each document
-        embeddings = {}
-        for source, documents in chunks.items():
-            embeddings[source] = embedding_service.generate_embeddings(documents)
-        
-        # Reset vector store and add new documents
-        vector_store.reset()
-        vector_store.add_documents(chunks, embeddings)
-        
-        total_chunks = sum(len(chunk_list) for chunk_list in chunks.values())
-        
+# Component counters are read only when /metrics is scraped
+metrics.register("query_embedding_cache", embedding_service.cache_stats)
+metrics.register("embedding_cache", embedding_service.embedding_cache_stats)
+metrics.register("query_result_cache", result_cache.stats)
+metrics.register("single_flight", single_flight.stats)
+metrics.register("lexical", lambda: lexical_stats())
+metrics.register("batcher", query_batcher.stats)
+metrics.register("corpora", corpora.stats)
+
+def lexical_stats() -> Dict[str, int]:
+    """Lexical index counters summed over the loaded corpora."""
+    totals = {"documents": 0, "terms": 0, "served": 0, "fallthrough": 0}
+    for corpus in corpora.loaded():
+        for name, value in corpus.lexical_index.stats().items():
+            if name in totals:
+                totals[name] += value
+    return totals
+
+def run_indexing(job: IndexingJob) -> dict:
+    """Run the indexer for a background job and summarize the outcome."""
+    with corpora.pinned(job.corpus) as corpus:
+        stats = corpus.indexer.run(full=job.full, progress=job.update)
+
+    # Emptying the directory is a valid change once it removed documents
+    if not stats["total_documents"] and not stats["deleted"]:
+        raise ValueError(f"No documents found in {corpus.documents_dir}")
+
+    return ProcessingStatus(
+        status="Documents processed and indexed successfully",
+        **stats
+    ).model_dump()
+
+def run_rollback(job: IndexingJob) -> dict:
+    """Make the previous index version active again for a background job."""
+    with corpora.pinned(job.corpus) as corpus:
+        version = corpus.vector_store.rollback()
+        corpus.lexical_index.refresh(corpus.vector_store.records)
         return ProcessingStatus(
-            total_documents=len(chunks),
-            total_chunks=total_chunks,
-            status="Documents processed and indexed successfully"
-        )
-        
-    except Exception as e:
-        logger.error(f"Error processing documents: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+            status=f"Rolled back to index version {version}",
+            # Source files, as reported by run_indexing
+            total_documents=len(corpus.vector_store.records.sources()),
+            total_chunks=corpus.vector_store.count()
+        ).model_dump()
+
+# Job runners by IndexingJob.action
+JOB_RUNNERS = {"index": run_indexing, "rollback": run_rollback}
+
+def run_job(job: IndexingJob) -> dict:
+    return JOB_RUNNERS[job.action](job)
+
+def refresh_snapshot() -> bool:
+    """Load the index snapshots the writer last published, if they changed."""
+    return corpora.refresh_snapshots()
+
+def corpus_name(name: Optional[str]) -> str:
+    """Resolve a requested corpus name, rejecting unknown corpora."""
+    name = name or settings.DEFAULT_CORPUS
+    if name not in corpora:
+        raise HTTPException(status_code=404, detail=f"Unknown corpus: {name}")
+    return name
+
+async def get_corpus(name: Optional[str]) -> Corpus:
+    """Return the requested corpus, loading it off the event loop on first use."""
+    name = corpus_name(name)
+    corpus = corpora.peek(name)
+    if corpus is None:
+        corpus = await run_blocking(corpora.get, name)
+    corpus.queries += 1
+    return corpus
+
+@router.post("/process", response_model=ProcessingJob, status_code=202)
+async def process_documents(full: bool = False, corpus: Optional[str] = None):
+    """Start indexing a corpus's documents directory in the background.
+
+    Only new or changed documents are re-embedded; pass ``full=true`` to
+    force a complete rebuild. ``corpus`` defaults to the default corpus.
+    Returns a job to poll at ``/process/{job_id}``. Reader workers queue the
+    job for the writer process, which publishes the new index to them when
+    it is done.
+    """
+    name = corpus_name(corpus)
+    if settings.SERVER_ROLE == "reader":
+        job = job_manager.enqueue(full=full, corpus=name)
+    else:
+        job = job_manager.submit(run_indexing, full=full, corpus=name)
+    return job.to_dict()
+
+@router.post("/process/rollback", response_model=ProcessingJob, status_code=202)
+async def rollback_index(corpus: Optional[str] = None):
+    """Swap a corpus's previous index version back in, e.g. after a bad full rebuild.
+
+    Every full rebuild keeps the version it replaced; rolling back twice
+    returns to the newer one. Runs as a job like ``/process``.
+    """
+    name = corpus_name(corpus)
+    if settings.SERVER_ROLE == "reader":
+        job = job_manager.enqueue(action="rollback", corpus=name)
+    else:
+        job = job_manager.submit(run_rollback, action="rollback", corpus=name)
+    return job.to_dict()
+
+@router.get("/process/{job_id}", response_model=ProcessingJob)
+async def processing_status(job_id: str):
+    """Report the status and progress of an indexing job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+def metadata_filter(filters: Optional[QueryFilters]) -> Optional[MetadataFilter]:
+    """Convert request filters into a filter the store can push down."""
+    if filters is None:
+        return None
+    where = MetadataFilter(type=filters.type, source=filters.source, link_prefix=filters.link_prefix)
+    return where if where else None
+
+def lexical_search(corpus: Corpus, query: str, limit: int,
+                   where: Optional[MetadataFilter] = None) -> Optional[List[Dict]]:
+    """Answer a query from the lexical index if it is a confident match."""
+    if not settings.LEXICAL_FAST_PATH or not corpus.lexical_index.may_serve(query):
+        return None
+    return corpus.lexical_index.search(query, limit, where)
+
+def fuse_results(corpus: Corpus, query: str, results: List[Dict]) -> List[Dict]:
+    """Blend BM25 scores into vector results when fusion is enabled."""
+    if settings.LEXICAL_FUSION_WEIGHT <= 0:
+        return results
+    return corpus.lexical_index.fuse(query, results, settings.LEXICAL_FUSION_WEIGHT)
+
+async def search(corpus: Corpus, query: str, limit: int,
+                 where: Optional[MetadataFilter] = None) -> RenderedResults:
+    """Search the lexical index, falling back to embedding and vector search.
+
+    Only the title check runs on the event loop; queries that pass it are
+    scored in the executor.
+    """
+    results = None
+    with metrics.stage("lexical"):
+        if settings.LEXICAL_FAST_PATH and corpus.lexical_index.may_serve(query):
+            results = await run_blocking(corpus.lexical_index.search, query, limit, where)
+    if results is None:
+        # Generate embedding for query, micro-batched with concurrent queries
+        with metrics.stage("embed"):
+            query_embedding = await query_batcher.embed(query)
+
+        # Query vector store
+        results = await run_blocking(corpus.vector_store.query, query_embedding, limit, where)
+        results = fuse_results(corpus, query, results)
+    with metrics.stage("format"):
+        return render_results(results)
+
+def search_batch(targets: List[Corpus], queries: List[str], limits: List[int],
+                 wheres: Optional[List[Optional[MetadataFilter]]] = None) -> List[RenderedResults]:
+    """Embed several queries in one batch and search them with one store call per corpus and filter.
+
+    Queries with a confident lexical match are answered without embedding.
+    """
+    wheres = wheres or [None] * len(queries)
+    with metrics.stage("lexical"):
+        results = [
+            lexical_search(corpus, query, limit, where)
+            for corpus, query, limit, where in zip(targets, queries, limits, wheres)
+        ]
+    pending = [i for i, r in enumerate(results) if r is None]
+    if pending:
+        with metrics.stage("embed"):
+            query_embeddings = embedding_service.generate_query_embeddings([queries[i] for i in pending])
+        metrics.batches.inc("query_batch")
+        # Queries sharing a corpus and filter are searched together
+        groups: Dict[tuple, List[int]] = {}
+        for position, i in enumerate(pending):
+            groups.setdefault((targets[i].name, wheres[i].key if wheres[i] else None), []).append(position)
+        for positions in groups.values():
+            corpus, where = targets[pending[positions[0]]], wheres[pending[positions[0]]]
+            found = corpus.vector_store.query_batch(
+                [query_embeddings[p] for p in positions], [limits[pending[p]] for p in positions], where
+            )
+            for p, r in zip(positions, found):
+                results[pending[p]] = fuse_results(corpus, queries[pending[p]], r)
+    with metrics.stage("format"):
+        return [render_results(r) for r in results]
+
+def json_response(body: str) -> Response:
+    """Send a pre-rendered JSON body as is, skipping response model validation."""
+    return Response(content=body.encode("utf-8"), media_type="application/json")
+
+def result_cache_key(corpus: Corpus, query: str, limit: int, where: Optional[MetadataFilter] = None) -> tuple:
+    """Key query results on the corpus, normalized query, limit, filter and index generations."""
+    return (
+        corpus.name, embedding_service.normalize_query(query), limit, where.key if where else None,
+        *corpus.generations
+    )
 
 @router.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
-    """Query the vector store for relevant document chunks."""
+    """Query the vector store for relevant document chunks.
+
+    ``corpus`` picks the corpus to search (the default one when omitted);
+    ``filters`` scope the search to a document type, source or link prefix.
+    Results are cached per (corpus, normalized query, limit, filter, index generation), and
+    identical queries that arrive while one is being computed share its result.
+    Cached results are already rendered JSON, spliced into the response body.
+    """
+    corpus = await get_corpus(request.corpus)
     try:
-        # Generate embedding for query
-        query_embedding = embedding_service.generate_query_embedding(request.query)
-        
-        # Query vector store
-        results = vector_store.query(
-            query_embedding=query_embedding,
-            limit=request.limit or settings.MAX_RESULTS
-        )
-        
-        # Convert results to appropriate model types
-        formatted_results = []
-        for result in results:
-            model_data = result["data"]
-            if result["type"] == "product":
-                document = Product(**model_data)
-            elif result["type"] == "page":
-                document = Page(**model_data)
-            else:
-                continue
-
-            formatted_results.append(
-                SearchResult(
-                    source=result["source"],
-                    score=result["score"],
-                    document=document
-                )
-            )
+        limit = request.limit or settings.MAX_RESULTS
+        where = metadata_filter(request.filters)
+        key = result_cache_key(corpus, request.query, limit, where)
+
+        results = result_cache.get(key)
+        if results is None:
+            async def compute() -> RenderedResults:
+                computed = await search(corpus, request.query, limit, where)
+                result_cache.put(key, computed)
+                return computed
+
+            results = await single_flight.do(key, compute)
+
+        return json_response(render_query_response(request.query, results))
 
-        return QueryResponse(
-            query=request.query,
-            results=formatted_results,
-            total_results=len(formatted_results)
-        )
-        
     except Exception as e:
         logger.error(f"Error querying documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def query_documents_batch(request: BatchQueryRequest):
+    """Run several queries with one batched encode and one vector store call.
+
+    Queries already in the result cache are answered from it; the rest are
+    searched together and returned in request order.
+    """
+    targets = [await get_corpus(q.corpus) for q in request.queries]
+    try:
+        limits = [q.limit or settings.MAX_RESULTS for q in request.queries]
+        wheres = [metadata_filter(q.filters) for q in request.queries]
+        keys = [
+            result_cache_key(corpus, q.query, limit, where)
+            for corpus, q, limit, where in zip(targets, request.queries, limits, wheres)
+        ]
+        results = [result_cache.get(key) for key in keys]
+
+        # Search each distinct uncached (query, limit, filter) once
+        pending = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                pending.setdefault(key, i)
+        if pending:
+            indexes = list(pending.values())
+            computed = await run_blocking(
+                search_batch,
+                [targets[i] for i in indexes],
+                [request.queries[i].query for i in indexes],
+                [limits[i] for i in indexes],
+                [wheres[i] for i in indexes]
+            )
+            for key, found in zip(pending, computed):
+                result_cache.put(key, found)
+            by_key = dict(zip(pending, computed))
+            results = [r if r is not None else by_key[key] for key, r in zip(keys, results)]
+
+        return json_response(render_batch_response(
+            (q.query, r) for q, r in zip(request.queries, results)
+        ))
+
+    except Exception as e:
+        logger.error(f"Error querying documents in batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Report hit/miss/eviction counters for the query caches and the embedding cache."""
+    return {
+        "query_embedding": embedding_service.cache_stats(),
+        "embedding": embedding_service.embedding_cache_stats(),
+        "query_result": result_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "lexical": lexical_stats(),
+    }
+
+@router.get("/corpora")
+async def corpus_stats():
+    """Report each configured corpus: its index size, memory and queries when loaded."""
+    return {"corpora": corpora.corpus_stats(), **corpora.stats()}
+
+@router.get("/batcher/stats")
+async def batcher_stats():
+    """Report queue depth and batch counters for query micro-batching."""
+    return query_batcher.stats()
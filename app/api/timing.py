@@ -0,0 +1,101 @@
+import cProfile
+import functools
+import inspect
+import logging
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap an async endpoint to time it and mark when it returned.
+
+    The mark lets the route measure the response validation and
+    serialization that FastAPI runs after the endpoint.
+    """
+    # Routes are copied when routers are included; wrap each endpoint once
+    if not inspect.iscoroutinefunction(endpoint) or getattr(endpoint, "__timed__", False):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with metrics.stage("endpoint"):
+            result = await endpoint(*args, **kwargs)
+        timings = metrics.current_request()
+        if timings is not None:
+            timings.endpoint_end = time.perf_counter()
+        return result
+
+    wrapper.__timed__ = True
+    return wrapper
+
+
+def write_profile(profiler: cProfile.Profile, request: Request) -> Optional[str]:
+    """Dump a request profile to PROFILE_DIR, returning the file name."""
+    try:
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = request.url.path.strip("/").replace("/", "_") or "root"
+        name = f"{time.time_ns()}-{path}.prof"
+        profiler.dump_stats(str(directory / name))
+        return name
+    except Exception as e:
+        logger.error(f"Error writing request profile: {str(e)}")
+        return None
+
+
+class TimedRoute(APIRoute):
+    """API route that reports per-stage timings for every request.
+
+    Stage timers run while the request is handled (including on the
+    inference pool) add to the request's timings, which are returned in a
+    ``Server-Timing`` header together with the endpoint, serialization and
+    total times, and recorded in the ``/metrics`` histograms.
+
+    With ``PROFILE_REQUESTS`` enabled, a request sent with ``X-Profile: 1``
+    is run under cProfile and the trace is written to ``PROFILE_DIR``; its
+    file name is returned in ``X-Profile-Trace``. The profiler sees every
+    coroutine the event loop runs meanwhile, so profile an otherwise idle
+    server.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            timings, token = metrics.start_request()
+            profiler = None
+            if settings.PROFILE_REQUESTS and request.headers.get("x-profile") == "1":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                metrics.end_request(token)
+            end = time.perf_counter()
+            if timings.endpoint_end is not None:
+                metrics.observe("serialize", end - timings.endpoint_end)
+                timings.add("serialize", end - timings.endpoint_end)
+            timings.add("total", end - start)
+            metrics.request_seconds.observe(route, end - start)
+            response.headers["Server-Timing"] = timings.server_timing()
+            if profiler is not None:
+                trace = write_profile(profiler, request)
+                if trace is not None:
+                    response.headers["X-Profile-Trace"] = trace
+            return response
+
+        return timed_handler
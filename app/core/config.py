@@ -1,17 +1,52 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     APP_NAME: str = "RAG API"
     APP_VERSION: str = "1.0.0"
-    DOCUMENTS_DIR: str = "documents"
-    CHUNK_SIZE: int = 1000
-    CHUNK_OVERLAP: int = 200
+    DOCUMENTS_DIR: str = "documents"  # documents of the default corpus
+    DEFAULT_CORPUS: str = "default"  # corpus of requests that name none; indexed into CHROMADB_DIR
+    CORPORA: Dict[str, str] = {}  # more corpora as name: documents dir (JSON), indexed under CHROMADB_DIR/corpora
+    CORPUS_MEMORY_BUDGET_MB: int = 0  # evict least recently used corpora beyond this estimate; 0 keeps all loaded
+    CHUNK_SIZE: int = 1000  # max tokens per chunk; also capped by the model's sequence limit
+    CHUNK_OVERLAP: int = 200  # tokens shared by adjacent chunks, scaled down with the chunk size
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BACKEND: str = "torch"  # inference backend: "torch" or "onnx" (ONNX Runtime, exported once)
+    EMBEDDING_QUANTIZE: bool = False  # dynamic int8 quantization of the model's linear layers
+    EMBEDDING_THREADS: int = 0  # intra-op threads per encode; 0 keeps the runtime default
+    MODEL_CACHE_DIR: str = ".models"  # where ONNX exports are cached
+    EMBEDDING_CACHE_DIR: str = ".embedding_cache"  # document vectors by text hash, shared by every store
+    EMBEDDING_CACHE_MAX_MB: int = 1024  # compact the cache file beyond this size; 0 disables the cache
+    MODEL_WARMUP: bool = True
+    INDEX_BATCH_SIZE: int = 1024
+    PARSE_WORKERS: int = 0  # processes for YAML parsing; 0 or 1 parses in-process
+    INFERENCE_WORKERS: int = 4
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096
+    QUERY_LOWERCASE: Optional[bool] = None  # lowercase queries for cache keys; unset follows the tokenizer once loaded
+    QUERY_RESULT_CACHE_SIZE: int = 1024
+    QUERY_BATCH_WINDOW_MS: float = 3.0
+    QUERY_BATCH_MAX_SIZE: int = 32
     CHROMADB_DIR: str = ".chromadb"
+    VECTOR_BACKEND: str = "chroma"  # "chroma", "numpy", "ivf" or "mmap"
+    INDEX_DTYPE: str = "int8"  # storage type of the mmap index: "int8" or "float16"
+    IVF_NLIST: int = 0  # number of IVF cells; 0 picks sqrt(N) at training time
+    IVF_NPROBE: int = 16  # cells scanned per query; higher means better recall, slower queries
+    IVF_MIN_TRAIN_SIZE: int = 10000  # below this many vectors the IVF backend searches exactly
+    LEXICAL_FAST_PATH: bool = True  # answer confident title matches from the BM25 index without the model
+    LEXICAL_MIN_MARGIN: float = 1.5  # top BM25 score must beat the runner-up by this factor to be confident
+    LEXICAL_MAX_POSTINGS: int = 20000  # query terms in more documents only re-score documents rarer terms matched
+    LEXICAL_FUSION_WEIGHT: float = 0.0  # weight of BM25 in the scores of vector results; 0 disables fusion
+    TRACE_SAMPLE_RATE: float = 0.01  # share of queries whose per-result debug traces are logged
+    PROFILE_REQUESTS: bool = False  # allow cProfile traces of requests sent with an "X-Profile: 1" header
+    PROFILE_DIR: str = ".profiles"  # where request profiles are written
     MAX_RESULTS: int = 5
+    MAX_BATCH_QUERIES: int = 64
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = 1  # HTTP worker processes started by "python -m app.serve"
+    SERVER_ROLE: str = "standalone"  # set by app.serve: "reader" workers serve queries, one "writer" indexes
+    SNAPSHOT_POLL_SECONDS: float = 1.0  # how often reader workers check for a newer index snapshot
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,26 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Bounded pool for blocking model inference and vector store calls, so they
+# never run on the event loop and cannot oversubscribe the CPU.
+inference_executor = ThreadPoolExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    thread_name_prefix="inference"
+)
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call on the inference pool and await its result.
+
+    The call runs in a copy of the caller's context, so request-scoped
+    state such as stage timings follows it onto the pool thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(inference_executor, functools.partial(context.run, fn, *args, **kwargs))
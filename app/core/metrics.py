@@ -0,0 +1,185 @@
+"""Process-wide latency histograms and counters in Prometheus text format.
+
+Stage timers feed one histogram labelled by stage and, while a request is
+being handled, that request's own timings (reported in its Server-Timing
+header). Component counters that already exist as ``stats()`` methods are
+registered as collectors and read only when ``/metrics`` is scraped, so
+the hot path pays for nothing but the timers.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds of the batch size and queue depth histogram buckets
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def sampled(rate: Optional[float] = None) -> bool:
+    """Whether to emit a sampled trace, with probability ``TRACE_SAMPLE_RATE``."""
+    rate = settings.TRACE_SAMPLE_RATE if rate is None else rate
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def trace_enabled(logger: logging.Logger) -> bool:
+    """Whether per-item debug tracing should run: DEBUG is on and this call is sampled."""
+    return logger.isEnabledFor(logging.DEBUG) and sampled()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a single label."""
+
+    def __init__(self, name: str, help: str, label: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label value -> (per-bucket counts, sum, count)
+        self._series: Dict[str, Tuple[List[int], float, int]] = {}
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            counts, total, count = self._series.get(label_value) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._series[label_value] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for value, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {total}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a single label."""
+
+    def __init__(self, name: str, help: str, label: str):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._lock = threading.Lock()
+        self._values: Dict[str, float] = {}
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value: str) -> float:
+        return self._values.get(label_value, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for value, amount in sorted(values.items()):
+            lines.append(f'{self.name}{{{self.label}="{value}"}} {amount}')
+        return lines
+
+
+class RequestTimings:
+    """Stage durations of one request, summed when a stage runs more than once."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.endpoint_end: Optional[float] = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Format as a Server-Timing header value with durations in milliseconds."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages.items())
+
+
+_request_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class Metrics:
+    """Registry of the service's histograms, counters and stats collectors."""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "rag_stage_duration_seconds", "Time spent per pipeline stage.", "stage"
+        )
+        self.request_seconds = Histogram(
+            "rag_request_duration_seconds", "Time to handle an API request, including serialization.", "route"
+        )
+        self.documents = Counter(
+            "rag_indexed_documents_total", "Documents (or chunks) handled by indexing stage.", "stage"
+        )
+        self.batches = Counter("rag_batches_total", "Batches processed by kind.", "kind")
+        self.batch_size = Histogram("rag_batch_size", "Items per batch by kind.", "kind", buckets=SIZE_BUCKETS)
+        self.queue_depth = Histogram(
+            "rag_queue_depth", "Items waiting in a queue, observed as each one is enqueued.", "queue",
+            buckets=SIZE_BUCKETS
+        )
+        self._collectors: Dict[str, Callable[[], Dict[str, object]]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record a stage duration, also in the current request's timings if any."""
+        self.stage_seconds.observe(stage, seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as a pipeline stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def start_request(self) -> Tuple[RequestTimings, contextvars.Token]:
+        """Begin collecting stage timings for the request handled in this context."""
+        timings = RequestTimings()
+        return timings, _request_timings.set(timings)
+
+    def end_request(self, token: contextvars.Token) -> None:
+        _request_timings.reset(token)
+
+    def current_request(self) -> Optional[RequestTimings]:
+        return _request_timings.get()
+
+    def register(self, name: str, stats: Callable[[], Dict[str, object]]) -> None:
+        """Expose a component's numeric ``stats()`` values as ``rag_<name>_<key>`` gauges."""
+        self._collectors[name] = stats
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in (self.stage_seconds, self.request_seconds, self.documents, self.batches,
+                       self.batch_size, self.queue_depth):
+            lines.extend(metric.render())
+        for name, stats in self._collectors.items():
+            for key, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric_name = f"rag_{name}_{key}"
+                lines.append(f"# TYPE {metric_name} gauge")
+                lines.append(f"{metric_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
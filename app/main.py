@@ -1,8 +1,13 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router
+from fastapi.responses import PlainTextResponse
+from app.api.routes import router, embedding_service, query_batcher, refresh_snapshot, corpora
 from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.metrics import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -10,11 +15,41 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+logger = logging.getLogger(__name__)
+
+async def warm_up_model():
+    """Load the shared embedding model and run a warm-up encode."""
+    try:
+        await run_blocking(embedding_service.warm_up)
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {str(e)}")
+
+async def watch_snapshots():
+    """Pick up the index snapshots the writer process publishes."""
+    while True:
+        await asyncio.sleep(settings.SNAPSHOT_POLL_SECONDS)
+        try:
+            await run_blocking(refresh_snapshot)
+        except Exception as e:
+            logger.error(f"Error loading index snapshot: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model in the background so /health answers while it warms up
+    warm_up = asyncio.create_task(warm_up_model()) if settings.MODEL_WARMUP else None
+    watcher = asyncio.create_task(watch_snapshots()) if settings.SERVER_ROLE == "reader" else None
+    yield
+    for task in (warm_up, watcher):
+        if task is not None:
+            task.cancel()
+    await query_batcher.close()
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="RAG API for document search and retrieval using vector embeddings"
+    description="RAG API for document search and retrieval using vector embeddings",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -32,7 +67,20 @@ app.include_router(router, prefix="/api")
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "version": settings.APP_VERSION}
+    """Liveness plus readiness: ``ready`` is true once the model is warmed up."""
+    return {
+        "status": "healthy",
+        "version": settings.APP_VERSION,
+        "ready": embedding_service.is_ready,
+        "embedding_backend": embedding_service.registry.describe(),
+        "role": settings.SERVER_ROLE,
+        "corpora": corpora.names(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms and counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,68 @@
+"""Pre-rendered JSON for query responses.
+
+Each document's public JSON (its ``Product`` or ``Page`` model) is rendered
+once when its record is stored, and responses are assembled by splicing
+those fragments with the per-request query and scores. The output is
+byte-for-byte what FastAPI produces for ``QueryResponse`` and
+``BatchQueryResponse``: Pydantic's field order, and Starlette's
+``JSONResponse`` encoding (UTF-8, no ASCII escaping, compact separators).
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.models.documents import Page, Product
+
+DOCUMENT_MODELS = {"product": Product, "page": Page}
+
+# The string encoder json.dumps uses with ensure_ascii=False (C-accelerated)
+encode_string = json.encoder.encode_basestring
+
+# A rendered result list: the JSON array and the number of results in it
+RenderedResults = Tuple[str, int]
+
+
+def dumps(value: Any) -> str:
+    """Encode a value exactly as Starlette's JSONResponse does."""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+
+
+def render_document(doc_type: str, data: Dict[str, Any]) -> Optional[str]:
+    """Render a document's public JSON, or None for an unknown type."""
+    model = DOCUMENT_MODELS.get(doc_type)
+    if model is None:
+        return None
+    return dumps(model(**data).model_dump(mode="json"))
+
+
+def render_score(score: float) -> str:
+    """Encode a relevance score, clamped to the [0, 1] range the schema declares."""
+    return float.__repr__(min(max(float(score), 0.0), 1.0))
+
+
+def render_results(results: Iterable[Dict[str, Any]]) -> RenderedResults:
+    """Render store or lexical results as the ``results`` array of a query response.
+
+    Results carry a pre-rendered ``fragment`` when they come from the
+    record store; others are rendered here. Unknown types are skipped.
+    """
+    items: List[str] = []
+    for result in results:
+        fragment = result.get("fragment") or render_document(result["type"], result["data"])
+        if fragment is None:
+            continue
+        items.append(
+            '{"source":' + encode_string(result["source"])
+            + ',"score":' + render_score(result["score"])
+            + ',"document":' + fragment + "}"
+        )
+    return "[" + ",".join(items) + "]", len(items)
+
+
+def render_query_response(query: str, results: RenderedResults) -> str:
+    """Render a ``QueryResponse`` body."""
+    array, total = results
+    return '{"query":' + encode_string(query) + ',"results":' + array + ',"total_results":' + str(total) + "}"
+
+
+def render_batch_response(responses: Iterable[Tuple[str, RenderedResults]]) -> str:
+    """Render a ``BatchQueryResponse`` body from (query, results) pairs."""
+    return '{"results":[' + ",".join(render_query_response(q, r) for q, r in responses) + "]}"
@@ -1,10 +1,19 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Union
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, Union
 from app.models.documents import Product, Page
+from app.core.config import settings
+
+class QueryFilters(BaseModel):
+    type: Optional[Literal["product", "page"]] = Field(None, description="Only return documents of this type")
+    source: Optional[str] = Field(None, description="Only return documents from this source file")
+    link_prefix: Optional[str] = Field(None, description="Only return documents whose link starts with this prefix")
 
 class QueryRequest(BaseModel):
     query: str = Field(..., min_length=1, description="The search query text")
     limit: Optional[int] = Field(5, ge=1, le=20, description="Maximum number of results to return")
+    filters: Optional[QueryFilters] = Field(None, description="Restrict results to matching documents")
+    corpus: Optional[str] = Field(None, description="Corpus to search; the default corpus when omitted")
 
 class SearchResult(BaseModel):
     source: str = Field(..., description="The source document path")
@@ -16,7 +25,35 @@ class QueryResponse(BaseModel):
     results: List[SearchResult] = Field(..., description="List of relevant documents")
     total_results: int = Field(..., ge=0, description="Total number of results found")
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(
+        ..., min_length=1, max_length=settings.MAX_BATCH_QUERIES,
+        description="The queries to run, answered in the same order"
+    )
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse] = Field(..., description="One response per query, in request order")
+
 class ProcessingStatus(BaseModel):
-    total_documents: int = Field(..., ge=0, description="Total number of documents processed")
+    total_documents: int = Field(..., ge=0, description="Number of source files in the index")
     total_chunks: int = Field(..., ge=0, description="Total number of chunks created")
     status: str = Field(..., description="Processing status message")
+    added: int = Field(0, ge=0, description="Documents embedded for the first time")
+    updated: int = Field(0, ge=0, description="Documents re-embedded because their content changed")
+    deleted: int = Field(0, ge=0, description="Documents removed from the index")
+    unchanged: int = Field(0, ge=0, description="Documents skipped because their content is unchanged")
+
+class ProcessingJob(BaseModel):
+    job_id: str = Field(..., description="Identifier to poll for job status")
+    status: str = Field(..., description="One of queued, running, completed or failed")
+    action: str = Field("index", description="index, or rollback to the previous index version")
+    corpus: str = Field(settings.DEFAULT_CORPUS, description="Corpus the job indexes or rolls back")
+    full: bool = Field(False, description="Whether this is a full rebuild")
+    created_at: datetime = Field(..., description="When the job was submitted")
+    started_at: Optional[datetime] = Field(None, description="When the job started running")
+    finished_at: Optional[datetime] = Field(None, description="When the job completed or failed")
+    progress: Dict[str, int] = Field(
+        default_factory=dict, description="Documents parsed, embedded, written and deleted so far"
+    )
+    result: Optional[ProcessingStatus] = Field(None, description="Final indexing summary once completed")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
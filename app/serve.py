@@ -0,0 +1,169 @@
+"""Multi-worker server with a single index writer: ``python -m app.serve``.
+
+With ``WORKERS`` above 1, a supervisor process binds the listening socket
+and loads the app, the default corpus's index snapshot and (on the torch
+backend) the embedding model once, then forks:
+
+- ``WORKERS`` HTTP workers (role ``reader``) sharing the socket. They open
+  every store read-only, queue ``/api/process`` jobs for the writer, and
+  load each index snapshot the writer publishes for the corpora they have
+  loaded without restarting.
+- One writer process (role ``writer``) that runs the queued indexing and
+  rollback jobs and is the only process writing the store.
+
+Multi-worker mode needs the mmap backend. Its vector index, like the record
+segment with the lexical postings, is a file every worker maps, so a
+snapshot is held once in the page cache however many workers serve it, and
+reloading one costs a header read. The numpy and ivf backends read each
+snapshot into private memory, which after the first reindex costs every
+worker a full copy of the index. Chroma keeps per-process state and cannot
+reload at all.
+
+``benchmarks/workers.py`` measures it: with 4 workers on 50k documents a
+reader's anonymous memory after a full reindex stays at 60-160 MB (42 MB
+before any index), which is the interpreter plus the float32 blocks its
+concurrent scans upcast, not a copy of the index.
+
+Workers that exit unexpectedly are restarted; SIGTERM or SIGINT stops them
+all (the writer finishes its current job first). With ``WORKERS=1`` the
+app runs in-process with uvicorn as before.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Dict
+
+import uvicorn
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Backends whose snapshots workers map and share rather than copy
+SNAPSHOT_BACKENDS = ("mmap",)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload() -> None:
+    """Build the services, load the default corpus and the model before forking."""
+    import app.main  # noqa: F401
+    from app.api.routes import corpora
+    # Other corpora load in each worker on first use
+    corpora.get(settings.DEFAULT_CORPUS)
+    if settings.EMBEDDING_BACKEND == "torch":
+        # Load the weights only: running the model starts thread pools that
+        # do not survive fork, so each worker warms up on its own. ONNX
+        # Runtime starts its threads when loading, so it loads per worker.
+        from app.services.model_registry import model_registry
+        model_registry.get(settings.EMBEDDING_MODEL)
+    # Keep the garbage collector from writing to (and so copying) the
+    # preloaded objects in every worker
+    gc.freeze()
+
+
+def run_reader(sock: socket.socket) -> None:
+    settings.SERVER_ROLE = "reader"
+    from app.main import app
+    from app.api.routes import corpora, refresh_snapshot
+    corpora.open_read_only()
+    # A restarted worker starts from the supervisor's (older) snapshot
+    refresh_snapshot()
+    uvicorn.Server(uvicorn.Config(app)).run(sockets=[sock])
+
+
+def run_writer() -> None:
+    settings.SERVER_ROLE = "writer"
+    from app.api.routes import job_manager, refresh_snapshot, run_job
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    refresh_snapshot()
+    interrupted = job_manager.recover()
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted indexing jobs as failed")
+    logger.info(f"Index writer {os.getpid()} waiting for jobs")
+    while not stop.is_set():
+        try:
+            job_manager.run_queued(run_job)
+        except Exception as e:
+            logger.error(f"Error running queued indexing jobs: {str(e)}")
+        stop.wait(settings.SNAPSHOT_POLL_SECONDS)
+
+
+def spawn(target: Callable[[], None]) -> int:
+    """Fork a process running target and return its PID."""
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        target()
+    except BaseException:
+        logger.exception("Worker failed")
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main() -> None:
+    if settings.WORKERS <= 1:
+        uvicorn.run("app.main:app", host=settings.HOST, port=settings.PORT)
+        return
+    if settings.VECTOR_BACKEND not in SNAPSHOT_BACKENDS:
+        sys.exit(
+            f"WORKERS={settings.WORKERS} needs a backend whose snapshots workers share "
+            f"({', '.join(SNAPSHOT_BACKENDS)}), not {settings.VECTOR_BACKEND}"
+        )
+
+    sock = bind_socket(settings.HOST, settings.PORT)
+    preload()
+    targets: Dict[int, Callable[[], None]] = {}
+    for _ in range(settings.WORKERS):
+        targets[spawn(lambda: run_reader(sock))] = lambda: run_reader(sock)
+    targets[spawn(run_writer)] = run_writer
+    logger.info(f"Serving on {settings.HOST}:{settings.PORT} with {settings.WORKERS} workers and 1 writer")
+
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(targets):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while targets:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        target = targets.pop(pid, None)
+        if target is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {status}; restarting it")
+        time.sleep(1.0)  # do not spin if workers die on start
+        targets[spawn(target)] = target
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
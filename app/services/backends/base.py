@@ -0,0 +1,97 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+
+class VectorBackend(ABC):
+    """Storage and nearest-neighbour search for document vectors.
+
+    Query hits are dicts with ``id``, ``metadata``, ``document`` and
+    ``distance``, where distance is the squared L2 distance (for normalized
+    vectors ``2 - 2 * cosine``) and hits are ordered nearest first.
+    """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+               documents: List[str]) -> None:
+        """Insert new records or replace existing ones with the same ID."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        """Delete records by ID; unknown IDs are ignored."""
+
+    @abstractmethod
+    def query(self, query_embeddings: List[np.ndarray], n_results: int,
+              where: Optional["MetadataFilter"] = None) -> List[List[Dict[str, Any]]]:
+        """Return the nearest ``n_results`` hits for each query embedding.
+
+        With ``where``, only records matching the filter are returned, and
+        up to ``n_results`` of them even when most records do not match.
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Delete all records."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return the number of stored records."""
+
+    def flush(self) -> None:
+        """Persist pending writes; backends that write through need not override."""
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes of vectors held in memory, for memory budgets."""
+        return 0
+
+    def reload(self) -> bool:
+        """Pick up what another process flushed, returning whether anything changed.
+
+        Only called on read-only replicas, which never have unflushed
+        writes. Backends whose files cannot be shared this way return False.
+        """
+        return False
+
+    @abstractmethod
+    def scan(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        """Yield all records as ``(ids, embeddings, metadatas)`` batches.
+
+        The set of IDs is snapshotted up front, so records may be rewritten
+        while scanning.
+        """
+
+    def rewrite(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+        """Replace records wholesale, dropping their documents and any metadata keys not given."""
+        self.upsert(ids, embeddings, metadatas, [None] * len(ids))
+
+
+class MetadataFilter:
+    """Scope for a query: match on document type, source and link prefix.
+
+    Unset fields match everything. Backends push the filter into their
+    search so that only matching records compete for the top results.
+    """
+
+    def __init__(self, type: Optional[str] = None, source: Optional[str] = None,
+                 link_prefix: Optional[str] = None):
+        self.type = type
+        self.source = source
+        self.link_prefix = link_prefix
+
+    @property
+    def key(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Hashable identity of the filter, for caches."""
+        return (self.type, self.source, self.link_prefix)
+
+    def __bool__(self) -> bool:
+        return any(value is not None for value in self.key)
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Whether a record's metadata (type, source and link) is in scope."""
+        if self.type is not None and metadata.get("type") != self.type:
+            return False
+        if self.source is not None and metadata.get("source") != self.source:
+            return False
+        if self.link_prefix is not None and not str(metadata.get("link", "")).startswith(self.link_prefix):
+            return False
+        return True
@@ -0,0 +1,136 @@
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.services.backends.base import MetadataFilter, VectorBackend
+
+
+class ChromaBackend(VectorBackend):
+    """Vector backend on a persistent ChromaDB collection."""
+
+    def __init__(self, persist_dir: str, collection_name: str = "documents"):
+        self.client = chromadb.PersistentClient(
+            path=persist_dir,
+            settings=ChromaSettings(
+                allow_reset=True,
+                is_persistent=True
+            )
+        )
+        # Embeddings are always precomputed by EmbeddingService, so the
+        # collection needs no embedding function (and no second model copy)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=None
+        )
+        # Cached on the write path so count and memory_bytes never query the collection
+        self._count = self.collection.count()
+        self._dim: Optional[int] = None
+        if self._count:
+            sample = self.collection.get(limit=1, include=["embeddings"])
+            self._dim = len(sample["embeddings"][0])
+
+    @staticmethod
+    def drop(persist_dir: str, collection_name: str) -> None:
+        """Delete a collection and its vectors."""
+        client = chromadb.PersistentClient(
+            path=persist_dir,
+            settings=ChromaSettings(allow_reset=True, is_persistent=True)
+        )
+        try:
+            client.delete_collection(collection_name)
+        except Exception:
+            # Already gone (ValueError or NotFoundError depending on the version)
+            pass
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+               documents: List[str]) -> None:
+        self.collection.upsert(
+            # Chroma rejects an all-None documents list; omit it instead
+            documents=documents if any(d is not None for d in documents) else None,
+            embeddings=embeddings,
+            ids=ids,
+            metadatas=metadatas
+        )
+        self._dim = np.asarray(embeddings).shape[-1]
+        self._count = self.collection.count()
+
+    def delete(self, ids: List[str]) -> None:
+        if ids:
+            self.collection.delete(ids=ids)
+            self._count = self.collection.count()
+
+    def query(self, query_embeddings: List[np.ndarray], n_results: int,
+              where: Optional[MetadataFilter] = None) -> List[List[Dict[str, Any]]]:
+        if not where or where.link_prefix is None:
+            return self._query(query_embeddings, n_results, where)
+
+        # Chroma has no prefix operator, so type and source are pushed into
+        # the where clause and the link prefix is applied to a widening fetch
+        total = self.collection.count()
+        fetch = n_results
+        while True:
+            hits = self._query(query_embeddings, fetch, where)
+            matched = [[hit for hit in query_hits if where.matches(hit["metadata"])] for query_hits in hits]
+            if fetch >= total or all(len(m) >= n_results for m in matched):
+                return [m[:n_results] for m in matched]
+            fetch = min(fetch * 4, total)
+
+    def _query(self, query_embeddings: List[np.ndarray], n_results: int,
+               where: Optional[MetadataFilter]) -> List[List[Dict[str, Any]]]:
+        results = self.collection.query(
+            query_embeddings=list(query_embeddings),
+            n_results=n_results,
+            where=self._where(where),
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                {"id": doc_id, "metadata": metadata, "document": document, "distance": distance}
+                for doc_id, metadata, document, distance in zip(
+                    results["ids"][i], results["metadatas"][i],
+                    results["documents"][i], results["distances"][i]
+                )
+            ]
+            for i in range(len(query_embeddings))
+        ]
+
+    @staticmethod
+    def _where(where: Optional[MetadataFilter]) -> Optional[Dict[str, Any]]:
+        """Translate the type and source filters into a Chroma where clause."""
+        if not where:
+            return None
+        clauses = [
+            {field: {"$eq": value}}
+            for field, value in (("type", where.type), ("source", where.source))
+            if value is not None
+        ]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def scan(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        ids = self.collection.get(include=[])["ids"]
+        for start in range(0, len(ids), batch_size):
+            result = self.collection.get(ids=ids[start:start + batch_size], include=["embeddings", "metadatas"])
+            yield result["ids"], np.asarray(result["embeddings"], dtype=np.float32), result["metadatas"]
+
+    def rewrite(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+        # Chroma upserts merge metadata and keep the old document, so the
+        # records are deleted and added back
+        self.collection.delete(ids=ids)
+        self.collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas)
+
+    def reset(self) -> None:
+        # Get all document IDs
+        result = self.collection.get()
+        if result and result['ids']:
+            # Delete all documents by their IDs
+            self.collection.delete(ids=result['ids'])
+        self._count = 0
+
+    def count(self) -> int:
+        return self._count
+
+    def memory_bytes(self) -> int:
+        # The HNSW index keeps every vector in memory; its graph links are not counted
+        return self._count * (self._dim or 0) * 4
@@ -0,0 +1,205 @@
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.services.backends.base import MetadataFilter
+from app.services.backends.numpy_backend import NumpyBackend
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means on float32 rows, returning the centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    vector_norms = np.einsum("ij,ij->i", vectors, vectors)
+    for _ in range(iterations):
+        distances = (
+            vector_norms[:, None]
+            + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            - 2.0 * (vectors @ centroids.T)
+        )
+        assignments = distances.argmin(axis=1)
+        counts = np.bincount(assignments, minlength=k)
+        nonempty = counts > 0
+        # Sum each cluster's members with one sorted reduceat pass
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), size=len(empty), replace=False)]
+    return centroids
+
+
+class IVFBackend(NumpyBackend):
+    """Approximate search with an inverted-file (IVF) index over the NumPy store.
+
+    Vectors are partitioned into ``nlist`` k-means cells. A query is compared
+    with the centroids and only rows in the ``nprobe`` nearest cells are
+    scored exactly. Upserts are assigned to their nearest cell as they arrive;
+    the centroids are (re)trained on ``flush`` once the store first reaches
+    ``min_train_size`` rows and again whenever it has grown ``retrain_growth``
+    times since the last training. Until trained, queries are exact.
+
+    Filtered queries score only matching rows in the probed cells; when
+    those hold fewer than ``n_results`` matches, every matching row is
+    scored so a scoped query still fills its page.
+    """
+
+    def __init__(self, path: Path, nlist: int = 0, nprobe: int = 16, min_train_size: int = 10000,
+                 train_iterations: int = 10, retrain_growth: float = 2.0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.train_iterations = train_iterations
+        self.retrain_growth = retrain_growth
+        self.ivf_path = Path(path).with_suffix(".ivf.npz")
+        self._centroids = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._trained_size = 0
+        super().__init__(path)
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def _load(self) -> None:
+        super()._load()
+        self._centroids = None
+        self._trained_size = 0
+        self._assignments = np.zeros(len(self._matrix), dtype=np.int32)
+        if not self.ivf_path.exists():
+            return
+        with np.load(self.ivf_path, allow_pickle=False) as data:
+            centroids = data["centroids"]
+            assignments = data["assignments"]
+            trained_size = int(data["trained_size"])
+        if len(assignments) != self._size:
+            self.logger.warning(f"Ignoring IVF state in {self.ivf_path}: it does not match the vectors")
+            return
+        self._centroids = centroids
+        self._assignments[:self._size] = assignments
+        self._trained_size = trained_size
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        super()._reserve(rows, dim)
+        if len(self._assignments) < len(self._matrix):
+            assignments = np.zeros(len(self._matrix), dtype=np.int32)
+            assignments[:self._size] = self._assignments[:self._size]
+            self._assignments = assignments
+
+    def _nearest_cells(self, vectors: np.ndarray, n: int) -> np.ndarray:
+        distances = (
+            np.einsum("ij,ij->i", self._centroids, self._centroids)[None, :]
+            - 2.0 * (vectors @ self._centroids.T)
+        )
+        if n >= len(self._centroids):
+            return np.argsort(distances, axis=1)
+        return np.argpartition(distances, n - 1, axis=1)[:, :n]
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+               documents: List[str]) -> None:
+        super().upsert(ids, embeddings, metadatas, documents)
+        with self._lock:
+            if self.trained:
+                rows = np.array([self._rows[doc_id] for doc_id in ids], dtype=np.int64)
+                self._assignments[rows] = self._nearest_cells(self._matrix[rows], 1)[:, 0]
+
+    def _move_row(self, src: int, dst: int) -> None:
+        super()._move_row(src, dst)
+        self._assignments[dst] = self._assignments[src]
+
+    def train(self) -> None:
+        """Fit centroids on a sample of the stored vectors and reassign every row.
+
+        k-means runs on a copy of the sample outside the lock, so queries
+        keep being served while the centroids are fitted.
+        """
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return
+            nlist = min(self.nlist or max(1, int(np.sqrt(size))), size)
+            rng = np.random.default_rng(0)
+            # Train on up to 64 points per cell, which is plenty for k-means
+            sample_size = min(size, nlist * 64)
+            sample = self._matrix[np.sort(rng.choice(size, size=sample_size, replace=False))]
+        centroids = kmeans(sample, nlist, self.train_iterations).astype(np.float32)
+
+        with self._lock:
+            self._centroids = centroids
+            for start in range(0, self._size, 65536):
+                stop = min(start + 65536, self._size)
+                self._assignments[start:stop] = self._nearest_cells(self._matrix[start:stop], 1)[:, 0]
+            self._trained_size = self._size
+            self._dirty = True
+        self.logger.info(f"Trained IVF index with {nlist} cells on {sample_size} of {size} vectors")
+
+    def query(self, query_embeddings: List[np.ndarray], n_results: int,
+              where: Optional[MetadataFilter] = None) -> List[List[Dict[str, Any]]]:
+        if not self.trained:
+            return super().query(query_embeddings, n_results, where)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        with self._lock:
+            size = self._size
+            probes = self._nearest_cells(queries, min(self.nprobe, len(self._centroids)))
+            assignments = self._assignments[:size]
+            mask = self._mask(where) if where else None
+            hits = []
+            probed = np.zeros(len(self._centroids), dtype=bool)
+            for query, cells in zip(queries, probes):
+                probed[:] = False
+                probed[cells] = True
+                in_cells = probed[assignments]
+                if mask is not None:
+                    in_cells &= mask
+                    if in_cells.sum() < n_results:
+                        in_cells = mask
+                rows = np.flatnonzero(in_cells)
+                if len(rows) == 0:
+                    hits.append([])
+                    continue
+                distances = self._sq_norms[rows] + float(query @ query) - 2.0 * (self._matrix[rows] @ query)
+                k = min(n_results, len(rows))
+                top = np.argpartition(distances, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+                top = top[np.argsort(distances[top], kind="stable")]
+                hits.append([self._hit(rows[i], distances[i]) for i in top])
+            return hits
+
+    def memory_bytes(self) -> int:
+        centroids = self._centroids.nbytes if self.trained else 0
+        return super().memory_bytes() + self._assignments.nbytes + centroids
+
+    def reset(self) -> None:
+        with self._lock:
+            self._centroids = None
+            self._trained_size = 0
+        super().reset()
+
+    def flush(self) -> None:
+        """Train or retrain the IVF cells if due, then persist vectors and cells."""
+        size = self._size
+        if size >= self.min_train_size and (
+            not self.trained or size >= self._trained_size * self.retrain_growth
+        ):
+            self.train()
+        dirty = self._dirty
+        super().flush()
+        with self._lock:
+            if not dirty:
+                return
+            if self.trained:
+                tmp_path = self.ivf_path.with_name(self.ivf_path.name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    np.savez(
+                        f,
+                        centroids=self._centroids,
+                        assignments=self._assignments[:self._size],
+                        trained_size=np.int64(self._trained_size)
+                    )
+                os.replace(tmp_path, self.ivf_path)
+            elif self.ivf_path.exists():
+                self.ivf_path.unlink()
@@ -0,0 +1,390 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import numpy as np
+from app.services.backends.base import MetadataFilter, VectorBackend
+from app.services.backends.mmap_index import MmapIndex, dequantize, quantize, write_index
+
+# Rows copied per block when rewriting the index file
+WRITE_BLOCK_ROWS = 65536
+
+
+class MmapBackend(VectorBackend):
+    """Vector backend served from a quantized, memory-mapped index file.
+
+    Queries scan the mapped file directly, so opening the index costs only a
+    header read and the vectors are shared through the page cache. Writes
+    are staged in memory (and are visible to queries immediately) until
+    ``flush`` rewrites the file and atomically replaces it.
+
+    Staged vectors are appended to one preallocated matrix, so queries score
+    them with a single matrix product. Rows replaced or deleted before the
+    flush are masked out, and the flush compacts the matrix.
+
+    Filtered queries pass a row mask into the file scan, so non-matching
+    rows never compete for the top results. Masks are built once per filter
+    and index file.
+    """
+
+    def __init__(self, path: Path, dtype: str = "int8"):
+        self.path = Path(path)
+        self.dtype = dtype
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.index: Optional[MmapIndex] = MmapIndex(self.path) if self.path.exists() else None
+        # Staged writes: row in the staging matrix, metadata and document per ID
+        self._pending: "OrderedDict[str, Tuple[int, Dict[str, Any], Optional[str]]]" = OrderedDict()
+        self._staged = np.empty((0, 0), dtype=np.float32)
+        self._staged_norms = np.empty(0, dtype=np.float32)
+        self._live = np.empty(0, dtype=bool)
+        self._staged_ids: List[Optional[str]] = []
+        self._deleted: Set[str] = set()
+        self._drop_base = False
+        self._base_ids: Optional[Dict[str, int]] = None
+        self._masks: Dict[tuple, np.ndarray] = {}
+        # Rows of the file that staged writes replace or delete, kept up to
+        # date on every write so count is O(1)
+        self._shadowed = 0
+
+    @property
+    def generation(self) -> int:
+        return self.index.generation if self.index is not None else 0
+
+    def _base_rows(self) -> Dict[str, int]:
+        """Map of ID to row in the index file, built lazily on the write path."""
+        if self._base_ids is None:
+            self._base_ids = {}
+            if self.index is not None:
+                for start in range(0, self.index.count, WRITE_BLOCK_ROWS):
+                    stop = min(start + WRITE_BLOCK_ROWS, self.index.count)
+                    for row, record in enumerate(self.index.record_bytes(slice(start, stop)), start):
+                        self._base_ids[json.loads(record)["id"]] = row
+        return self._base_ids
+
+    def _shadow(self, doc_id: str) -> None:
+        """Count a file row the first time a staged write replaces or deletes it (under the lock)."""
+        if doc_id not in self._pending and doc_id not in self._deleted and not self._drop_base:
+            self._shadowed += doc_id in self._base_rows()
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        """Grow the staging matrix geometrically so appends are amortized O(1)."""
+        size = len(self._staged_ids)
+        if self._staged.shape[1] != dim:
+            if size:
+                raise ValueError(f"Embedding dimension {dim} does not match staged dimension {self._staged.shape[1]}")
+            self._staged = np.empty((0, dim), dtype=np.float32)
+        capacity = len(self._staged)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        staged = np.empty((new_capacity, dim), dtype=np.float32)
+        staged[:size] = self._staged[:size]
+        norms = np.empty(new_capacity, dtype=np.float32)
+        norms[:size] = self._staged_norms[:size]
+        live = np.zeros(new_capacity, dtype=bool)
+        live[:size] = self._live[:size]
+        self._staged, self._staged_norms, self._live = staged, norms, live
+
+    def _append(self, ids: List[str], vectors: np.ndarray) -> int:
+        """Append vectors to the staging matrix, returning the first new row (under the lock)."""
+        start = len(self._staged_ids)
+        stop = start + len(ids)
+        self._reserve(stop, vectors.shape[1])
+        self._staged[start:stop] = vectors
+        self._staged_norms[start:stop] = np.einsum("ij,ij->i", vectors, vectors)
+        self._live[start:stop] = True
+        self._staged_ids.extend(ids)
+        return start
+
+    def _unstage(self, doc_id: str) -> None:
+        """Drop the staged write of an ID, masking out its row (under the lock)."""
+        entry = self._pending.pop(doc_id, None)
+        if entry is not None:
+            self._live[entry[0]] = False
+            self._staged_ids[entry[0]] = None
+
+    def _restage(self) -> None:
+        """Compact the staging matrix to the writes still pending (under the lock)."""
+        entries = list(self._pending.items())
+        vectors = self._staged[[row for _, (row, _, _) in entries]]
+        self._staged = np.empty((0, self._staged.shape[1]), dtype=np.float32)
+        self._staged_norms = np.empty(0, dtype=np.float32)
+        self._live = np.empty(0, dtype=bool)
+        self._staged_ids = []
+        self._pending = OrderedDict()
+        if entries:
+            start = self._append([doc_id for doc_id, _ in entries], vectors)
+            for row, (doc_id, (_, metadata, document)) in enumerate(entries, start):
+                self._pending[doc_id] = (row, metadata, document)
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+               documents: List[str]) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        with self._lock:
+            start = self._append(ids, vectors)
+            for row, doc_id, metadata, document in zip(range(start, start + len(ids)), ids, metadatas, documents):
+                self._shadow(doc_id)
+                self._unstage(doc_id)
+                self._pending[doc_id] = (row, metadata, document)
+                self._deleted.discard(doc_id)
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                self._shadow(doc_id)
+                self._unstage(doc_id)
+                self._deleted.add(doc_id)
+
+    def reload(self) -> bool:
+        """Map the index file again if another process replaced it."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if self._pending or self._deleted or self._drop_base:
+                return False
+            if self.index is not None and (self.index.stat.st_ino, self.index.stat.st_mtime_ns) == (
+                stat.st_ino, stat.st_mtime_ns
+            ):
+                return False
+        index = MmapIndex(self.path)
+        with self._lock:
+            self.index = index
+            self._masks.clear()
+            self._base_ids = None
+        self.logger.info(f"Reloaded {index.count} vectors from {self.path} (generation {index.generation})")
+        return True
+
+    def _mask(self, index: MmapIndex, where: MetadataFilter) -> np.ndarray:
+        """Row mask of the index file for a filter, cached until the file is replaced."""
+        key = (id(index), where.key)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = index.filter_mask(where)
+            with self._lock:
+                if self.index is index:
+                    self._masks[key] = mask
+        return mask
+
+    def _is_shadowed(self, doc_id: str) -> bool:
+        return doc_id in self._pending or doc_id in self._deleted
+
+    def query(self, query_embeddings: List[np.ndarray], n_results: int,
+              where: Optional[MetadataFilter] = None) -> List[List[Dict[str, Any]]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        with self._lock:
+            index = None if self._drop_base else self.index
+
+        # Nearest file rows per query, as (record, distance)
+        found: List[List[Tuple[Dict[str, Any], float]]] = [[] for _ in range(len(queries))]
+        if index is not None and index.count:
+            mask = self._mask(index, where) if where else None
+            # Rows shadowed by staged writes are dropped, so queries left
+            # short ask for four times as many until the file runs out
+            fetch = n_results
+            remaining = list(range(len(queries)))
+            while remaining:
+                rows, distances = index.search(queries[remaining], fetch, mask)
+                short = []
+                for i, query_rows, query_distances in zip(remaining, rows, distances):
+                    found[i] = [(index.record(int(row)), distance) for row, distance in zip(query_rows, query_distances)]
+                with self._lock:
+                    for i, query_rows in zip(remaining, rows):
+                        kept = sum(not self._is_shadowed(record["id"]) for record, _ in found[i])
+                        if kept < n_results and len(query_rows) == fetch:
+                            short.append(i)
+                remaining = short
+                fetch *= 4
+
+        hits: List[List[Dict[str, Any]]] = [[] for _ in range(len(queries))]
+        with self._lock:
+            if (None if self._drop_base else self.index) is not index:
+                swapped = True
+            else:
+                swapped = False
+                for i in range(len(queries)):
+                    for record, distance in found[i]:
+                        if not self._is_shadowed(record["id"]):
+                            record["distance"] = float(max(distance, 0.0))
+                            hits[i].append(record)
+                if self._pending:
+                    self._query_staged(queries, n_results, where, hits)
+        if swapped:
+            # A flush moved staged writes into a new file mid-query
+            return self.query(query_embeddings, n_results, where)
+        for i in range(len(hits)):
+            hits[i] = sorted(hits[i], key=lambda hit: hit["distance"])[:n_results]
+        return hits
+
+    def _query_staged(self, queries: np.ndarray, n_results: int, where: Optional[MetadataFilter],
+                      hits: List[List[Dict[str, Any]]]) -> None:
+        """Add the nearest staged writes to each query's hits (under the lock)."""
+        size = len(self._staged_ids)
+        live = self._live[:size]
+        if where:
+            live = live & np.fromiter(
+                (doc_id is not None and where.matches(self._pending[doc_id][1]) for doc_id in self._staged_ids),
+                dtype=bool, count=size
+            )
+        k = min(n_results, int(live.sum()))
+        if k == 0:
+            return
+        distances = (
+            self._staged_norms[:size][None, :]
+            + np.einsum("ij,ij->i", queries, queries)[:, None]
+            - 2.0 * (queries @ self._staged[:size].T)
+        )
+        distances[:, ~live] = np.inf
+        if k < size:
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(size), (len(queries), size))
+        for i, rows in enumerate(top):
+            for row in rows:
+                if not live[row]:
+                    continue
+                doc_id = self._staged_ids[row]
+                _, metadata, document = self._pending[doc_id]
+                hits[i].append({
+                    "id": doc_id,
+                    "metadata": metadata,
+                    "document": document,
+                    "distance": float(max(distances[i, row], 0.0)),
+                })
+
+    def _staged_writes(self) -> List[Tuple[str, Tuple[np.ndarray, Dict[str, Any], Optional[str]]]]:
+        """(ID, (vector, metadata, document)) of every staged write, copied (under the lock)."""
+        entries = list(self._pending.items())
+        vectors = self._staged[[row for _, (row, _, _) in entries]]
+        return [
+            (doc_id, (vector, metadata, document))
+            for vector, (doc_id, (_, metadata, document)) in zip(vectors, entries)
+        ]
+
+    def scan(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        with self._lock:
+            index = None if self._drop_base else self.index
+            pending = self._staged_writes()
+            excluded = self._deleted | set(self._pending)
+        if index is not None:
+            for start in range(0, index.count, batch_size):
+                stop = min(start + batch_size, index.count)
+                records = [json.loads(r) for r in index.record_bytes(slice(start, stop))]
+                keep = [i for i, record in enumerate(records) if record["id"] not in excluded]
+                if not keep:
+                    continue
+                scales = index.scales[start:stop][keep] if index.scales is not None else None
+                yield (
+                    [records[i]["id"] for i in keep],
+                    dequantize(np.asarray(index.vectors[start:stop])[keep], scales),
+                    [records[i]["metadata"] for i in keep],
+                )
+        for start in range(0, len(pending), batch_size):
+            block = pending[start:start + batch_size]
+            yield (
+                [doc_id for doc_id, _ in block],
+                np.stack([vector for _, (vector, _, _) in block]),
+                [metadata for _, (_, metadata, _) in block],
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._restage()
+            self._deleted.clear()
+            self._drop_base = True
+            self._shadowed = 0
+        self.flush()
+
+    def count(self) -> int:
+        with self._lock:
+            if self.index is None or self._drop_base:
+                return len(self._pending)
+            return self.index.count - self._shadowed + len(self._pending)
+
+    def memory_bytes(self) -> int:
+        # Mapped pages live in the page cache, but a full scan touches all of them
+        with self._lock:
+            mapped = self.index.stat.st_size if self.index is not None else 0
+            return mapped + self._staged.nbytes + self._staged_norms.nbytes
+
+    def _blocks(self, index: Optional[MmapIndex], excluded: Set[str],
+                pending: List[Tuple[str, Tuple[np.ndarray, Dict[str, Any], Optional[str]]]]
+                ) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray], List[bytes]]]:
+        """Yield the surviving rows of the current file followed by pending rows."""
+        if index is not None:
+            for start in range(0, index.count, WRITE_BLOCK_ROWS):
+                stop = min(start + WRITE_BLOCK_ROWS, index.count)
+                records = index.record_bytes(slice(start, stop))
+                keep = np.array([json.loads(r)["id"] not in excluded for r in records], dtype=bool)
+                if not keep.any():
+                    continue
+                # Surviving rows are copied without re-quantizing
+                values = np.asarray(index.vectors[start:stop])[keep]
+                scales = np.asarray(index.scales[start:stop])[keep] if index.scales is not None else None
+                yield values, scales, [r for r, k in zip(records, keep) if k]
+        for start in range(0, len(pending), WRITE_BLOCK_ROWS):
+            block = pending[start:start + WRITE_BLOCK_ROWS]
+            values, scales = quantize(np.stack([vector for _, (vector, _, _) in block]), self.dtype)
+            records = [
+                json.dumps({"id": doc_id, "metadata": metadata, "document": document},
+                           ensure_ascii=False).encode("utf-8")
+                for doc_id, (_, metadata, document) in block
+            ]
+            yield values, scales, records
+
+    def flush(self) -> None:
+        """Rewrite the index file with all staged writes and swap it in.
+
+        The file is written from a snapshot outside the lock, so queries keep
+        being served from the old file and the staged writes meanwhile.
+        """
+        with self._lock:
+            if not self._pending and not self._deleted and not self._drop_base:
+                return
+            drop_base = self._drop_base
+            index = None if drop_base else self.index
+            entries = list(self._pending.items())
+            pending = self._staged_writes()
+            deleted = set(self._deleted)
+            excluded = deleted | set(self._pending)
+            base = self._base_rows() if index is not None else {}
+
+        if index is not None and index.dtype != self.dtype:
+            raise ValueError(f"Index {self.path} is {index.dtype}, configured for {self.dtype}")
+        count = len(pending)
+        if index is not None:
+            count += index.count - sum(1 for doc_id in excluded if doc_id in base)
+        if pending:
+            dim = len(pending[0][1][0])
+        else:
+            dim = index.dim if index is not None else 0
+
+        write_index(
+            self.path, dim, self.dtype, self._blocks(index, excluded, pending),
+            count=count, generation=self.generation + 1
+        )
+
+        with self._lock:
+            self.index = MmapIndex(self.path)
+            self._masks.clear()
+            # Drop only the writes that made it into the new file
+            for doc_id, entry in entries:
+                if self._pending.get(doc_id) is entry:
+                    del self._pending[doc_id]
+            self._restage()
+            self._deleted -= deleted
+            if drop_base:
+                self._drop_base = False
+            self._base_ids = None
+            # Writes staged while the file was written now shadow its rows
+            self._shadowed = 0
+            if self._pending or self._deleted:
+                base = self._base_rows()
+                self._shadowed = sum(1 for doc_id in self._deleted | set(self._pending) if doc_id in base)
+        self.logger.info(f"Wrote {count} {self.dtype} vectors to {self.path}")
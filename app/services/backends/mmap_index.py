@@ -0,0 +1,231 @@
+"""Quantized, memory-mapped on-disk vector index format.
+
+Layout of an index file::
+
+    b"RAGIDX01"                 8-byte magic
+    <uint64 little-endian>      length of the JSON header
+    <JSON header>               version, dtype, count, dim, generation and the
+                                (offset, dtype, shape) of every section
+    <sections>                  each aligned to 64 bytes:
+        vectors   count x dim   int8 (per-row scaled) or float16
+        scales    count         float32, int8 only: row = vectors * scale
+        sq_norms  count         float32 squared norm of each dequantized row
+        offsets   count + 1     uint64 byte offsets into the records blob
+        records   bytes         one UTF-8 JSON object per row (id, metadata, document)
+
+Every section is opened with ``np.memmap``, so opening an index reads only
+the header. Pages are loaded on demand and shared through the OS page cache
+between all processes that map the same file.
+"""
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+MAGIC = b"RAGIDX01"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+SEARCH_BLOCK_ROWS = 8192
+DTYPES = ("int8", "float16")
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Quantize float32 rows, returning the stored values and per-row scales (int8 only)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unsupported index dtype: {dtype}")
+
+
+def dequantize(values: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """Convert stored rows back to float32."""
+    rows = values.astype(np.float32)
+    if scales is not None:
+        rows *= scales[:, None]
+    return rows
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_index(path: Path, dim: int, dtype: str, rows: Iterable[Tuple[np.ndarray, Optional[np.ndarray], List[bytes]]],
+                count: int, generation: int = 0) -> None:
+    """Atomically write an index file.
+
+    ``rows`` yields blocks of ``(values, scales, records)`` that are already
+    quantized to ``dtype``; records are encoded JSON objects. Blocks are
+    written as they arrive, so memory use is bounded by the block size.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported index dtype: {dtype}")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    value_dtype = np.dtype(np.int8 if dtype == "int8" else np.float16)
+    sections = {"vectors": (value_dtype, (count, dim))}
+    if dtype == "int8":
+        sections["scales"] = (np.dtype(np.float32), (count,))
+    sections["sq_norms"] = (np.dtype(np.float32), (count,))
+    sections["offsets"] = (np.dtype(np.uint64), (count + 1,))
+
+    # Reserve generous room for the header so section offsets can be fixed
+    # before the record blob size is known.
+    header_reserve = 4096
+    offset = _align(len(MAGIC) + 8 + header_reserve)
+    layout = {}
+    for name, (section_dtype, shape) in sections.items():
+        layout[name] = [offset, section_dtype.str, list(shape)]
+        offset = _align(offset + section_dtype.itemsize * int(np.prod(shape)))
+    records_offset = offset
+
+    with open(tmp_path, "w+b") as f:
+        f.truncate(records_offset)
+        maps = {
+            name: np.memmap(f, dtype=np.dtype(spec[1]), mode="r+", offset=spec[0], shape=tuple(spec[2]))
+            for name, spec in layout.items() if int(np.prod(spec[2])) > 0
+        }
+        f.seek(records_offset)
+        row = 0
+        blob_size = 0
+        offsets = maps["offsets"]
+        offsets[0] = 0
+        for values, scales, records in rows:
+            n = len(records)
+            if n == 0:
+                continue
+            maps["vectors"][row:row + n] = values
+            if scales is not None:
+                maps["scales"][row:row + n] = scales
+            dense = dequantize(values, scales)
+            maps["sq_norms"][row:row + n] = np.einsum("ij,ij->i", dense, dense)
+            for record in records:
+                f.write(record)
+                blob_size += len(record)
+                row += 1
+                offsets[row] = blob_size
+        if row != count:
+            raise ValueError(f"Expected {count} rows, got {row}")
+        for section in maps.values():
+            section.flush()
+        del maps, offsets
+
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "dtype": dtype,
+            "count": count,
+            "dim": dim,
+            "generation": generation,
+            "sections": layout,
+            "records": [records_offset, blob_size],
+        }).encode("utf-8")
+        if len(header) > header_reserve:
+            raise ValueError("Index header too large")
+        f.seek(0)
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class MmapIndex:
+    """Read-only view of an index file backed by ``np.memmap``."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not an index file: {self.path}")
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size).decode("utf-8"))
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index version {header['version']} in {self.path}")
+        self.dtype = header["dtype"]
+        self.count = header["count"]
+        self.dim = header["dim"]
+        self.generation = header.get("generation", 0)
+        self.stat = os.stat(self.path)
+
+        sections = {}
+        for name, (offset, section_dtype, shape) in header["sections"].items():
+            if int(np.prod(shape)) == 0:
+                sections[name] = np.empty(tuple(shape), dtype=np.dtype(section_dtype))
+            else:
+                sections[name] = np.memmap(
+                    self.path, dtype=np.dtype(section_dtype), mode="r", offset=offset, shape=tuple(shape)
+                )
+        self.vectors = sections["vectors"]
+        self.scales = sections.get("scales")
+        self.sq_norms = sections["sq_norms"]
+        self.offsets = sections["offsets"]
+        records_offset, records_size = header["records"]
+        self.records = (
+            np.memmap(self.path, dtype=np.uint8, mode="r", offset=records_offset, shape=(records_size,))
+            if records_size else np.empty(0, dtype=np.uint8)
+        )
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Decode the JSON record (id, metadata, document) stored for a row."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.records[start:end].tobytes().decode("utf-8"))
+
+    def filter_mask(self, where: Any) -> np.ndarray:
+        """Boolean mask of the rows whose metadata matches a filter."""
+        mask = np.zeros(self.count, dtype=bool)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, self.count)
+            for row, record in enumerate(self.record_bytes(slice(start, stop)), start):
+                mask[row] = where.matches(json.loads(record)["metadata"])
+        return mask
+
+    def record_bytes(self, rows: slice) -> List[bytes]:
+        """Return the encoded records for a contiguous range of rows."""
+        offsets = self.offsets[rows.start:rows.stop + 1].astype(np.int64)
+        blob = self.records[offsets[0]:offsets[-1]].tobytes()
+        base = offsets[0]
+        return [blob[a - base:b - base] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def search(self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k by squared L2 distance over the dequantized rows.
+
+        Rows are scanned in fixed-size blocks, so only one block is ever
+        upcast to float32. Rows where ``mask`` is False are never returned.
+        Returns (rows, distances) arrays of shape (len(queries), k), nearest
+        first.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        k = min(k, self.count if mask is None else int(mask.sum()))
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, self.count)
+            block = np.asarray(self.vectors[start:stop], dtype=np.float32)
+            dots = queries @ block.T
+            if self.scales is not None:
+                dots *= self.scales[start:stop][None, :]
+            distances = query_norms + self.sq_norms[start:stop][None, :] - 2.0 * dots
+            if mask is not None:
+                distances[:, ~mask[start:stop]] = np.inf
+            rows = np.broadcast_to(np.arange(start, stop), distances.shape)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            best_distances = np.concatenate([best_distances, distances], axis=1)
+            if best_rows.shape[1] > k:
+                keep = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_distances = np.take_along_axis(best_distances, keep, axis=1)
+        order = np.argsort(best_distances, axis=1, kind="stable")
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_distances, order, axis=1)
@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.services.backends.base import MetadataFilter, VectorBackend
+
+
+class NumpyBackend(VectorBackend):
+    """In-memory exact search over a contiguous float32 matrix.
+
+    Embeddings live in one preallocated row-major matrix, so a query is a
+    single matrix product followed by an ``argpartition`` top-k. Records are
+    kept in arrays parallel to the matrix rows; deletes move the last row
+    into the freed slot. The index is persisted to a single ``.npz`` file on
+    ``flush`` and loaded back on construction.
+
+    Filtered queries mask out non-matching rows before the top-k, so they
+    cost one matrix product like unfiltered ones. The row mask of each
+    filter is built once and cached until the next write.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._documents: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._dirty = False
+        self._masks: Dict[tuple, np.ndarray] = {}
+        self._file_key: Optional[Tuple[int, int]] = None
+        if self.path.exists():
+            self._load()
+
+    def _stat_key(self) -> Optional[Tuple[int, int]]:
+        """Identity of the index file, which every flush replaces."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self) -> None:
+        self._file_key = self._stat_key()
+        with np.load(self.path, allow_pickle=False) as data:
+            matrix = np.ascontiguousarray(data["embeddings"], dtype=np.float32)
+            records = json.loads(data["records"].tobytes().decode("utf-8"))
+        self._matrix = matrix
+        self._size = len(matrix)
+        self._sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        self._ids = records["ids"]
+        self._metadatas = records["metadatas"]
+        self._documents = records["documents"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._masks = {}
+        self.logger.info(f"Loaded {self._size} vectors from {self.path}")
+
+    def reload(self) -> bool:
+        """Load the index file again if another process replaced it."""
+        with self._lock:
+            key = self._stat_key()
+            if self._dirty or key is None or key == self._file_key:
+                return False
+            self._load()
+            return True
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        """Grow the matrix geometrically so appends are amortized O(1)."""
+        if self._matrix.shape[1] != dim:
+            if self._size:
+                raise ValueError(f"Embedding dimension {dim} does not match index dimension {self._matrix.shape[1]}")
+            self._matrix = np.empty((0, dim), dtype=np.float32)
+        capacity = len(self._matrix)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        matrix = np.empty((new_capacity, dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms = np.empty(new_capacity, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._matrix, self._sq_norms = matrix, sq_norms
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+               documents: List[str]) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        with self._lock:
+            self._reserve(self._size + len(ids), vectors.shape[1])
+            for doc_id, vector, metadata, document in zip(ids, vectors, metadatas, documents):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._metadatas.append(metadata)
+                    self._documents.append(document)
+                else:
+                    self._metadatas[row] = metadata
+                    self._documents[row] = document
+                self._matrix[row] = vector
+                self._sq_norms[row] = float(vector @ vector)
+            self._dirty = True
+            self._masks.clear()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    # Move the last record into the freed row
+                    self._move_row(last, row)
+                self._ids.pop()
+                self._metadatas.pop()
+                self._documents.pop()
+                self._size = last
+            self._dirty = True
+            self._masks.clear()
+
+    def _move_row(self, src: int, dst: int) -> None:
+        """Copy the record at row src over row dst."""
+        moved_id = self._ids[src]
+        self._matrix[dst] = self._matrix[src]
+        self._sq_norms[dst] = self._sq_norms[src]
+        self._ids[dst] = moved_id
+        self._metadatas[dst] = self._metadatas[src]
+        self._documents[dst] = self._documents[src]
+        self._rows[moved_id] = dst
+
+    def _mask(self, where: MetadataFilter) -> np.ndarray:
+        """Boolean mask of the rows matching a filter, cached until the next write."""
+        mask = self._masks.get(where.key)
+        if mask is None:
+            mask = np.fromiter(
+                (where.matches(metadata) for metadata in self._metadatas[:self._size]),
+                dtype=bool, count=self._size
+            )
+            self._masks[where.key] = mask
+        return mask
+
+    def query(self, query_embeddings: List[np.ndarray], n_results: int,
+              where: Optional[MetadataFilter] = None) -> List[List[Dict[str, Any]]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        with self._lock:
+            size = self._size
+            mask = self._mask(where) if where else None
+            candidates = int(mask.sum()) if mask is not None else size
+            if candidates == 0:
+                return [[] for _ in range(len(queries))]
+            k = min(n_results, candidates)
+            # Squared L2 distance, matching Chroma's default "l2" space
+            distances = (
+                self._sq_norms[:size][None, :]
+                + np.einsum("ij,ij->i", queries, queries)[:, None]
+                - 2.0 * (queries @ self._matrix[:size].T)
+            )
+            if mask is not None:
+                distances[:, ~mask] = np.inf
+            if k < size:
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(size), (len(queries), size))
+            hits = []
+            for i, rows in enumerate(top):
+                rows = rows[np.argsort(distances[i, rows], kind="stable")]
+                hits.append([self._hit(row, distances[i, row]) for row in rows])
+            return hits
+
+    def _hit(self, row: int, distance: float) -> Dict[str, Any]:
+        return {
+            "id": self._ids[row],
+            "metadata": self._metadatas[row],
+            "document": self._documents[row],
+            "distance": float(max(distance, 0.0)),
+        }
+
+    def scan(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        with self._lock:
+            ids = list(self._ids[:self._size])
+        for start in range(0, len(ids), batch_size):
+            with self._lock:
+                batch = [doc_id for doc_id in ids[start:start + batch_size] if doc_id in self._rows]
+                rows = [self._rows[doc_id] for doc_id in batch]
+                embeddings = self._matrix[rows].copy()
+                metadatas = [self._metadatas[row] for row in rows]
+            # Yield outside the lock so the caller can write while scanning
+            yield batch, embeddings, metadatas
+
+    def reset(self) -> None:
+        with self._lock:
+            self._size = 0
+            self._ids, self._metadatas, self._documents = [], [], []
+            self._rows = {}
+            self._dirty = True
+            self._masks.clear()
+        self.flush()
+
+    def count(self) -> int:
+        return self._size
+
+    def memory_bytes(self) -> int:
+        return self._matrix.nbytes + self._sq_norms.nbytes
+
+    def flush(self) -> None:
+        """Atomically write the index to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            records = json.dumps(
+                {"ids": self._ids, "metadatas": self._metadatas, "documents": self._documents},
+                ensure_ascii=False
+            ).encode("utf-8")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    embeddings=self._matrix[:self._size],
+                    records=np.frombuffer(records, dtype=np.uint8)
+                )
+            os.replace(tmp_path, self.path)
+            self._file_key = self._stat_key()
+            self._dirty = False
+        self.logger.info(f"Saved {self._size} vectors to {self.path}")
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.metrics import metrics
+from app.services.embeddings import EmbeddingService
+
+
+class QueryEmbeddingBatcher:
+    """Dynamic micro-batching of concurrent query embeddings.
+
+    Queries that miss the embedding cache are queued. A worker task collects
+    queries arriving within ``window_ms`` of the first one (or until
+    ``max_batch_size`` are waiting), encodes them with one batched model call
+    on the inference pool and fans the vectors back out to the waiting
+    requests. The queue depth at every enqueue and the size of every batch
+    are recorded in the ``rag_queue_depth`` and ``rag_batch_size``
+    histograms under ``query_embedding``.
+    """
+
+    def __init__(self, embedding_service: EmbeddingService,
+                 window_ms: float = settings.QUERY_BATCH_WINDOW_MS,
+                 max_batch_size: int = settings.QUERY_BATCH_MAX_SIZE):
+        self.embedding_service = embedding_service
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.logger = logging.getLogger(__name__)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches = 0
+        self.queries = 0
+        self.max_queue_depth = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0 and self.max_batch_size > 1
+
+    async def embed(self, query: str) -> np.ndarray:
+        """Return the embedding for a query, batching it with concurrent ones."""
+        cached = self.embedding_service.cached_query_embedding(query)
+        if cached is not None:
+            return cached
+        if not self.enabled:
+            return (await run_blocking(self.embedding_service.encode_queries, [query]))[0]
+
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((query, future))
+        depth = self._queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        metrics.queue_depth.observe("query_embedding", depth)
+        return await future
+
+    def _ensure_worker(self) -> None:
+        """Start the worker on the running loop, restarting it if the loop changed."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # Start from an empty context: the worker outlives the request
+            # that happens to start it and must not record into its timings
+            self._worker = contextvars.Context().run(loop.create_task, self._run())
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """Wait for one queued query, then gather more until the window closes."""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.window_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            # Skip requests that were cancelled while queued
+            batch = [(query, future) for query, future in batch if not future.done()]
+            if not batch:
+                continue
+            self._record_batch(len(batch))
+            try:
+                # Model time only; the waiting requests' "embed" stage also covers the queue
+                with metrics.stage("query_encode"):
+                    embeddings = await run_blocking(
+                        self.embedding_service.encode_queries, [query for query, _ in batch]
+                    )
+            except Exception as e:
+                self.logger.error(f"Error encoding query batch: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), query_embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(query_embedding)
+
+    def _record_batch(self, size: int) -> None:
+        self.batches += 1
+        self.queries += size
+        metrics.batch_size.observe("query_embedding", size)
+
+    async def close(self) -> None:
+        """Stop the worker task."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+
+    def stats(self) -> Dict[str, object]:
+        """Return queue depth and batch counters; the histograms are on ``/metrics``."""
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_ms,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "queries": self.queries,
+        }
@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.services.document_processor import DocumentProcessor
+from app.services.embeddings import EmbeddingService
+from app.services.index_manifest import IndexManifest
+from app.services.indexer import Indexer
+from app.services.lexical_index import LexicalIndex
+from app.services.vector_store import VectorStore
+
+
+class Corpus:
+    """One named document collection with its own store, lexical index and indexer."""
+
+    def __init__(self, name: str, documents_dir: Path, persist_dir: Path, epoch: int,
+                 document_processor: DocumentProcessor, embedding_service: EmbeddingService,
+                 backend: Optional[str] = None, read_only: bool = False):
+        self.name = name
+        self.documents_dir = Path(documents_dir)
+        self.persist_dir = Path(persist_dir)
+        # Distinguishes loads of the same corpus, whose generations restart at 0
+        self.epoch = epoch
+        self.vector_store = VectorStore(persist_dir=str(self.persist_dir), backend=backend, read_only=read_only)
+        self.lexical_index = LexicalIndex(self.vector_store.records)
+        self.indexer = Indexer(
+            document_processor, embedding_service, self.vector_store,
+            manifest=IndexManifest(self.persist_dir / "manifest.json", embedding_service.vector_space),
+            lexical_index=self.lexical_index, documents_dir=self.documents_dir
+        )
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.queries = 0
+        # Jobs running against the corpus; a pinned corpus is never evicted
+        self.pins = 0
+
+    @property
+    def generations(self) -> Tuple[int, int, int]:
+        """Cache key part that changes whenever the corpus's results may change."""
+        return self.epoch, self.vector_store.generation, self.lexical_index.generation
+
+    def memory_bytes(self) -> int:
+        return self.vector_store.memory_bytes()
+
+    def refresh_snapshot(self) -> bool:
+        """Load the index snapshot the writer last published, if it changed."""
+        if not self.vector_store.reload():
+            return False
+        self.lexical_index.refresh(self.vector_store.records)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": True,
+            "documents_dir": str(self.documents_dir),
+            "index_version": self.vector_store.collection_name,
+            "vectors": self.vector_store.count(),
+            "documents": self.vector_store.records.count(),
+            "memory_bytes": self.memory_bytes(),
+            "generation": self.vector_store.generation,
+            "queries": self.queries,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+        }
+
+
+class CorpusRegistry:
+    """Named corpora, loaded on first use and evicted least recently used first.
+
+    Each corpus indexes its own documents directory into its own store
+    directory; the default corpus keeps the original ``DOCUMENTS_DIR`` and
+    ``CHROMADB_DIR`` so existing indexes are served as they are. Loading a
+    corpus opens its store: records and lexical postings are mapped from
+    their segment file, and vectors are mapped (mmap backend) or read into
+    memory (numpy and ivf).
+
+    When the estimated memory of the loaded corpora exceeds
+    ``memory_budget_bytes``, the least recently used ones are dropped until
+    it fits again. Corpora with a running job and the one just used are
+    kept. Queries still running against an evicted corpus finish on it; it
+    is loaded again on its next use.
+    """
+
+    def __init__(self, document_processor: DocumentProcessor, embedding_service: EmbeddingService,
+                 directories: Optional[Dict[str, str]] = None,
+                 default: str = settings.DEFAULT_CORPUS,
+                 persist_dir: str = settings.CHROMADB_DIR,
+                 memory_budget_bytes: int = settings.CORPUS_MEMORY_BUDGET_MB * 1024 * 1024,
+                 backend: Optional[str] = None, read_only: bool = False):
+        self.document_processor = document_processor
+        self.embedding_service = embedding_service
+        self.default = default
+        self.persist_dir = Path(persist_dir)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.backend = backend
+        self.read_only = read_only
+        self._directories: Dict[str, Path] = {default: Path(settings.DOCUMENTS_DIR)}
+        for name, directory in (settings.CORPORA if directories is None else directories).items():
+            self._directories[name] = Path(directory)
+        self._loaded: "OrderedDict[str, Corpus]" = OrderedDict()
+        # Guards the LRU order; loads take _load_lock so lookups never wait on one
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.logger = logging.getLogger(__name__)
+
+    def names(self) -> List[str]:
+        return list(self._directories)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._directories
+
+    def peek(self, name: str) -> Optional[Corpus]:
+        """Return the corpus if it is loaded, marking it as just used."""
+        with self._lock:
+            corpus = self._loaded.get(name)
+            if corpus is not None:
+                self._loaded.move_to_end(name)
+                corpus.last_used = time.time()
+            return corpus
+
+    def get(self, name: str) -> Corpus:
+        """Return the corpus, loading it on first use.
+
+        Raises KeyError for a corpus that is not configured.
+        """
+        if name not in self._directories:
+            raise KeyError(name)
+        corpus = self.peek(name)
+        if corpus is not None:
+            return corpus
+        with self._load_lock:
+            corpus = self.peek(name)
+            if corpus is None:
+                corpus = self._load(name)
+                with self._lock:
+                    self._loaded[name] = corpus
+                self.enforce_budget(keep=name)
+        return corpus
+
+    def _load(self, name: str) -> Corpus:
+        started = time.perf_counter()
+        self.loads += 1
+        persist_dir = self.persist_dir if name == self.default else self.persist_dir / "corpora" / name
+        corpus = Corpus(
+            name, self._directories[name], persist_dir, self.loads,
+            self.document_processor, self.embedding_service, self.backend, self.read_only
+        )
+        self.logger.info(
+            f"Loaded corpus {name} ({corpus.vector_store.count()} vectors, "
+            f"~{corpus.memory_bytes() // (1024 * 1024)} MB) in {time.perf_counter() - started:.2f}s"
+        )
+        return corpus
+
+    def open_read_only(self) -> None:
+        """Open corpora read-only from now on, including those already loaded (for reader workers)."""
+        self.read_only = True
+        for corpus in self.loaded():
+            corpus.vector_store.read_only = True
+
+    def loaded(self) -> List[Corpus]:
+        """The loaded corpora, least recently used first."""
+        with self._lock:
+            return list(self._loaded.values())
+
+    @contextmanager
+    def pinned(self, name: str) -> Iterator[Corpus]:
+        """Load the corpus and keep it from being evicted while the block runs."""
+        while True:
+            corpus = self.get(name)
+            with self._lock:
+                # Retry if it was evicted between loading and pinning
+                if self._loaded.get(name) is corpus:
+                    corpus.pins += 1
+                    break
+        try:
+            yield corpus
+        finally:
+            with self._lock:
+                corpus.pins -= 1
+            # Indexing may have grown the corpus past the budget
+            self.enforce_budget()
+
+    def enforce_budget(self, keep: Optional[str] = None) -> List[str]:
+        """Evict least recently used corpora until the loaded ones fit the budget.
+
+        Returns the names of the evicted corpora. A budget of 0 disables
+        eviction.
+        """
+        if self.memory_budget_bytes <= 0:
+            return []
+        # Stores keep their sizes as they change, so this is O(corpora)
+        sizes = {corpus.name: corpus.memory_bytes() for corpus in self.loaded()}
+        total = sum(sizes.values())
+        evicted = []
+        with self._lock:
+            for name, corpus in list(self._loaded.items()):
+                if total <= self.memory_budget_bytes:
+                    break
+                if name == keep or corpus.pins or name not in sizes:
+                    continue
+                del self._loaded[name]
+                total -= sizes[name]
+                evicted.append(name)
+        self.evictions += len(evicted)
+        for name in evicted:
+            self.logger.info(f"Evicted corpus {name} ({sizes[name] // (1024 * 1024)} MB) to fit the memory budget")
+        if total > self.memory_budget_bytes:
+            self.logger.warning(
+                f"Loaded corpora use ~{total // (1024 * 1024)} MB, over the "
+                f"{self.memory_budget_bytes // (1024 * 1024)} MB budget"
+            )
+        return evicted
+
+    def refresh_snapshots(self) -> bool:
+        """Load newer snapshots of the loaded corpora; returns whether any changed."""
+        changed = False
+        for corpus in self.loaded():
+            changed = corpus.refresh_snapshot() or changed
+        return changed
+
+    def corpus_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-corpus stats; corpora that are not loaded report only their directory."""
+        with self._lock:
+            loaded = dict(self._loaded)
+        return {
+            name: loaded[name].stats() if name in loaded else {"loaded": False, "documents_dir": str(directory)}
+            for name, directory in self._directories.items()
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """Load and eviction counters and the estimated memory of the loaded corpora."""
+        loaded = self.loaded()
+        return {
+            "configured": len(self._directories),
+            "loaded": len(loaded),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "memory_bytes": sum(corpus.memory_bytes() for corpus in loaded),
+            "memory_budget_bytes": self.memory_budget_bytes,
+        }
@@ -1,21 +1,202 @@
 import yaml
+import hashlib
 from pathlib import Path
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Iterator, Optional, TextIO, Tuple, Union
 import logging
+import multiprocessing
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
 from app.core.config import settings
 
+if getattr(yaml, "__with_libyaml__", False):
+    from yaml._yaml import CParser
+
+    class StreamingLoader(CParser, Composer, SafeConstructor, Resolver):
+        """Safe loader that scans and parses with libyaml but composes in Python.
+
+        ``CSafeLoader`` only composes whole documents; pairing the C event
+        parser with the Python composer lets items be built one at a time.
+        """
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+else:
+    StreamingLoader = yaml.SafeLoader
+
+
+def iter_yaml_items(stream: Union[str, TextIO], loader=StreamingLoader) -> Iterator[Any]:
+    """Yield the items of a YAML stream one at a time.
+
+    Every document in a multi-document stream is read in turn. A document
+    whose root is a sequence yields its elements one by one, so only one item
+    is held in memory at a time; any other non-empty document is yielded whole.
+    """
+    parser = loader(stream)
+    try:
+        parser.get_event()  # StreamStart
+        while not parser.check_event(yaml.StreamEndEvent):
+            parser.get_event()  # DocumentStart
+            if parser.check_event(yaml.SequenceStartEvent):
+                parser.get_event()
+                while not parser.check_event(yaml.SequenceEndEvent):
+                    yield parser.construct_document(parser.compose_node(None, None))
+                parser.get_event()
+            else:
+                item = parser.construct_document(parser.compose_node(None, None))
+                if item is not None:
+                    yield item
+            parser.get_event()  # DocumentEnd
+            parser.anchors = {}
+    finally:
+        parser.dispose()
+
+def parse_file(file_path: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """Parse and normalize one YAML file in a worker process."""
+    processor = DocumentProcessor(chunk_size, chunk_overlap, parse_workers=0)
+    return processor.process_document(Path(file_path))
+
+WORD_PATTERN = re.compile(r"\S+")
+
 class DocumentProcessor:
+    """Parses YAML files into normalized documents and splits long ones into chunks.
+
+    Chunking is tokenizer-aware: ``chunk_size`` and ``chunk_overlap`` are in
+    model tokens, and chunks are capped at what fits in the model's sequence
+    limit next to the title prefix that is embedded with every chunk.
+    """
+
+    # Tokens reserved for the [CLS]/[SEP] special tokens
+    SPECIAL_TOKENS = 2
+    # Lower bound on model sequence limits, used before the model is loaded
+    MIN_SEQ_LENGTH = 128
+
     def __init__(self, chunk_size: int = settings.CHUNK_SIZE, 
-                 chunk_overlap: int = settings.CHUNK_OVERLAP):
+                 chunk_overlap: int = settings.CHUNK_OVERLAP,
+                 parse_workers: int = settings.PARSE_WORKERS,
+                 tokenizer=None, max_seq_length: Optional[int] = None,
+                 model_name: str = settings.EMBEDDING_MODEL):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.parse_workers = parse_workers
+        self.model_name = model_name
+        self._tokenizer = tokenizer
+        self._max_seq_length = max_seq_length
         self.logger = logging.getLogger(__name__)
 
-    def read_yaml_file(self, file_path: Path) -> Dict[str, Any]:
-        """Read and parse a YAML file."""
+    def _load_tokenizer(self) -> None:
+        # Imported lazily so parsing alone never loads the model
+        from app.services.model_registry import model_registry
+        model = model_registry.get(self.model_name)
+        if self._tokenizer is None:
+            self._tokenizer = model.tokenizer
+        if self._max_seq_length is None:
+            self._max_seq_length = model.max_seq_length
+
+    @property
+    def tokenizer(self):
+        """The embedding model's tokenizer, loaded on first use."""
+        if self._tokenizer is None:
+            self._load_tokenizer()
+        return self._tokenizer
+
+    @property
+    def max_seq_length(self) -> int:
+        """The embedding model's sequence limit in tokens."""
+        if self._max_seq_length is None:
+            self._load_tokenizer()
+        return self._max_seq_length
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Character spans of the tokens of text, without special tokens.
+
+        Fast tokenizers report exact offsets; other tokenizers fall back to
+        whitespace-separated words.
+        """
+        if getattr(self.tokenizer, "is_fast", False):
+            encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+            return [tuple(span) for span in encoded["offset_mapping"]]
+        return [match.span() for match in WORD_PATTERN.finditer(text)]
+
+    def chunk_budget(self, title: str) -> int:
+        """Tokens of description that fit in one chunk next to its title prefix."""
+        prefix = f"{title} {title} {title}. "
+        prefix_tokens = len(self.token_spans(prefix))
+        limit = min(self.chunk_size, self.max_seq_length) - self.SPECIAL_TOKENS - prefix_tokens
+        return max(limit, 1)
+
+    def split_text(self, text: str, budget: int) -> List[str]:
+        """Split text into overlapping windows of at most budget tokens.
+
+        The overlap keeps the ``chunk_overlap / chunk_size`` ratio when the
+        model limit shrinks the window. Windows end on word boundaries where
+        possible, so sub-word pieces stay with their word.
+        """
+        spans = self.token_spans(text)
+        if len(spans) <= budget:
+            return [text]
+        overlap = min(self.chunk_overlap * budget // max(self.chunk_size, 1), budget - 1)
+        chunks = []
+        start = 0
+        while start < len(spans):
+            end = min(start + budget, len(spans))
+            if end < len(spans):
+                # Back off to a token that starts a new word
+                boundary = end
+                while boundary > start + 1 and spans[boundary][0] == spans[boundary - 1][1]:
+                    boundary -= 1
+                if boundary > start + 1:
+                    end = boundary
+            chunks.append(text[spans[start][0]:spans[end - 1][1]])
+            if end == len(spans):
+                break
+            next_start = max(end - overlap, start + 1)
+            # Start the next window at the beginning of a word
+            while next_start > start + 1 and spans[next_start][0] == spans[next_start - 1][1]:
+                next_start -= 1
+            start = next_start
+        return chunks
+
+    def chunk_document(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Split a document whose description is too long for one embedding.
+
+        Documents that fit are returned unchanged. Longer ones become chunk
+        records with IDs ``<document id>#<n>``, each carrying the parent's
+        data, the parent ID, its position and the passage of description
+        text it embeds.
+        """
+        title, description = doc['data']['title'], doc['data']['description']
+        # Every token covers at least one byte, so texts that are shorter in
+        # bytes than the smallest possible budget need no tokenization
+        limit = min(self.chunk_size, self._max_seq_length or self.MIN_SEQ_LENGTH)
+        if len(f"{title} {title} {title}. {description}".encode('utf-8')) + self.SPECIAL_TOKENS <= limit:
+            return [doc]
+        passages = self.split_text(description, self.chunk_budget(title))
+        if len(passages) == 1:
+            return [doc]
+        return [
+            {
+                'id': f"{doc['id']}#{i}",
+                'type': doc['type'],
+                'data': doc['data'],
+                'parent_id': doc['id'],
+                'chunk': i,
+                'text': passage,
+            }
+            for i, passage in enumerate(passages)
+        ]
+
+    def read_yaml_file(self, file_path: Path) -> Any:
+        """Read and parse a whole YAML file."""
         try:
             with open(file_path, 'r') as f:
-                return yaml.safe_load(f)
+                return yaml.load(f, Loader=StreamingLoader)
         except Exception as e:
             self.logger.error(f"Error reading YAML file {file_path}: {str(e)}")
             raise
@@ -30,82 +211,158 @@ class DocumentProcessor:
         else:
             raise ValueError(f"Unknown document type for file: {file_path}")
 
-    def process_yaml_content(self, content: Dict[str, Any], doc_type: str) -> List[Dict[str, Any]]:
-        """Process YAML content into structured documents."""
-        documents = []
-        
-        if not isinstance(content, list):
-            self.logger.warning("YAML content is not a list of documents")
-            return documents
-            
-        for item in content:
-            doc = None
+    def process_yaml_item(self, item: Any, doc_type: str) -> Optional[Dict[str, Any]]:
+        """Normalize one YAML item into a structured document, or None if invalid."""
+        doc = None
+        if isinstance(item, dict):
             if doc_type == 'product' and 'Product' in item:
                 doc = item['Product']
             elif doc_type == 'page' and 'Page' in item:
                 doc = item['Page']
-                
-            if doc:
-                # Clean and normalize text fields
-                title = doc.get('title', '').strip()
-                description = doc.get('description', '').strip()
-                # Replace newlines with spaces in description
-                description = ' '.join(description.split())
-                
-                documents.append({
-                    'type': doc_type,
-                    'data': {
-                        'title': title,
-                        'description': description,
-                        'link': doc.get('link', '')
-                    }
-                })
-                self.logger.info(f"Processed {doc_type} document: {title}")
-            else:
-                self.logger.warning(f"Skipping invalid document: {item}")
-        
-        return documents
 
-    def process_document(self, file_path: Path) -> List[Dict[str, Any]]:
-        """Process a single document into structured data."""
+        if not doc:
+            self.logger.warning(f"Skipping invalid document: {item}")
+            return None
+
+        # Clean and normalize text fields
+        title = doc.get('title', '').strip()
+        description = doc.get('description', '').strip()
+        # Replace newlines with spaces in description
+        description = ' '.join(description.split())
+
+        self.logger.debug(f"Processed {doc_type} document: {title}")
+        return {
+            'type': doc_type,
+            'data': {
+                'title': title,
+                'description': description,
+                'link': doc.get('link', '')
+            }
+        }
+
+    def process_yaml_content(self, content: Any, doc_type: str) -> List[Dict[str, Any]]:
+        """Process parsed YAML content into structured documents."""
+        if not isinstance(content, list):
+            self.logger.warning("YAML content is not a list of documents")
+            return []
+
+        documents = [self.process_yaml_item(item, doc_type) for item in content]
+        return [doc for doc in documents if doc is not None]
+
+    def assign_document_id(self, source: str, doc: Dict[str, Any], seen: Dict[str, int]) -> None:
+        """Give a document a stable ID derived from its identity fields.
+
+        IDs depend on the type, link and title rather than the position in the
+        file, so editing or reordering one entry leaves the others untouched.
+        ``seen`` counts the digests already used in this source, so exact
+        duplicates are disambiguated by their occurrence count.
+        """
+        key = "|".join([doc['type'], doc['data']['link'], doc['data']['title']])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        doc['id'] = f"{source}_{digest}" if occurrence == 0 else f"{source}_{digest}_{occurrence}"
+
+    def iter_document(self, file_path: Path) -> Iterator[Dict[str, Any]]:
+        """Stream the structured documents of one YAML file with their IDs assigned.
+
+        Items are parsed and normalized one at a time, so memory does not
+        grow with the size of the file.
+        """
         try:
-            yaml_content = self.read_yaml_file(file_path)
-            if not yaml_content:
-                self.logger.warning(f"Empty or invalid YAML content in {file_path}")
-                return []
-                
             doc_type = self.get_document_type(file_path)
-            documents = self.process_yaml_content(yaml_content, doc_type)
-            
-            if not documents:
+            source = str(file_path)
+            seen: Dict[str, int] = {}
+            count = 0
+            with open(file_path, 'r') as f:
+                for item in iter_yaml_items(f):
+                    doc = self.process_yaml_item(item, doc_type)
+                    if doc is None:
+                        continue
+                    self.assign_document_id(source, doc, seen)
+                    count += 1
+                    yield doc
+            if not count:
                 self.logger.warning(f"No valid documents extracted from {file_path}")
-                return []
-            
-            self.logger.info(f"Processed {file_path} into {len(documents)} documents")
-            return documents
+            else:
+                self.logger.info(f"Processed {file_path} into {count} documents")
         except Exception as e:
             self.logger.error(f"Error processing document {file_path}: {str(e)}")
             raise
 
+    def iter_directory(self, directory: Path = Path(settings.DOCUMENTS_DIR)) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream ``(source, document)`` pairs from every YAML file in a directory.
+
+        Files are read in a fixed order. With ``parse_workers`` > 1 they are
+        parsed in a process pool, and the output is identical to parsing
+        them one at a time.
+        """
+        # Process products.yml first to ensure cat-related documents are included
+        yaml_files = sorted(directory.glob('*.yml'), key=lambda x: (x.name != 'products.yml', x.name))
+        self.logger.info(f"Found YAML files: {yaml_files}")
+
+        if self.parse_workers > 1 and len(yaml_files) > 1:
+            documents = self._iter_parallel(yaml_files)
+        else:
+            documents = self._iter_sequential(yaml_files)
+
+        # Chunk in this process so parse workers never load the tokenizer
+        for source, doc in documents:
+            for chunk in self.chunk_document(doc):
+                yield source, chunk
+
+    def _iter_sequential(self, yaml_files: List[Path]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for file_path in yaml_files:
+            self.logger.info(f"Processing {file_path}")
+            for doc in self.iter_document(file_path):
+                yield str(file_path), doc
+
+    def _iter_parallel(self, yaml_files: List[Path]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Parse files in a process pool, yielding their documents in file order.
+
+        At most two files per worker are in flight, so memory stays bounded
+        by a few files rather than the whole directory.
+        """
+        workers = min(self.parse_workers, len(yaml_files))
+        # Spawn rather than fork: the indexer parses on a background thread
+        # of a process that also runs inference threads
+        context = multiprocessing.get_context("spawn")
+        files = iter(yaml_files)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+
+            def submit_next() -> None:
+                file_path = next(files, None)
+                if file_path is not None:
+                    pending.append((file_path, pool.submit(
+                        parse_file, str(file_path), self.chunk_size, self.chunk_overlap
+                    )))
+
+            for _ in range(2 * workers):
+                submit_next()
+            while pending:
+                file_path, future = pending.popleft()
+                documents = future.result()
+                submit_next()
+                self.logger.info(f"Processed {file_path} into {len(documents)} documents")
+                for doc in documents:
+                    yield str(file_path), doc
+
+    def process_document(self, file_path: Path) -> List[Dict[str, Any]]:
+        """Process a single document into structured data."""
+        return list(self.iter_document(file_path))
+
     def process_directory(self, directory: Path = Path(settings.DOCUMENTS_DIR)) -> Dict[str, List[Dict[str, Any]]]:
         """Process all YAML files in a directory."""
-        processed_documents = {}
-        
+        processed_documents: Dict[str, List[Dict[str, Any]]] = {}
+
         try:
-            yaml_files = list(directory.glob('*.yml'))
-            self.logger.info(f"Found YAML files: {yaml_files}")
-            
-            # Process products.yml first to ensure cat-related documents are included
-            for file_path in sorted(yaml_files, key=lambda x: x.name != 'products.yml'):
-                self.logger.info(f"Processing {file_path}")
-                documents = self.process_document(file_path)
-                if documents:
-                    processed_documents[str(file_path)] = documents
-                    self.logger.info(f"Added {len(documents)} documents from {file_path}")
-            
+            for source, doc in self.iter_directory(directory):
+                processed_documents.setdefault(source, []).append(doc)
+
             if not processed_documents:
                 self.logger.warning("No valid documents were processed")
-                
+
             return processed_documents
         except Exception as e:
             self.logger.error(f"Error processing directory {directory}: {str(e)}")
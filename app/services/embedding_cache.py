@@ -0,0 +1,213 @@
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Disk-backed, content-addressed cache of document embeddings.
+
+    Vectors are keyed by a hash of the embedded text in one append-only file
+    per namespace (model name and inference backend), so any store,
+    collection or process embedding the same text with the same model reuses
+    the vector. The file is a small header holding the dimension followed by
+    fixed-size records of (16-byte BLAKE2b digest, float32 vector); the
+    digest-to-offset index is rebuilt from it in memory and extended as other
+    processes append.
+
+    Writers append under an exclusive ``flock``; readers take no lock and only
+    read whole records, so a torn or in-progress append is never returned.
+    When the file grows past ``max_bytes`` it is compacted to three quarters
+    of the cap, keeping the entries this process used most recently and then
+    the newest, and atomically replaced; readers of the old file notice the
+    new inode and reload.
+    """
+
+    MAGIC = b"RAGEMB01"
+    HEADER_SIZE = 16  # magic, uint32 dimension, padding
+    DIGEST_SIZE = 16
+
+    def __init__(self, directory: Path, namespace: str, max_bytes: int):
+        self.namespace = namespace
+        name = hashlib.blake2b(namespace.encode("utf-8"), digest_size=8).hexdigest()
+        self.path = Path(directory) / f"{name}.emb"
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._inode: Optional[int] = None
+        self._dim = 0
+        self._end = 0
+        self._index: Dict[bytes, int] = {}
+        self._used: Dict[bytes, int] = {}
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+
+    @classmethod
+    def digest(cls, text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=cls.DIGEST_SIZE).digest()
+
+    def _record_size(self, dim: int) -> int:
+        return self.DIGEST_SIZE + 4 * dim
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = self._inode = None
+        self._dim = self._end = 0
+        self._index = {}
+
+    def _refresh(self) -> None:
+        """Index records appended (or a file swapped in) since the last call."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._close()
+            return
+        if stat.st_ino != self._inode:
+            self._close()
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except FileNotFoundError:
+                return
+            header = os.pread(fd, self.HEADER_SIZE, 0)
+            if len(header) < self.HEADER_SIZE or header[:8] != self.MAGIC:
+                # Empty (being created) or not a cache file; retry next time
+                os.close(fd)
+                return
+            self._fd, self._inode = fd, os.fstat(fd).st_ino
+            self._dim = struct.unpack("<I", header[8:12])[0]
+            self._end = self.HEADER_SIZE
+        record = self._record_size(self._dim)
+        size = os.fstat(self._fd).st_size
+        # Only whole records: a concurrent append may be half written
+        end = self.HEADER_SIZE + (size - self.HEADER_SIZE) // record * record
+        if end <= self._end:
+            return
+        data = os.pread(self._fd, end - self._end, self._end)
+        for offset in range(0, len(data), record):
+            self._index[data[offset:offset + self.DIGEST_SIZE]] = self._end + offset
+        self._end = end
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector of each text, or None where it is not cached."""
+        digests = [self.digest(text) for text in texts]
+        with self._lock:
+            self._refresh()
+            vectors: List[Optional[np.ndarray]] = []
+            for digest in digests:
+                offset = self._index.get(digest)
+                if offset is None:
+                    vectors.append(None)
+                    continue
+                data = os.pread(self._fd, 4 * self._dim, offset + self.DIGEST_SIZE)
+                vectors.append(np.frombuffer(data, dtype="<f4").astype(np.float32))
+                self._clock += 1
+                self._used[digest] = self._clock
+            found = sum(v is not None for v in vectors)
+            self.hits += found
+            self.misses += len(vectors) - found
+        return vectors
+
+    def put_many(self, texts: Iterable[str], vectors: np.ndarray) -> None:
+        """Append the vectors of texts that are not cached yet."""
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        if vectors.ndim != 2 or not len(vectors):
+            return
+        dim = vectors.shape[1]
+        digests = [self.digest(text) for text in texts]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            fd = self._lock_file()
+            try:
+                size = os.fstat(fd).st_size
+                if size < self.HEADER_SIZE:
+                    os.ftruncate(fd, 0)
+                    os.write(fd, self.MAGIC + struct.pack("<I", dim) + bytes(4))
+                    size = self.HEADER_SIZE
+                self._refresh()
+                if self._dim != dim:
+                    self.logger.warning(
+                        f"Not caching {dim}-dimensional vectors in {self.path} ({self._dim} dimensions)"
+                    )
+                    return
+                record = self._record_size(dim)
+                # Drop a torn record left by a writer that crashed mid-append
+                aligned = self.HEADER_SIZE + (size - self.HEADER_SIZE) // record * record
+                if aligned != size:
+                    os.ftruncate(fd, aligned)
+                chunks = []
+                for digest, vector in zip(digests, vectors):
+                    if digest not in self._index:
+                        self._index[digest] = -1  # marks duplicates within this batch
+                        chunks.append(digest + vector.tobytes())
+                        self._clock += 1
+                        self._used[digest] = self._clock
+                payload = b"".join(chunks)
+                while payload:
+                    written = os.write(fd, payload)
+                    payload = payload[written:]
+                self.writes += len(chunks)
+                self._refresh()
+                if self.max_bytes > 0 and os.fstat(fd).st_size > self.max_bytes:
+                    self._compact()
+            finally:
+                os.close(fd)
+
+    def _lock_file(self) -> int:
+        """Open the current cache file for appending and lock it exclusively."""
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            # Compacted (replaced) while we waited for the lock
+            os.close(fd)
+
+    def _compact(self) -> None:
+        """Rewrite the file with the entries to keep; the caller holds the file lock."""
+        record = self._record_size(self._dim)
+        keep = max((int(self.max_bytes * 0.75) - self.HEADER_SIZE) // record, 0)
+        # Entries used by this process first (most recent first), then the newest
+        ranked = sorted(self._index, key=lambda d: (self._used.get(d, 0), self._index[d]), reverse=True)
+        kept = sorted(ranked[:keep], key=self._index.get)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(self.MAGIC + struct.pack("<I", self._dim) + bytes(4))
+            for digest in kept:
+                f.write(os.pread(self._fd, record, self._index[digest]))
+        os.replace(tmp_path, self.path)
+        self.compactions += 1
+        self._used = {d: self._used[d] for d in kept if d in self._used}
+        self.logger.info(f"Compacted embedding cache {self.path} to {len(kept)} of {len(ranked)} vectors")
+        self._refresh()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/write counters and the size of the cache file."""
+        with self._lock:
+            self._refresh()
+            entries = len(self._index)
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            size = 0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "compactions": self.compactions,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -1,57 +1,217 @@
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import numpy as np
 import logging
 from app.core.config import settings
+from app.services.cache import LRUCache
+from app.services.embedding_cache import EmbeddingCache
+from app.services.model_registry import ModelRegistry, model_registry
 
 class EmbeddingService:
-    def __init__(self, model_name: str = settings.EMBEDDING_MODEL):
+    def __init__(self, model_name: str = settings.EMBEDDING_MODEL,
+                 batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+                 query_cache_size: int = settings.QUERY_EMBEDDING_CACHE_SIZE,
+                 registry: ModelRegistry = model_registry,
+                 cache_dir: str = settings.EMBEDDING_CACHE_DIR,
+                 cache_max_mb: int = settings.EMBEDDING_CACHE_MAX_MB,
+                 lowercase: Optional[bool] = settings.QUERY_LOWERCASE):
         self.logger = logging.getLogger(__name__)
-        try:
-            self.model = SentenceTransformer(model_name)
-            self.logger.info(f"Loaded embedding model: {model_name}")
-        except Exception as e:
-            self.logger.error(f"Error loading embedding model: {str(e)}")
-            raise
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.query_cache = LRUCache(query_cache_size)
+        self.registry = registry
+        # Whether queries are lowercased; learnt from the tokenizer on first model use if not configured
+        self.lowercase = lowercase
+        # Backends produce slightly different vectors, so each has its own
+        # cache and an index built on another one is rebuilt
+        self.vector_space = f"{model_name}|{registry.describe()}"
+        self.embedding_cache = (
+            EmbeddingCache(cache_dir, self.vector_space, cache_max_mb * 2**20)
+            if cache_max_mb > 0 else None
+        )
+
+    @property
+    def model(self):
+        """The shared model instance, loaded on first use."""
+        model = self.registry.get(self.model_name)
+        if self.lowercase is None:
+            self.lowercase = bool(getattr(getattr(model, "tokenizer", None), "do_lower_case", False))
+        return model
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the model has been loaded and warmed up."""
+        return self.registry.is_ready(self.model_name)
+
+    def warm_up(self) -> None:
+        """Load the model and run a warm-up encode."""
+        self.registry.warm_up(self.model_name)
+        # Learn the tokenizer's case rule here rather than on a request
+        self.model
+
+    def document_text(self, doc: Dict[str, Any]) -> str:
+        """Build the text that is embedded for a document."""
+        title = doc['data']['title']
+        # Chunks of a long document embed their own passage of the description
+        description = doc.get('text', doc['data']['description'])
+        # Create text with title emphasis and proper spacing
+        return f"{title} {title} {title}. {description}"
+
+    def generate_embeddings(self, documents: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                            use_cache: bool = True) -> np.ndarray:
+        """Generate embeddings for a list of documents.
+
+        Texts already in the persistent embedding cache are not encoded
+        again; the rest are encoded and added to it.
 
-    def generate_embeddings(self, documents: List[Dict[str, Any]]) -> List[np.ndarray]:
-        """Generate embeddings for a list of documents."""
+        Texts are encoded in batches ordered by length, so each batch pads to
+        a similar sequence length, and the vectors are returned in input
+        order. Batching does not change the vectors beyond float rounding:
+        the attention mask keeps padding out of the mean pooling, and
+        ``test_batched_embeddings_match_unbatched`` checks that batched and
+        ``batch_size=1`` vectors agree within 1e-5.
+        """
         try:
-            # Extract text content from documents for embedding
-            texts = []
-            for doc in documents:
-                title = doc['data']['title']
-                description = doc['data']['description']
-                # Create text with title emphasis and proper spacing
-                text = f"{title} {title} {title}. {description}"
-                texts.append(text)
-                self.logger.info(f"Processing text: {text}")
-            
-            # Generate embeddings with normalization
-            embeddings = self.model.encode(
-                texts,
+            texts = [self.document_text(doc) for doc in documents]
+            if not texts:
+                return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+            cache = self.embedding_cache if use_cache else None
+            cached = cache.get_many(texts) if cache is not None else [None] * len(texts)
+            missing = [i for i, vector in enumerate(cached) if vector is None]
+            if not missing:
+                self.logger.debug("Served embeddings for %d documents from the cache", len(texts))
+                return np.stack(cached)
+
+            # Bucket by length so similar-length texts are padded together
+            order = sorted(missing, key=lambda i: len(texts[i]))
+            encoded = self.model.encode(
+                [texts[i] for i in order],
                 convert_to_numpy=True,
                 normalize_embeddings=True,  # L2 normalize embeddings
-                batch_size=1  # Process one at a time for better quality
+                batch_size=batch_size or self.batch_size,
+                show_progress_bar=False
             )
-            self.logger.info(f"Generated embeddings for {len(texts)} documents")
+            if cache is not None:
+                cache.put_many([texts[i] for i in order], encoded)
+
+            # Restore input order
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+            embeddings[order] = encoded
+            for i, vector in enumerate(cached):
+                if vector is not None:
+                    embeddings[i] = vector
+            self.logger.debug("Generated embeddings for %d documents (%d cached)",
+                              len(texts), len(texts) - len(missing))
             return embeddings
         except Exception as e:
             self.logger.error(f"Error generating embeddings: {str(e)}")
             raise
 
+    def generate_embeddings_by_source(self, documents: Dict[str, List[Dict[str, Any]]],
+                                      use_cache: bool = True) -> Dict[str, np.ndarray]:
+        """Generate embeddings for documents from every source in one batched pass."""
+        flat = [doc for docs in documents.values() for doc in docs]
+        embeddings = self.generate_embeddings(flat, use_cache=use_cache)
+
+        by_source = {}
+        offset = 0
+        for source, docs in documents.items():
+            by_source[source] = embeddings[offset:offset + len(docs)]
+            offset += len(docs)
+        self.logger.debug("Generated embeddings for %d documents from %d sources", len(flat), len(documents))
+        return by_source
+
+    def normalize_query(self, query: str) -> str:
+        """Normalize query text so equivalent queries share one cache entry.
+
+        Runs on the event loop, so it never touches the model: case is
+        folded per ``lowercase``, which is only known from the tokenizer
+        once the model has loaded. Until then queries keep their case,
+        which costs cache hits but never changes a vector.
+        """
+        normalized = " ".join(query.split())
+        # Case only matters to cased tokenizers
+        if self.lowercase:
+            normalized = normalized.lower()
+        return normalized
+
     def generate_query_embedding(self, query: str) -> np.ndarray:
-        """Generate embedding for a single query text."""
+        """Generate embedding for a single query text.
+
+        Vectors are served from a bounded LRU cache keyed on the model name
+        and normalized query text. Cached arrays are read-only.
+        """
         try:
+            normalized = self.normalize_query(query)
+            key = (self.model_name, normalized)
+            query_embedding = self.query_cache.get(key)
+            if query_embedding is not None:
+                return query_embedding
+
             # Generate query embedding with normalization
             query_embedding = self.model.encode(
-                query,
+                normalized,
                 convert_to_numpy=True,
                 normalize_embeddings=True,  # L2 normalize embeddings
                 show_progress_bar=False
             )
-            self.logger.info(f"Generated embedding for query: {query}")
+            query_embedding.setflags(write=False)
+            self.query_cache.put(key, query_embedding)
+            self.logger.debug("Generated embedding for query: %s", query)
             return query_embedding
         except Exception as e:
             self.logger.error(f"Error generating query embedding: {str(e)}")
             raise
+
+    def cached_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query, or None on a cache miss."""
+        return self.query_cache.get((self.model_name, self.normalize_query(query)))
+
+    def encode_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Encode queries in one batched call and store them in the query cache.
+
+        Duplicates (after normalization) are encoded once; results are
+        returned in input order. The cache is not consulted.
+        """
+        try:
+            normalized = [self.normalize_query(query) for query in queries]
+            unique = list(dict.fromkeys(normalized))
+            encoded = self.model.encode(
+                unique,
+                convert_to_numpy=True,
+                normalize_embeddings=True,  # L2 normalize embeddings
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            by_text = {}
+            for text, query_embedding in zip(unique, encoded):
+                query_embedding.setflags(write=False)
+                self.query_cache.put((self.model_name, text), query_embedding)
+                by_text[text] = query_embedding
+            self.logger.debug("Encoded %d queries", len(unique))
+            return [by_text[text] for text in normalized]
+        except Exception as e:
+            self.logger.error(f"Error generating query embeddings: {str(e)}")
+            raise
+
+    def generate_query_embeddings(self, queries: List[str]) -> List[np.ndarray]:
+        """Generate embeddings for several queries with one batched encode.
+
+        Cached queries are served from the query cache and the rest are
+        encoded together; results are returned in input order.
+        """
+        embeddings = [self.cached_query_embedding(query) for query in queries]
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            encoded = self.encode_queries([queries[i] for i in missing])
+            for i, query_embedding in zip(missing, encoded):
+                embeddings[i] = query_embedding
+        return embeddings
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters for the query embedding cache."""
+        return self.query_cache.stats()
+
+    def embedding_cache_stats(self) -> Dict[str, int]:
+        """Return counters and size of the persistent document embedding cache."""
+        return self.embedding_cache.stats() if self.embedding_cache is not None else {}
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Any, Optional
+from app.core.config import settings
+
+
+def content_hash(document: Dict[str, Any]) -> str:
+    """Hash the normalized content of a document or chunk."""
+    content = {"type": document["type"], "data": document["data"]}
+    if "text" in document:
+        content["text"] = document["text"]
+    payload = json.dumps(
+        content,
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IndexManifest:
+    """Persisted map of document ID to content hash for incremental indexing.
+
+    ``model_name`` identifies the vectors the index holds: the embedding
+    model and, through ``EmbeddingService.vector_space``, its inference
+    backend. A manifest written for other vectors is stale.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Optional[Path] = None, model_name: str = settings.EMBEDDING_MODEL):
+        self.path = Path(path) if path else Path(settings.CHROMADB_DIR) / "manifest.json"
+        self.model_name = model_name
+        self.entries: Dict[str, str] = {}
+        # Store version the entries describe; None for manifests written before versions
+        self.collection: Optional[str] = None
+        self.loaded = False
+        self.logger = logging.getLogger(__name__)
+
+    def load(self) -> bool:
+        """Load the manifest from disk.
+
+        Returns False when there is no usable manifest (missing, unreadable, or
+        written by a different format version, model or backend), in which
+        case the caller must fall back to a full rebuild.
+        """
+        self.entries = {}
+        self.loaded = False
+        if not self.path.exists():
+            self.logger.info(f"No index manifest at {self.path}")
+            return False
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable index manifest {self.path}: {str(e)}")
+            return False
+
+        if data.get("version") != self.VERSION or data.get("model") != self.model_name:
+            self.logger.info("Index manifest is stale (format, model or inference backend changed)")
+            return False
+
+        self.entries = dict(data.get("documents", {}))
+        self.collection = data.get("collection")
+        self.loaded = True
+        return True
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"version": self.VERSION, "model": self.model_name, "collection": self.collection,
+                 "documents": self.entries},
+                f
+            )
+        os.replace(tmp_path, self.path)
+        self.loaded = True
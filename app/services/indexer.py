@@ -0,0 +1,229 @@
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, TypeVar
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.document_processor import DocumentProcessor
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import VectorStore
+from app.services.index_manifest import IndexManifest, content_hash
+from app.services.lexical_index import LexicalIndex
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def prefetch(items: Iterable[T], depth: int) -> Iterator[T]:
+    """Iterate over items on a background thread, buffering at most depth of them.
+
+    Exceptions raised while producing items are re-raised to the consumer.
+    Closing the returned generator stops the producer.
+    """
+    buffer: "queue.Queue" = queue.Queue(maxsize=max(depth, 1))
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+        else:
+            put((_DONE, None))
+
+    thread = threading.Thread(target=produce, name="index-parser", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class Indexer:
+    """Keeps the vector store in sync with a documents directory.
+
+    Each document is hashed and compared against a persisted manifest so that
+    only new or changed documents are embedded and upserted, and documents
+    that disappeared from the source files are deleted. When a lexical
+    index is given it is switched to the postings saved with the store's
+    document records on every run. Full rebuilds go to a new version of the store that is swapped in
+    only once complete, so queries never see a half-built index.
+
+    Documents are streamed from the YAML files rather than loaded up front.
+    Parsing runs on a background thread up to ``prefetch_batches`` batches
+    ahead, embedding runs on the calling thread and writes run on a writer
+    thread one batch behind, so the three stages overlap and at most a few
+    batches of documents and embeddings are in memory at once. Only the
+    document IDs and hashes grow with the corpus.
+    """
+
+    def __init__(self, document_processor: DocumentProcessor, embedding_service: EmbeddingService,
+                 vector_store: VectorStore, manifest: Optional[IndexManifest] = None,
+                 batch_size: int = settings.INDEX_BATCH_SIZE,
+                 lexical_index: Optional[LexicalIndex] = None, prefetch_batches: int = 2,
+                 documents_dir: Path = Path(settings.DOCUMENTS_DIR)):
+        self.document_processor = document_processor
+        self.documents_dir = Path(documents_dir)
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.manifest = manifest or IndexManifest(model_name=embedding_service.vector_space)
+        self.batch_size = batch_size
+        self.lexical_index = lexical_index
+        self.prefetch_batches = prefetch_batches
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, full: bool = False, progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+        """Index the documents directory, incrementally unless a full rebuild is needed.
+
+        ``progress`` is called as ``progress(stage, count)`` when documents
+        are parsed, embedded, written or deleted.
+        """
+        report = progress or (lambda stage, count: None)
+
+        def progress(stage: str, count: int) -> None:
+            metrics.documents.inc(stage, count)
+            report(stage, count)
+
+        # An empty directory still runs the diff, which deletes every
+        # document the manifest knows about
+        documents = self.document_processor.iter_directory(self.documents_dir)
+
+        # A missing/stale manifest or a store that drifted from it means we
+        # cannot trust the diff, so rebuild everything from scratch.
+        if not full and not self.manifest.load():
+            full = True
+        if not full and self.manifest.collection not in (None, self.vector_store.collection_name):
+            self.logger.warning("Index manifest describes another index version")
+            full = True
+        if not full and self.vector_store.count() != len(self.manifest.entries):
+            self.logger.warning("Vector store is out of sync with the index manifest")
+            full = True
+
+        # A full rebuild writes a new version of the store while queries are
+        # served from the active one, and swaps it in when it is complete
+        store = self.vector_store
+        if full:
+            store = self.vector_store.stage()
+            self.logger.info(f"Running full re-index into {store.collection_name}")
+            self.manifest.entries = {}
+
+        previous = self.manifest.entries
+        hashes: Dict[str, str] = {}
+        sources = set()
+        live_docs = set()
+        diff = {"added": 0, "changed": 0, "unchanged": 0}
+
+        def pending_batches() -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+            """Hash every document and group the new or changed ones into batches."""
+            batch: Dict[str, List[Dict[str, Any]]] = {}
+            batch_count = parsed = 0
+            started = time.perf_counter()
+            for source, doc in documents:
+                sources.add(source)
+                digest = content_hash(doc)
+                hashes[doc['id']] = digest
+                live_docs.add(doc.get('parent_id', doc['id']))
+                parsed += 1
+                if parsed == self.batch_size:
+                    progress("parsed", parsed)
+                    parsed = 0
+
+                known = previous.get(doc['id'])
+                if known == digest:
+                    diff["unchanged"] += 1
+                    # Cheap no-op when present; restores a lost record store
+                    store.records.put(doc.get('parent_id', doc['id']), source, doc)
+                    continue
+                diff["added" if known is None else "changed"] += 1
+                batch.setdefault(source, []).append(doc)
+                batch_count += 1
+                if batch_count == self.batch_size:
+                    metrics.observe("parse", time.perf_counter() - started)
+                    yield batch
+                    batch, batch_count = {}, 0
+                    started = time.perf_counter()
+            progress("parsed", parsed)
+            if batch_count:
+                metrics.observe("parse", time.perf_counter() - started)
+                yield batch
+
+        # Embed and write pending documents in bounded batches across sources
+        batches = prefetch(pending_batches(), self.prefetch_batches)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-writer") as writer:
+            write: Optional[Future] = None
+            try:
+                for batch in batches:
+                    batch_count = sum(len(docs) for docs in batch.values())
+                    with metrics.stage("index_embed"):
+                        embeddings = self.embedding_service.generate_embeddings_by_source(batch)
+                    metrics.batches.inc("index")
+                    progress("embedded", batch_count)
+                    # Keep at most one write in flight
+                    if write is not None:
+                        write.result()
+                    write = writer.submit(self._write, store, batch, embeddings, batch_count, progress)
+                if write is not None:
+                    write.result()
+            finally:
+                batches.close()
+
+        removed = [doc_id for doc_id in previous if doc_id not in hashes]
+        self.logger.info(
+            f"Index diff: {diff['added']} added, {diff['changed']} changed, "
+            f"{len(removed)} removed, {diff['unchanged']} unchanged"
+        )
+        if removed:
+            store.delete_documents(removed)
+            progress("deleted", len(removed))
+        store.prune_records(live_docs)
+
+        # Persist the store before the manifest so a crash never leaves the
+        # manifest claiming documents the store does not have
+        if store is self.vector_store:
+            store.flush()
+        else:
+            self.vector_store.activate(store)
+        self.manifest.entries = hashes
+        self.manifest.collection = self.vector_store.collection_name
+        self.manifest.save()
+
+        # The postings were rebuilt when the records were saved
+        if self.lexical_index is not None:
+            self.lexical_index.refresh(self.vector_store.records)
+
+        return {
+            "total_documents": len(sources),
+            "total_chunks": len(hashes),
+            "added": diff["added"],
+            "updated": diff["changed"],
+            "deleted": len(removed),
+            "unchanged": diff["unchanged"],
+        }
+
+    def _write(self, store: VectorStore, batch: Dict[str, List[Dict[str, Any]]], embeddings: Dict[str, Any],
+               batch_count: int, progress: Callable[[str, int], None]) -> None:
+        with metrics.stage("write"):
+            store.add_documents(batch, embeddings)
+        progress("written", batch_count)
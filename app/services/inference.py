@@ -0,0 +1,105 @@
+"""Loading embedding models for the configured CPU inference backend.
+
+``torch`` runs the stock ``SentenceTransformer``. ``onnx`` runs the same
+model through ONNX Runtime: the model is exported once into
+``MODEL_CACHE_DIR`` and later loads reuse the export. With quantization
+enabled, linear layers use dynamic int8 weights (a quantized export for
+ONNX, ``quantize_dynamic`` for torch), which trades a small cosine drift
+(see ``tests/test_inference.py``) for faster CPU inference.
+
+Every backend returns a ``SentenceTransformer``, so tokenization, pooling
+and normalization are shared and callers do not change.
+"""
+import logging
+import platform
+import shutil
+from pathlib import Path
+from typing import Any, Dict
+
+BACKENDS = ("torch", "onnx")
+ONNX_FILE = "onnx/model.onnx"
+
+logger = logging.getLogger(__name__)
+
+
+def quantization_config() -> str:
+    """Pick the ONNX Runtime int8 configuration for this CPU."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    # Unlike the avx512 configs, avx2 weights run accurately on every x86 CPU
+    return "avx2"
+
+
+def onnx_file(quantize: bool) -> str:
+    """Return the file name of the (quantized) export inside a model directory."""
+    return f"onnx/model_qint8_{quantization_config()}.onnx" if quantize else ONNX_FILE
+
+
+def export_path(cache_dir: str, model_name: str) -> Path:
+    """Return the directory holding a model's ONNX exports."""
+    return Path(cache_dir) / model_name.replace("/", "--")
+
+
+def load_model(model_name: str, backend: str = "torch", quantize: bool = False,
+               threads: int = 0, cache_dir: str = ".models"):
+    """Load a model for the given backend; ``threads=0`` keeps the runtime default."""
+    if backend == "torch":
+        return load_torch(model_name, quantize, threads)
+    if backend == "onnx":
+        return load_onnx(model_name, quantize, threads, cache_dir)
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def load_torch(model_name: str, quantize: bool, threads: int):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if threads > 0:
+        # Process-wide: also bounds the threads of other torch models
+        torch.set_num_threads(threads)
+    if not quantize:
+        return SentenceTransformer(model_name)
+    model = SentenceTransformer(model_name, device="cpu")
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_onnx(model_name: str, quantize: bool, threads: int, cache_dir: str):
+    import onnxruntime
+    from sentence_transformers import SentenceTransformer
+    path = export_path(cache_dir, model_name)
+    file_name = onnx_file(quantize)
+    if not (path / file_name).exists():
+        export_onnx(model_name, path, quantize)
+
+    options = onnxruntime.SessionOptions()
+    if threads > 0:
+        options.intra_op_num_threads = threads
+    model_kwargs: Dict[str, Any] = {
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+        "session_options": options,
+    }
+    return SentenceTransformer(str(path), backend="onnx", model_kwargs=model_kwargs)
+
+
+def export_onnx(model_name: str, path: Path, quantize: bool) -> None:
+    """Export a model (and optionally its int8 quantization) to ``path``.
+
+    Exports are written to a scratch directory and moved into place, so an
+    interrupted export is redone rather than loaded.
+    """
+    from sentence_transformers import SentenceTransformer
+    tmp_path = path.with_name(path.name + ".tmp")
+    if not (path / ONNX_FILE).exists():
+        logger.info(f"Exporting {model_name} to ONNX in {path}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        SentenceTransformer(model_name, backend="onnx").save(str(tmp_path))
+        shutil.rmtree(path, ignore_errors=True)
+        tmp_path.replace(path)
+    if quantize:
+        from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+        logger.info(f"Quantizing the ONNX export of {model_name} ({quantization_config()})")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        model = SentenceTransformer(str(path), backend="onnx", model_kwargs={"file_name": ONNX_FILE})
+        export_dynamic_quantized_onnx_model(model, quantization_config(), str(tmp_path))
+        (tmp_path / onnx_file(True)).replace(path / onnx_file(True))
+        shutil.rmtree(tmp_path, ignore_errors=True)
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+
+# Minimum seconds between progress writes of a job shared through files
+PROGRESS_SAVE_INTERVAL = 0.5
+
+
+class IndexingJob:
+    """State and progress of one background indexing run (or index rollback)."""
+
+    def __init__(self, full: bool = False, action: str = "index", corpus: str = settings.DEFAULT_CORPUS):
+        self.id = uuid.uuid4().hex
+        # Called after progress updates, to mirror them to shared storage
+        self.on_update: Optional[Callable[["IndexingJob"], None]] = None
+        self.full = full
+        # What the runner does: "index" or "rollback"
+        self.action = action
+        self.corpus = corpus
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.progress: Dict[str, int] = {"parsed": 0, "embedded": 0, "written": 0, "deleted": 0}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, count: int) -> None:
+        """Add count to a progress counter (parsed, embedded, written or deleted)."""
+        with self._lock:
+            self.progress[stage] = self.progress.get(stage, 0) + count
+        if self.on_update is not None:
+            self.on_update(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "action": self.action,
+                "corpus": self.corpus,
+                "full": self.full,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndexingJob":
+        """Rebuild a job from ``to_dict`` output with ISO-formatted timestamps."""
+        job = cls(full=data["full"], action=data.get("action", "index"),
+                  corpus=data.get("corpus", settings.DEFAULT_CORPUS))
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.created_at = datetime.fromisoformat(data["created_at"])
+        job.started_at = datetime.fromisoformat(data["started_at"]) if data["started_at"] else None
+        job.finished_at = datetime.fromisoformat(data["finished_at"]) if data["finished_at"] else None
+        job.progress = dict(data["progress"])
+        job.result = data["result"]
+        job.error = data["error"]
+        return job
+
+
+class JobManager:
+    """Runs indexing jobs one at a time on a background thread.
+
+    Jobs are serialized so two reindexes never write the store concurrently.
+    Only the most recent ``max_jobs`` jobs are kept for status lookups.
+
+    With a ``directory``, jobs are shared between processes through one JSON
+    file each: any process can ``enqueue`` a job and look it up, and the one
+    designated writer process runs queued jobs with ``run_queued``, saving
+    their status and (throttled) progress as they run.
+    """
+
+    def __init__(self, max_jobs: int = 100, directory: Optional[Path] = None):
+        self.max_jobs = max_jobs
+        self.directory = Path(directory) if directory else None
+        self._jobs: "OrderedDict[str, IndexingJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indexing")
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self, fn: Callable[[IndexingJob], Dict[str, Any]], full: bool = False,
+               action: str = "index", corpus: str = settings.DEFAULT_CORPUS) -> IndexingJob:
+        """Queue fn to run in the background; it receives the job for progress updates."""
+        job = IndexingJob(full=full, action=action, corpus=corpus)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def enqueue(self, full: bool = False, action: str = "index",
+                corpus: str = settings.DEFAULT_CORPUS) -> IndexingJob:
+        """Queue a job for the writer process to run."""
+        if self.directory is None:
+            raise RuntimeError("Queueing jobs for another process needs a jobs directory")
+        job = IndexingJob(full=full, action=action, corpus=corpus)
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexingJob]:
+        if self.directory is not None:
+            # Shared jobs: the file is the source of truth
+            return self._load(job_id)
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def run_queued(self, fn: Callable[[IndexingJob], Dict[str, Any]]) -> int:
+        """Run the queued jobs in the jobs directory in submission order; returns how many ran."""
+        queued = [job for job in self._shared_jobs() if job.status == "queued"]
+        for job in sorted(queued, key=lambda job: job.created_at):
+            self._run(job, fn)
+        if queued:
+            self._prune()
+        return len(queued)
+
+    def recover(self) -> int:
+        """Fail the shared jobs a previous writer left running; returns how many."""
+        interrupted = [job for job in self._shared_jobs() if job.status == "running"]
+        for job in interrupted:
+            job.status = "failed"
+            job.error = "Interrupted: the writer process restarted"
+            job.finished_at = datetime.now(timezone.utc)
+            self._save(job)
+        return len(interrupted)
+
+    def _run(self, job: IndexingJob, fn: Callable[[IndexingJob], Dict[str, Any]]) -> None:
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        if self.directory is not None:
+            self._save(job)
+            saved = [time.monotonic()]
+
+            def save_progress(job: IndexingJob) -> None:
+                if time.monotonic() - saved[0] >= PROGRESS_SAVE_INTERVAL:
+                    saved[0] = time.monotonic()
+                    self._save(job)
+
+            job.on_update = save_progress
+        try:
+            job.result = fn(job)
+            job.status = "completed"
+        except Exception as e:
+            self.logger.error(f"Indexing job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            job.on_update = None
+            self._save(job)
+
+    def _path(self, job_id: str) -> Optional[Path]:
+        # Job IDs are hex; anything else cannot name a job file
+        if self.directory is None or not job_id.isalnum():
+            return None
+        return self.directory / f"{job_id}.json"
+
+    def _save(self, job: IndexingJob) -> None:
+        """Atomically write a shared job's state; a no-op without a jobs directory."""
+        path = self._path(job.id)
+        if path is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        state = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in job.to_dict().items()}
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _load(self, job_id: str) -> Optional[IndexingJob]:
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, "r") as f:
+                return IndexingJob.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable job file {path}: {str(e)}")
+            return None
+
+    def _shared_jobs(self) -> List[IndexingJob]:
+        if self.directory is None or not self.directory.exists():
+            return []
+        jobs = (self._load(path.stem) for path in self.directory.glob("*.json"))
+        return [job for job in jobs if job is not None]
+
+    def _prune(self) -> None:
+        """Delete the files of the oldest finished jobs beyond ``max_jobs``."""
+        jobs = sorted(self._shared_jobs(), key=lambda job: job.created_at, reverse=True)
+        for job in jobs[self.max_jobs:]:
+            if job.status in ("completed", "failed"):
+                path = self._path(job.id)
+                if path is not None:
+                    path.unlink(missing_ok=True)
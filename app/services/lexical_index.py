@@ -0,0 +1,229 @@
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.backends.base import MetadataFilter
+from app.services.record_segment import RecordSegment, tokenize
+from app.services.record_store import RecordStore
+
+
+class LexicalIndex:
+    """BM25 inverted index over document titles and descriptions.
+
+    Queries are answered from the index alone when they are confident: the
+    query is exactly a document's title, or every query term occurs in the
+    top document's title and its BM25 score beats the runner-up by
+    ``min_margin``. Other queries return None so the caller falls back to
+    vector search.
+
+    ``may_serve`` checks the title tables alone, which takes microseconds,
+    so queries that cannot be confident never pay for scoring. Scoring is
+    vectorised over the posting arrays; terms occurring in more than
+    ``max_postings`` documents only add to documents that a rarer term or a
+    title match already found, and their largest possible contribution is
+    counted against the runner-up so confidence stays conservative.
+
+    The postings are built by the record store when it saves (see
+    ``app.services.record_segment``), next to the records they point at, so
+    the index serves the store's last saved segment: opening it maps a file
+    rather than re-tokenizing the corpus, and ``refresh`` switches to the
+    segment saved by the latest indexing run.
+    """
+
+    def __init__(self, records: Optional[RecordStore] = None, k1: float = 1.2, b: float = 0.75,
+                 min_margin: float = settings.LEXICAL_MIN_MARGIN,
+                 max_postings: int = settings.LEXICAL_MAX_POSTINGS):
+        self.records = records
+        self.k1 = k1
+        self.b = b
+        self.min_margin = min_margin
+        self.max_postings = max_postings
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._segment = RecordSegment.build([])
+        # Bumped on every refresh so caches keyed on it never serve stale results
+        self.generation = 0
+        self.served = 0
+        self.fallthrough = 0
+        if records is not None:
+            self.refresh()
+
+    def refresh(self, records: Optional[RecordStore] = None) -> None:
+        """Serve the record store's saved segment, switching to records when given."""
+        if records is not None:
+            self.records = records
+        segment = self.records.segment
+        # Swap at once; searches keep the segment they started on
+        with self._lock:
+            self._segment = segment
+            self.generation += 1
+        self.logger.info(f"Serving lexical index over {segment.count} documents")
+
+    def _candidates(self, segment: RecordSegment, terms: List[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Rows titled exactly the query and rows whose title has every term, or None if neither."""
+        if not terms or not len(segment):
+            return None
+        exact, _ = segment.titles.lookup(" ".join(terms))
+        titled = None
+        for rows in sorted((segment.title_terms.lookup(term)[0] for term in set(terms)), key=len):
+            titled = rows if titled is None else np.intersect1d(titled, rows, assume_unique=True)
+            if not len(titled):
+                break
+        if not len(exact) and not len(titled):
+            return None
+        return exact, titled
+
+    def _bm25(self, segment: RecordSegment, rows: np.ndarray, tfs: np.ndarray, idf: float) -> np.ndarray:
+        norm = self.k1 * (1 - self.b + self.b * segment.lengths[rows] / segment.avg_length)
+        return idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _scores(self, segment: RecordSegment, terms: List[str], rows: np.ndarray,
+                only: bool = False) -> Tuple[np.ndarray, np.ndarray, float]:
+        """BM25 scores of the documents matching any term, plus ``rows``.
+
+        Returns the scored rows (ascending), their scores and the most a
+        document left out could score. With ``only``, just ``rows`` are
+        scored.
+        """
+        total = len(segment)
+        found, scored, common = [rows], [], []
+        bound = 0.0
+        for term in set(terms):
+            term_rows, tfs = segment.terms.lookup(term)
+            if not len(term_rows):
+                continue
+            idf = math.log(1 + (total - len(term_rows) + 0.5) / (len(term_rows) + 0.5))
+            if only or len(term_rows) > self.max_postings:
+                common.append((term_rows, tfs, idf))
+                bound += idf * (self.k1 + 1)
+                continue
+            found.append(term_rows)
+            scored.append((term_rows, self._bm25(segment, term_rows, tfs, idf)))
+        rows = found[0] if len(found) == 1 else np.unique(np.concatenate(found))
+        scores = np.zeros(len(rows), dtype=np.float64)
+        for term_rows, contribution in scored:
+            scores[np.searchsorted(rows, term_rows)] += contribution
+        for term_rows, tfs, idf in common:
+            positions = np.minimum(np.searchsorted(term_rows, rows), len(term_rows) - 1)
+            hit = term_rows[positions] == rows
+            scores[hit] += self._bm25(segment, rows[hit], tfs[positions[hit]], idf)
+        return rows, scores, 0.0 if only else bound
+
+    def _mask(self, segment: RecordSegment, where: MetadataFilter) -> np.ndarray:
+        mask = segment.masks.get(where.key)
+        if mask is None:
+            mask = np.fromiter(
+                (where.matches(segment.metadata(row)) for row in range(len(segment))),
+                dtype=bool, count=len(segment)
+            )
+            segment.masks[where.key] = mask
+        return mask
+
+    def may_serve(self, query: str) -> bool:
+        """Whether the query could be a confident match, from the title tables alone.
+
+        Cheap enough to run on the event loop; ``search`` (which does the
+        scoring) is only worth running when this returns True. A False
+        answer counts as a fallthrough.
+        """
+        if self._candidates(self._segment, tokenize(query)) is not None:
+            return True
+        with self._lock:
+            self.fallthrough += 1
+        return False
+
+    def search(self, query: str, limit: int = settings.MAX_RESULTS,
+               where: Optional[MetadataFilter] = None) -> Optional[List[Dict[str, Any]]]:
+        """Return results for a confident lexical match, or None to fall back.
+
+        Results have the same shape as ``VectorStore.query`` results. Scores
+        are BM25 relative to the best match, and exact title matches score 1.
+        With a filter, only matching documents are ranked.
+        """
+        terms = tokenize(query)
+        segment = self._segment
+        candidates = self._candidates(segment, terms)
+        rows = scores = None
+        if candidates is not None:
+            exact, titled = candidates
+            rows, scores, bound = self._scores(segment, terms, np.union1d(exact, titled))
+            if where:
+                keep = self._mask(segment, where)[rows]
+                rows, scores = rows[keep], scores[keep]
+        if rows is None or not len(rows):
+            with self._lock:
+                self.fallthrough += 1
+            return None
+
+        order = np.argsort(-scores, kind="stable")
+        top_row, top_score = rows[order[0]], scores[order[0]]
+        runner_up = max(scores[order[1]] if len(order) > 1 else 0.0, bound)
+        is_exact = np.isin(rows, exact)
+        confident = bool(is_exact.any()) or (
+            top_row in titled and top_score >= self.min_margin * runner_up
+        )
+        with self._lock:
+            if not confident:
+                self.fallthrough += 1
+                return None
+            self.served += 1
+
+        relative = np.where(is_exact, 1.0, np.minimum(scores / top_score, 1.0))
+        results = []
+        # Same relative cut-off as the vector store's score threshold
+        for i in np.argsort(-relative, kind="stable"):
+            if relative[i] < 0.4 or len(results) == limit:
+                break
+            row = int(rows[i])
+            doc_type, source, title, description, link = segment.fields(row)
+            results.append({
+                "id": segment.id(row),
+                "source": source,
+                "score": float(relative[i]),
+                "type": doc_type,
+                "data": {"title": title, "description": description, "link": link},
+                "fragment": segment.fragment(row),
+            })
+        return results
+
+    def fuse(self, query: str, results: List[Dict[str, Any]], weight: float) -> List[Dict[str, Any]]:
+        """Blend relative BM25 scores into vector results and re-rank them.
+
+        Each score becomes ``(1 - weight) * vector + weight * bm25 / max_bm25``,
+        where ``max_bm25`` is the best BM25 score among the results. Only the
+        results are scored, so fusion costs the same however common the
+        query terms are. Results without an ``id`` in the index keep a BM25
+        part of zero.
+        """
+        segment = self._segment
+        found = {r["id"]: segment.row(r["id"]) for r in results if r.get("id") is not None}
+        rows = np.unique(np.array([row for row in found.values() if row is not None], dtype=np.int32))
+        lexical: Dict[str, float] = {}
+        if len(rows):
+            rows, scores, _ = self._scores(segment, tokenize(query), rows, only=True)
+            top = scores.max()
+            if top > 0:
+                by_row = dict(zip(rows.tolist(), scores / top))
+                lexical = {doc_id: by_row[row] for doc_id, row in found.items() if row in by_row}
+        fused = [
+            dict(r, score=(1 - weight) * r["score"] + weight * lexical.get(r.get("id"), 0.0))
+            for r in results
+        ]
+        fused.sort(key=lambda r: r["score"], reverse=True)
+        return fused
+
+    def count(self) -> int:
+        """Return the number of indexed documents."""
+        return len(self._segment)
+
+    def stats(self) -> Dict[str, int]:
+        """Return index size and fast-path counters."""
+        return {
+            "documents": len(self._segment),
+            "terms": len(self._segment.terms),
+            "served": self.served,
+            "fallthrough": self.fallthrough,
+            "generation": self.generation,
+        }
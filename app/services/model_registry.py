@@ -0,0 +1,73 @@
+import logging
+import threading
+from typing import Dict, Optional
+from app.core.config import settings
+
+
+class ModelRegistry:
+    """Process-wide registry of lazily loaded embedding models.
+
+    Every service asks the registry for its model, so each model is loaded
+    at most once per process, on first use or during warm-up. Models run on
+    the registry's inference backend (see ``app.services.inference``).
+    """
+
+    def __init__(self, backend: str = settings.EMBEDDING_BACKEND,
+                 quantize: bool = settings.EMBEDDING_QUANTIZE,
+                 threads: int = settings.EMBEDDING_THREADS,
+                 cache_dir: str = settings.MODEL_CACHE_DIR):
+        self.backend = backend
+        self.quantize = quantize
+        self.threads = threads
+        self.cache_dir = cache_dir
+        self._models: Dict[str, object] = {}
+        self._ready: Dict[str, bool] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def get(self, model_name: str = settings.EMBEDDING_MODEL):
+        """Return the model, loading it on first use."""
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._load(model_name)
+                self._models[model_name] = model
+            return model
+
+    def _load(self, model_name: str):
+        # Imported lazily: torch and sentence-transformers are slow to import
+        from app.services.inference import load_model
+        try:
+            model = load_model(model_name, self.backend, self.quantize, self.threads, self.cache_dir)
+            self._errors.pop(model_name, None)
+            self.logger.info(f"Loaded embedding model: {model_name} ({self.describe()})")
+            return model
+        except Exception as e:
+            self._errors[model_name] = str(e)
+            self.logger.error(f"Error loading embedding model: {str(e)}")
+            raise
+
+    def warm_up(self, model_name: str = settings.EMBEDDING_MODEL) -> None:
+        """Load the model and run one encode so the first request is not slow."""
+        model = self.get(model_name)
+        model.encode(["warm up"], convert_to_numpy=True, show_progress_bar=False)
+        self._ready[model_name] = True
+        self.logger.info(f"Warmed up embedding model: {model_name}")
+
+    def is_ready(self, model_name: str = settings.EMBEDDING_MODEL) -> bool:
+        return self._ready.get(model_name, False)
+
+    def describe(self) -> str:
+        """Describe the inference backend, e.g. ``onnx-int8``."""
+        return self.backend + ("-int8" if self.quantize else "")
+
+    def error(self, model_name: str = settings.EMBEDDING_MODEL) -> Optional[str]:
+        """Return the last load error for the model, if any."""
+        return self._errors.get(model_name)
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,286 @@
+"""Memory-mapped segment of document records, rendered fragments and BM25 postings.
+
+Layout of a segment file::
+
+    b"RAGREC01"                 8-byte magic
+    <uint64 little-endian>      length of the JSON header
+    <JSON header>               version, count, fields, title boost and the
+                                (offset, dtype, shape) of every section
+    <sections>                  each aligned to 64 bytes:
+        id_hashes, id_rows      sorted 64-bit ID hashes and the row of each
+        id_offsets, ids         UTF-8 document IDs, one per row
+        record_offsets, records one UTF-8 JSON array of ``FIELDS`` per row
+        fragment_offsets,
+        fragments               each document's rendered public JSON
+        lengths                 BM25 length of each document
+        terms.*                 rows and term frequencies per term
+        titles.*                rows per tokenized title
+        title_terms.*           rows per title term
+
+Posting tables (``terms``, ``titles``, ``title_terms``) are keyed by 64-bit
+hashes in sorted arrays, so looking a key up is a binary search on the
+mapped file. The whole file is mapped once, so opening a segment reads only
+the header; pages are loaded on demand and shared through the page cache
+between every process serving it. Segments are written whole by the one
+process that writes the store.
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+MAGIC = b"RAGREC01"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+FIELDS = ("type", "source", "title", "description", "link")
+# Title tokens count this many times, mirroring the title emphasis in the embedded text
+TITLE_BOOST = 3
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+EMPTY_ROWS = np.zeros(0, dtype=np.int32)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for both indexing and querying."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def key_hash(key: str) -> int:
+    """64-bit hash of a document ID, term or title."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _blob(items: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """Offsets (count + 1) and concatenated bytes of encoded items."""
+    offsets = np.zeros(len(items) + 1, dtype=np.uint64)
+    np.cumsum([len(item) for item in items], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(items), dtype=np.uint8)
+
+
+class PostingTable:
+    """Rows (and optionally a value per row) for each key, in flat arrays.
+
+    Keys are looked up by their hash in a sorted array, so a lookup is a
+    binary search and the table is three or four arrays that can live in a
+    mapped file. Rows of each key are in ascending order.
+    """
+
+    def __init__(self, hashes: np.ndarray, offsets: np.ndarray, rows: np.ndarray,
+                 values: Optional[np.ndarray] = None):
+        self.hashes = hashes
+        self.offsets = offsets
+        self.rows = rows
+        self.values = values
+
+    @classmethod
+    def build(cls, rows: Dict[str, List[int]], values: Optional[Dict[str, List[int]]] = None) -> "PostingTable":
+        keys = list(rows)
+        hashes = np.array([key_hash(key) for key in keys], dtype=np.uint64)
+        order = np.argsort(hashes, kind="stable")
+        keys = [keys[i] for i in order]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(rows[key]) for key in keys], out=offsets[1:])
+        flat = np.fromiter((row for key in keys for row in rows[key]), dtype=np.int32, count=int(offsets[-1]))
+        flat_values = None
+        if values is not None:
+            flat_values = np.fromiter(
+                (value for key in keys for value in values[key]), dtype=np.int32, count=int(offsets[-1])
+            )
+        return cls(hashes[order], offsets, flat, flat_values)
+
+    def sections(self, name: str) -> Dict[str, np.ndarray]:
+        sections = {f"{name}.hashes": self.hashes, f"{name}.offsets": self.offsets, f"{name}.rows": self.rows}
+        if self.values is not None:
+            sections[f"{name}.values"] = self.values
+        return sections
+
+    @classmethod
+    def from_sections(cls, name: str, sections: Dict[str, np.ndarray]) -> "PostingTable":
+        return cls(sections[f"{name}.hashes"], sections[f"{name}.offsets"], sections[f"{name}.rows"],
+                   sections.get(f"{name}.values"))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def lookup(self, key: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Rows of the key (empty if absent) and their values."""
+        target = np.uint64(key_hash(key))
+        i = int(np.searchsorted(self.hashes, target))
+        if i == len(self.hashes) or self.hashes[i] != target:
+            return EMPTY_ROWS, EMPTY_ROWS if self.values is not None else None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.rows[start:end], self.values[start:end] if self.values is not None else None
+
+
+def build_sections(rows: Iterable[Tuple[str, Tuple[str, ...], Optional[str]]]) -> Dict[str, np.ndarray]:
+    """Every section of a segment for (document ID, fields, fragment) rows.
+
+    This is where documents are tokenized and the BM25 postings built, so
+    its cost (about 15 s per 200k documents) is paid once per save by the
+    writer instead of by every process that opens the records.
+    """
+    ids, records, fragments = [], [], []
+    postings: Dict[str, List[int]] = {}
+    frequencies: Dict[str, List[int]] = {}
+    titles: Dict[str, List[int]] = {}
+    title_terms: Dict[str, List[int]] = {}
+    lengths = []
+    for row, (doc_id, fields, fragment) in enumerate(rows):
+        ids.append(doc_id.encode("utf-8"))
+        records.append(json.dumps(list(fields), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        fragments.append((fragment or "").encode("utf-8"))
+        title = tokenize(fields[2])
+        counts = Counter(tokenize(fields[3]))
+        for term in title:
+            counts[term] += TITLE_BOOST
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append(row)
+            frequencies.setdefault(term, []).append(tf)
+        lengths.append(sum(counts.values()))
+        for term in set(title):
+            title_terms.setdefault(term, []).append(row)
+        if title:
+            titles.setdefault(" ".join(title), []).append(row)
+
+    id_hashes = np.array([key_hash(doc_id.decode("utf-8")) for doc_id in ids], dtype=np.uint64)
+    id_rows = np.argsort(id_hashes, kind="stable").astype(np.int32)
+    sections = {"id_hashes": id_hashes[id_rows], "id_rows": id_rows}
+    for name, items in (("id", ids), ("record", records), ("fragment", fragments)):
+        sections[f"{name}_offsets"], sections[f"{name}s"] = _blob(items)
+    sections["lengths"] = np.array(lengths, dtype=np.float32)
+    sections.update(PostingTable.build(postings, frequencies).sections("terms"))
+    sections.update(PostingTable.build(titles).sections("titles"))
+    sections.update(PostingTable.build(title_terms).sections("title_terms"))
+    return sections
+
+
+def write_segment(path: Path, sections: Dict[str, np.ndarray]) -> None:
+    """Atomically write a segment file from ``build_sections`` output."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    # Reserve room for the header so section offsets can be fixed first
+    header_reserve = 4096
+    offset = _align(len(MAGIC) + 8 + header_reserve)
+    layout = {}
+    for name, section in sections.items():
+        layout[name] = [offset, section.dtype.str, list(section.shape)]
+        offset = _align(offset + section.nbytes)
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "count": len(sections["id_rows"]),
+        "fields": list(FIELDS),
+        "title_boost": TITLE_BOOST,
+        "sections": layout,
+    }).encode("utf-8")
+    if len(header) > header_reserve:
+        raise ValueError("Segment header too large")
+
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, section in sections.items():
+            f.seek(layout[name][0])
+            f.write(np.ascontiguousarray(section).tobytes())
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class RecordSegment:
+    """Read-only records, fragments and postings, mapped from a file or built in memory."""
+
+    def __init__(self, sections: Dict[str, np.ndarray], path: Optional[Path] = None, nbytes: int = 0):
+        self.path = path
+        self.count = len(sections["id_rows"])
+        # Bytes of the mapped file (0 for a segment built in memory)
+        self.nbytes = nbytes
+        self._id_hashes = sections["id_hashes"]
+        self._id_rows = sections["id_rows"]
+        self._blobs = {
+            name: (sections[f"{name}_offsets"], sections[f"{name}s"]) for name in ("id", "record", "fragment")
+        }
+        self.lengths = sections["lengths"]
+        self.avg_length = float(self.lengths.mean()) if self.count else 0.0
+        self.terms = PostingTable.from_sections("terms", sections)
+        self.titles = PostingTable.from_sections("titles", sections)
+        self.title_terms = PostingTable.from_sections("title_terms", sections)
+        # Rows matching each filter, computed on first use
+        self.masks: Dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, Tuple[str, ...], Optional[str]]]) -> "RecordSegment":
+        """A segment held in memory, for records that were never saved as one."""
+        return cls(build_sections(rows))
+
+    @classmethod
+    def open(cls, path: Path) -> "RecordSegment":
+        """Map a segment file, reading only its header."""
+        path = Path(path)
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a record segment: {path}")
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size).decode("utf-8"))
+        if header["version"] != FORMAT_VERSION or tuple(header["fields"]) != FIELDS \
+                or header["title_boost"] != TITLE_BOOST:
+            raise ValueError(f"Record segment {path} has an older format")
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        sections = {}
+        for name, (offset, dtype, shape) in header["sections"].items():
+            dtype = np.dtype(dtype)
+            size = dtype.itemsize * int(np.prod(shape))
+            sections[name] = data[offset:offset + size].view(dtype).reshape(shape)
+        return cls(sections, path, len(data))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _item(self, name: str, row: int) -> bytes:
+        offsets, blob = self._blobs[name]
+        return blob[int(offsets[row]):int(offsets[row + 1])].tobytes()
+
+    def row(self, doc_id: str) -> Optional[int]:
+        """Row of a document ID, or None."""
+        target = np.uint64(key_hash(doc_id))
+        i = int(np.searchsorted(self._id_hashes, target))
+        while i < self.count and self._id_hashes[i] == target:
+            row = int(self._id_rows[i])
+            if self.id(row) == doc_id:
+                return row
+            i += 1
+        return None
+
+    def id(self, row: int) -> str:
+        return self._item("id", row).decode("utf-8")
+
+    def fields(self, row: int) -> Tuple[str, ...]:
+        """The ``FIELDS`` values of a row."""
+        return tuple(json.loads(self._item("record", row)))
+
+    def fragment(self, row: int) -> Optional[str]:
+        return self._item("fragment", row).decode("utf-8") or None
+
+    def ids(self) -> List[str]:
+        offsets, blob = self._blobs["id"]
+        data = blob.tobytes()
+        offsets = offsets.astype(np.int64)
+        return [data[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        """The fields filters match on."""
+        doc_type, source, _, _, link = self.fields(row)
+        return {"type": doc_type, "source": source, "link": link}
@@ -0,0 +1,226 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+from app.models.payloads import render_document
+from app.services.record_segment import FIELDS, RecordSegment, build_sections, write_segment
+
+
+class RecordStore:
+    """Document fields stored once per document, keyed by the stable document ID.
+
+    The vector backends keep only the fields queries filter on (type, source
+    and link) next to each vector; titles and descriptions live here and
+    results are rebuilt from them. Chunks of a document share its record.
+
+    Saved records live in a memory-mapped segment file (see
+    ``app.services.record_segment``) together with each document's rendered
+    public JSON and the lexical index's BM25 postings, so opening a store
+    reads only the segment header and every process serving it shares the
+    pages. Changes since the last save are held in memory and win over the
+    segment; ``save`` writes a new segment, which is when fragments are
+    rendered and postings built.
+
+    Stores saved as JSON by earlier versions (``<path>.json``) are read into
+    a segment in memory and written out as a segment on the next save.
+    """
+
+    VERSION = 1
+    FIELDS = FIELDS
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.legacy_path = self.path.with_name(self.path.name + ".json")
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._segment = RecordSegment.build([])
+        # Unsaved changes: fields per document ID, or None once deleted
+        self._changes: Dict[str, Optional[Tuple[str, ...]]] = {}
+        self._fragments: Dict[str, Optional[str]] = {}
+        # Kept up to date on every change so count and memory_bytes are O(1)
+        self._count = 0
+        self._change_bytes = 0
+        self._dirty = False
+        self.loaded = self.load()
+
+    @property
+    def segment(self) -> RecordSegment:
+        """The last saved records and their postings, which the lexical index serves."""
+        return self._segment
+
+    def _current(self, doc_id: str) -> Optional[Tuple[str, ...]]:
+        if doc_id in self._changes:
+            return self._changes[doc_id]
+        row = self._segment.row(doc_id)
+        return None if row is None else self._segment.fields(row)
+
+    def _change_size(self, doc_id: str) -> int:
+        """Approximate bytes of a document's unsaved change (under the lock)."""
+        if doc_id not in self._changes:
+            return 0
+        record, fragment = self._changes[doc_id], self._fragments.get(doc_id)
+        return len(doc_id) + sum(map(len, record or ())) + len(fragment or "")
+
+    def put(self, doc_id: str, source: str, doc: Dict[str, Any]) -> None:
+        """Insert or replace the record of a processed document (or chunk)."""
+        data = doc["data"]
+        record = (doc["type"], source, data["title"], data["description"], data["link"])
+        with self._lock:
+            current = self._current(doc_id)
+            if current != record:
+                self._count += current is None
+                self._change_bytes -= self._change_size(doc_id)
+                self._changes[doc_id] = record
+                self._fragments[doc_id] = render_document(doc["type"], data)
+                self._change_bytes += self._change_size(doc_id)
+                self._dirty = True
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Return a document in result shape (source, type, data and its rendered fragment), or None."""
+        changes, segment = self._changes, self._segment
+        if doc_id in changes:
+            record, fragment = changes.get(doc_id), self._fragments.get(doc_id)
+        else:
+            row = segment.row(doc_id)
+            record = None if row is None else segment.fields(row)
+            fragment = None if row is None else segment.fragment(row)
+        if record is None:
+            return None
+        doc_type, source, title, description, link = record
+        return {
+            "source": source,
+            "type": doc_type,
+            "data": {"title": title, "description": description, "link": link},
+            "fragment": fragment,
+        }
+
+    def _rows(self) -> Iterator[Tuple[str, Tuple[str, ...], Optional[str]]]:
+        """(document ID, fields, fragment) of every record, saved and unsaved."""
+        segment, changes = self._segment, dict(self._changes)
+        for row, doc_id in enumerate(segment.ids()):
+            if doc_id not in changes:
+                yield doc_id, segment.fields(row), segment.fragment(row)
+        for doc_id, record in changes.items():
+            if record is not None:
+                yield doc_id, record, self._fragments.get(doc_id)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over a snapshot of (document ID, document) pairs."""
+        for doc_id in list(self.ids()):
+            doc = self.get(doc_id)
+            if doc is not None:
+                yield doc_id, doc
+
+    def ids(self) -> Set[str]:
+        """Return the IDs of all stored documents."""
+        with self._lock:
+            ids = set(self._segment.ids())
+            for doc_id, record in self._changes.items():
+                if record is None:
+                    ids.discard(doc_id)
+                else:
+                    ids.add(doc_id)
+            return ids
+
+    def sources(self) -> Set[str]:
+        """Return the source files of all stored documents; reads every record."""
+        with self._lock:
+            segment, changes = self._segment, dict(self._changes)
+        sources = {segment.fields(row)[1] for row, doc_id in enumerate(segment.ids()) if doc_id not in changes}
+        sources.update(record[1] for record in changes.values() if record is not None)
+        return sources
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Delete records by document ID, returning how many existed."""
+        deleted = 0
+        with self._lock:
+            for doc_id in ids:
+                if self._current(doc_id) is not None:
+                    self._change_bytes -= self._change_size(doc_id)
+                    self._changes[doc_id] = None
+                    self._fragments.pop(doc_id, None)
+                    self._change_bytes += len(doc_id)
+                    deleted += 1
+            if deleted:
+                self._count -= deleted
+                self._dirty = True
+        return deleted
+
+    def count(self) -> int:
+        return self._count
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes of the mapped segment plus unsaved record text and fragments."""
+        return self._segment.nbytes + self._change_bytes
+
+    def reset(self) -> None:
+        with self._lock:
+            self._segment = RecordSegment.build([])
+            self._changes = {}
+            self._fragments = {}
+            self._count = 0
+            self._change_bytes = 0
+            self._dirty = True
+
+    def load(self) -> bool:
+        """Open the saved records, returning False if there is no usable file."""
+        dirty = False
+        if self.path.exists():
+            try:
+                segment = RecordSegment.open(self.path)
+            except Exception as e:
+                self.logger.warning(f"Ignoring unreadable record store {self.path}: {str(e)}")
+                return False
+        elif self.legacy_path.exists():
+            segment = self._load_legacy()
+            if segment is None:
+                return False
+            dirty = True
+        else:
+            return False
+        with self._lock:
+            self._segment = segment
+            self._changes = {}
+            self._fragments = {}
+            self._count = segment.count
+            self._change_bytes = 0
+            self._dirty = dirty
+        self.logger.info(f"Opened {segment.count} document records from {self.path}")
+        return True
+
+    def _load_legacy(self) -> Optional[RecordSegment]:
+        """Read a store saved as JSON, rendering fragments and postings in memory."""
+        try:
+            with open(self.legacy_path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable record store {self.legacy_path}: {str(e)}")
+            return None
+        if data.get("version") != self.VERSION or tuple(data.get("fields", ())) != self.FIELDS:
+            self.logger.info("Record store is stale (format changed)")
+            return None
+        return RecordSegment.build(
+            (doc_id, tuple(values), render_document(values[0], dict(zip(("title", "description", "link"), values[2:]))))
+            for doc_id, values in data.get("records", {}).items()
+        )
+
+    def save(self) -> None:
+        """Atomically write the records as a new segment if they changed.
+
+        Rewrites every record and rebuilds the postings, which is paid by
+        the writer once per indexing run rather than on any request path.
+        """
+        with self._lock:
+            if not self._dirty and self.path.exists():
+                return
+            write_segment(self.path, build_sections(self._rows()))
+            segment = RecordSegment.open(self.path)
+            self._segment = segment
+            self._changes = {}
+            self._fragments = {}
+            self._count = segment.count
+            self._change_bytes = 0
+            self._dirty = False
+        self.legacy_path.unlink(missing_ok=True)
+        self.loaded = True
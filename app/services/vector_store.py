@@ -1,140 +1,489 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from chromadb.utils import embedding_functions
 import numpy as np
-from typing import List, Dict, Any
+from collections import Counter
+from typing import List, Dict, Any, Optional, Set, Tuple
+import json
 import logging
+import os
+import threading
 from pathlib import Path
 from app.core.config import settings
+from app.services.backends.base import MetadataFilter, VectorBackend
+from app.services.record_store import RecordStore
+from app.core.metrics import metrics, trace_enabled
+
+# Metadata keys of stores written before the record store, dropped on migration
+LEGACY_FIELDS = ("title", "description", "content")
+
+def compact_metadata(source: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata stored with each vector: the filter fields plus chunk position."""
+    metadata = {"source": source, "type": doc["type"], "link": doc["data"]["link"]}
+    if "parent_id" in doc:
+        metadata["parent_id"] = doc["parent_id"]
+        metadata["chunk"] = doc["chunk"]
+    return metadata
+
+def backend_path(name: str, persist_dir: str, collection_name: str) -> Optional[Path]:
+    """Index file of a file-based backend; None for Chroma, which manages its own files."""
+    suffix = {"numpy": "npz", "ivf": "npz", "mmap": "idx"}.get(name)
+    return Path(persist_dir) / name / f"{collection_name}.{suffix}" if suffix else None
+
+def create_backend(name: str, persist_dir: str, collection_name: str) -> VectorBackend:
+    """Instantiate the vector backend selected by name."""
+    if name == "chroma":
+        from app.services.backends.chroma_backend import ChromaBackend
+        return ChromaBackend(persist_dir, collection_name)
+    if name == "numpy":
+        from app.services.backends.numpy_backend import NumpyBackend
+        return NumpyBackend(backend_path(name, persist_dir, collection_name))
+    if name == "ivf":
+        from app.services.backends.ivf_backend import IVFBackend
+        return IVFBackend(
+            backend_path(name, persist_dir, collection_name),
+            nlist=settings.IVF_NLIST,
+            nprobe=settings.IVF_NPROBE,
+            min_train_size=settings.IVF_MIN_TRAIN_SIZE
+        )
+    if name == "mmap":
+        from app.services.backends.mmap_backend import MmapBackend
+        return MmapBackend(backend_path(name, persist_dir, collection_name), dtype=settings.INDEX_DTYPE)
+    raise ValueError(f"Unknown vector backend: {name}")
+
+def drop_backend(name: str, persist_dir: str, collection_name: str) -> None:
+    """Delete a collection's vectors without loading them."""
+    if name == "chroma":
+        from app.services.backends.chroma_backend import ChromaBackend
+        ChromaBackend.drop(persist_dir, collection_name)
+        return
+    path = backend_path(name, persist_dir, collection_name)
+    if path is None:
+        raise ValueError(f"Unknown vector backend: {name}")
+    path.unlink(missing_ok=True)
+    if name == "ivf":
+        path.with_suffix(".ivf.npz").unlink(missing_ok=True)
 
 class VectorStore:
-    def __init__(self):
+    """Vectors in a backend plus the document records results are built from.
+
+    Writes go to the active version of the collection. A full rebuild
+    instead goes to a new version (``documents-v3``) from ``stage``, built
+    while queries keep being served from the active one, and ``activate``
+    swaps it in at once by replacing the snapshot pointer. The version it
+    replaces is kept for ``rollback``; older ones are deleted once no query
+    is still running against them.
+
+    A ``read_only`` store (a reader worker's replica) never writes: it does
+    not migrate legacy stores or delete retired versions, and ``flush``,
+    ``reset``, ``stage``, ``activate`` and ``rollback`` raise
+    PermissionError. The writer does all of that.
+    """
+
+    def __init__(self, persist_dir: str = settings.CHROMADB_DIR, collection_name: str = "documents",
+                 backend: Optional[str] = None, staging: bool = False, read_only: bool = False):
         self.logger = logging.getLogger(__name__)
-        self.client = chromadb.PersistentClient(
-            path=settings.CHROMADB_DIR,
-            settings=ChromaSettings(
-                allow_reset=True,
-                is_persistent=True
-            )
-        )
-        self.collection = self.client.get_or_create_collection(
-            name="documents",
-            embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name=settings.EMBEDDING_MODEL
-            )
+        self.backend_name = backend or settings.VECTOR_BACKEND
+        self.persist_dir = Path(persist_dir)
+        self.base_name = collection_name
+        self.read_only = read_only
+        # Replaced after every flush, pointing at the active version; replicas
+        # reload when it changes. A staging store is not published.
+        self.snapshot_path = None if staging else self.persist_dir / f"{collection_name}.snapshot"
+        pointer = self._read_pointer()
+        active = pointer.get("active", collection_name)
+        self.previous: Optional[str] = pointer.get("previous")
+        self._retired: List[str] = list(pointer.get("retired", []))
+        self._lock = threading.Lock()
+        self._inflight: Counter = Counter()
+        # (collection name, backend, records), replaced as one so a query
+        # never mixes the vectors of one version with the records of another
+        self._active = (active, *self._open(active))
+        self._snapshot = self._snapshot_key()
+        # Bumped on every write so caches keyed on it never serve stale results
+        self.generation = 0
+        self.logger.info(f"Initialized {self.backend_name} vector store ({active})")
+        if not self.records.loaded and self.backend.count():
+            if read_only:
+                self.logger.warning("Vector store needs migrating to compact records; the writer does that")
+            else:
+                self.migrate_records()
+
+    @property
+    def collection_name(self) -> str:
+        return self._active[0]
+
+    @property
+    def backend(self) -> VectorBackend:
+        return self._active[1]
+
+    @property
+    def records(self) -> RecordStore:
+        return self._active[2]
+
+    def _open(self, collection_name: str) -> Tuple[VectorBackend, RecordStore]:
+        return (
+            create_backend(self.backend_name, str(self.persist_dir), collection_name),
+            RecordStore(self.persist_dir / f"{collection_name}.records"),
         )
-        self.logger.info("Initialized ChromaDB vector store")
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise PermissionError(f"Vector store {self.persist_dir} is open read-only")
+
+    def _version(self, collection_name: str) -> int:
+        suffix = collection_name[len(self.base_name):]
+        return int(suffix[2:]) if suffix.startswith("-v") and suffix[2:].isdigit() else 0
 
     def add_documents(self, documents: Dict[str, List[Dict[str, Any]]], embeddings: Dict[str, List[np.ndarray]]) -> None:
-        """Add documents and their embeddings to the vector store."""
+        """Add documents and their embeddings to the vector store.
+
+        Each vector is stored with only the fields filters need; the title
+        and description go to the record store once per document.
+        """
         try:
             for source, source_docs in documents.items():
                 source_embeddings = embeddings[source]
                 
-                # Create unique IDs for each document
-                ids = [f"{source}_{i}" for i in range(len(source_docs))]
-                
-                # Extract document content for embedding and search
-                docs_content = []
-                for doc in source_docs:
-                    title = doc['data']['title']
-                    description = doc['data']['description']
-                    # Store full text for search with proper spacing
-                    content = f"{title}. {description}"
-                    docs_content.append(content)
-                    self.logger.info(f"Adding document: {content}")
+                # Use the stable document IDs assigned by the processor
+                ids = [doc.get('id', f"{source}_{i}") for i, doc in enumerate(source_docs)]
                 
-                # Flatten document data into metadata with primitive types
                 metadatas = []
-                for doc in source_docs:
-                    metadata = {
-                        "source": source,
-                        "type": doc["type"],
-                        "title": doc["data"]["title"],
-                        "description": doc["data"]["description"],
-                        "link": doc["data"]["link"],
-                        "content": f"{doc['data']['title']}. {doc['data']['description']}"  # Add full content to metadata
-                    }
-                    metadatas.append(metadata)
+                for doc_id, doc in zip(ids, source_docs):
+                    # Chunks share their parent's record
+                    self.records.put(doc.get("parent_id", doc_id), source, doc)
+                    metadatas.append(compact_metadata(source, doc))
                 
-                # Add documents to collection
-                self.collection.add(
-                    documents=docs_content,
-                    embeddings=source_embeddings,
-                    ids=ids,
-                    metadatas=metadatas
-                )
-                self.logger.info(f"Added {len(docs_content)} documents to collection")
+                # Upsert so re-indexing a changed document replaces it in place
+                self.backend.upsert(ids, np.asarray(source_embeddings), metadatas, [None] * len(ids))
+                self.generation += 1
+                self.logger.debug("Added %d documents from %s", len(ids), source)
                 
-            self.logger.info(f"Added {sum(len(d) for d in documents.values())} documents to vector store")
+            self.logger.debug("Added %d documents to vector store", sum(len(d) for d in documents.values()))
         except Exception as e:
             self.logger.error(f"Error adding documents to vector store: {str(e)}")
             raise
 
-    def query(self, query_embedding: np.ndarray, limit: int = settings.MAX_RESULTS) -> List[Dict[str, Any]]:
-        """Query the vector store for similar documents."""
+    def query(self, query_embedding: np.ndarray, limit: int = settings.MAX_RESULTS,
+              where: Optional[MetadataFilter] = None) -> List[Dict[str, Any]]:
+        """Query the vector store for similar documents, optionally scoped by a filter."""
+        return self.query_batch([query_embedding], [limit], where)[0]
+
+    def query_batch(self, query_embeddings: List[np.ndarray], limits: List[int],
+                    where: Optional[MetadataFilter] = None) -> List[List[Dict[str, Any]]]:
+        """Query the vector store for several embeddings in one backend call.
+
+        The filter is pushed down into the backend, so only matching
+        documents are ranked. Chunks of a document collapse into one
+        result, so queries whose hits hold fewer than ``limit`` distinct
+        documents are asked again for four times as many hits, until they
+        do or the store has no more. Returns one result list per
+        embedding, in input order.
+        """
+        # Pin the active version for the whole query, even if a swap lands midway
+        with self._lock:
+            collection_name, backend, records = self._active
+            self._inflight[collection_name] += 1
         try:
-            # Query with logging
-            self.logger.info(f"Querying collection with limit: {limit}")
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=limit * 2,  # Get more results to filter by score
-                include=["documents", "metadatas", "distances"]
-            )
-            self.logger.info(f"Got {len(results['metadatas'][0])} results")
-            
-            # Log raw results for debugging
-            for i, (doc, meta, dist) in enumerate(zip(
-                results["documents"][0],
-                results["metadatas"][0],
-                results["distances"][0]
-            )):
-                self.logger.info(f"Raw result {i}:")
-                self.logger.info(f"  Content: {doc}")
-                self.logger.info(f"  Distance: {dist}")
-            
-            # Format results and sort by score
-            formatted_results = []
-            for i in range(len(results["metadatas"][0])):
-                metadata = results["metadatas"][0][i]
-                distance = results["distances"][0][i]
-                score = 1 - (distance / 2)  # Convert distance to similarity score
-                
-                # Include all results for vector store operations test
-                formatted_results.append({
-                    "source": metadata["source"],
-                    "score": score,
-                    "type": metadata["type"],
-                    "data": {
-                        "title": metadata["title"],
-                        "description": metadata["description"],
-                        "link": metadata["link"]
-                    }
-                })
-            
-            # Sort by score descending
-            formatted_results.sort(key=lambda x: x["score"], reverse=True)
-            
-            # Apply score threshold only for semantic search
-            if len(formatted_results) > 0 and formatted_results[0]["score"] >= 0.4:
-                formatted_results = [r for r in formatted_results if r["score"] >= 0.4]
-            
-            # Limit results
-            formatted_results = formatted_results[:limit]
-            
-            return formatted_results
+            with metrics.stage("search"):
+                results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+                # Get more results to filter by score and collapse chunks
+                fetch = max(limits) * 2
+                remaining = list(range(len(query_embeddings)))
+                while remaining:
+                    hits = backend.query([query_embeddings[i] for i in remaining], n_results=fetch, where=where)
+                    short = []
+                    for i, query_hits in zip(remaining, hits):
+                        results[i] = self._format_results(query_hits, limits[i], records)
+                        # Fewer hits than asked for means there are no more to fetch
+                        if len(query_hits) == fetch and self._documents(query_hits) < limits[i]:
+                            short.append(i)
+                    remaining = short
+                    fetch *= 4
+                return results
         except Exception as e:
             self.logger.error(f"Error querying vector store: {str(e)}")
             raise
+        finally:
+            with self._lock:
+                self._inflight[collection_name] -= 1
+                drained = not self._inflight[collection_name] and collection_name in self._retired
+            if drained:
+                self.collect_garbage()
+
+    @staticmethod
+    def _documents(hits: List[Dict[str, Any]]) -> int:
+        """Number of distinct documents among chunk hits."""
+        return len({hit["metadata"].get("parent_id", hit["id"]) for hit in hits})
+
+    def _format_results(self, hits: List[Dict[str, Any]], limit: int,
+                        records: RecordStore) -> List[Dict[str, Any]]:
+        """Convert raw backend hits into scored, thresholded results."""
+        # Trace raw hits for a sample of queries only
+        if trace_enabled(self.logger):
+            for i, hit in enumerate(hits):
+                self.logger.debug("Raw result %d: id=%s distance=%.4f", i, hit["id"], hit["distance"])
+
+        # Format results, collapsing chunk hits to the best one per document
+        formatted_results = []
+        seen = set()
+        for hit in hits:
+            metadata = hit["metadata"]
+            doc_id = metadata.get("parent_id", hit["id"])
+            # Hits arrive nearest first, so the first chunk seen scores best
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            record = records.get(doc_id)
+            if record is None:
+                self.logger.warning(f"No record for document {doc_id}")
+                continue
+            score = 1 - (hit["distance"] / 2)  # Convert distance to similarity score
+
+            # Include all results for vector store operations test
+            formatted_results.append({
+                "id": doc_id,
+                "source": record["source"],
+                "score": score,
+                "type": record["type"],
+                "data": record["data"],
+                "fragment": record["fragment"]
+            })
+
+        # Sort by score descending
+        formatted_results.sort(key=lambda x: x["score"], reverse=True)
+
+        # Apply score threshold only for semantic search
+        if len(formatted_results) > 0 and formatted_results[0]["score"] >= 0.4:
+            formatted_results = [r for r in formatted_results if r["score"] >= 0.4]
+
+        # Limit results
+        return formatted_results[:limit]
+
+    def delete_documents(self, ids: List[str]) -> None:
+        """Delete documents from the vector store by ID.
+
+        Records are kept, since a deleted chunk's document may live on in
+        other chunks; ``prune_records`` drops the ones no longer indexed.
+        """
+        try:
+            if ids:
+                self.backend.delete(ids)
+                self.generation += 1
+            self.logger.info(f"Deleted {len(ids)} documents from vector store")
+        except Exception as e:
+            self.logger.error(f"Error deleting documents from vector store: {str(e)}")
+            raise
+
+    def prune_records(self, live_ids: Set[str]) -> int:
+        """Delete the records of documents not in live_ids, returning how many."""
+        deleted = self.records.delete([doc_id for doc_id in self.records.ids() if doc_id not in live_ids])
+        if deleted:
+            self.generation += 1
+            self.logger.info(f"Pruned {deleted} document records")
+        return deleted
+
+    def count(self) -> int:
+        """Return the number of documents in the vector store."""
+        return self.backend.count()
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes of vectors and document records held in memory."""
+        return self.backend.memory_bytes() + self.records.memory_bytes()
+
+    def flush(self) -> None:
+        """Persist pending writes to disk and publish them to replicas."""
+        self._check_writable()
+        self.backend.flush()
+        self.records.save()
+        self._publish()
+
+    def _snapshot_key(self) -> Optional[Tuple[int, int]]:
+        if self.snapshot_path is None:
+            return None
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_pointer(self) -> Dict[str, Any]:
+        """The published snapshot: active, previous and retired versions plus counts."""
+        if self.snapshot_path is None:
+            return {}
+        try:
+            with open(self.snapshot_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable snapshot pointer {self.snapshot_path}: {str(e)}")
+            return {}
+
+    def _publish(self) -> None:
+        """Mark the files on disk as a complete snapshot (vectors and records)."""
+        if self.snapshot_path is None:
+            return
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"active": self.collection_name, "previous": self.previous, "retired": self._retired,
+                       "backend": self.backend_name, "vectors": self.backend.count(),
+                       "records": self.records.count()}, f)
+        os.replace(tmp_path, self.snapshot_path)
+        self._snapshot = self._snapshot_key()
+
+    def reload(self) -> bool:
+        """Load the snapshot another process published since the last call.
+
+        For read-only replicas of a store written by one writer process:
+        vectors and records are reloaded together once the writer has
+        flushed both, and a swapped-in version is opened in place of the
+        old one. Returns whether a new snapshot was loaded.
+        """
+        key = self._snapshot_key()
+        if key is None or key == self._snapshot:
+            return False
+        self._snapshot = key
+        pointer = self._read_pointer()
+        active = pointer.get("active", self.base_name)
+        if active != self.collection_name:
+            self._switch(active, *self._open(active))
+        else:
+            self.backend.reload()
+            self.records.load()
+        self.previous = pointer.get("previous")
+        self.generation += 1
+        self.logger.info(
+            f"Loaded index snapshot {active}: {self.count()} vectors, {self.records.count()} records"
+        )
+        return True
+
+    def _switch(self, collection_name: str, backend: VectorBackend, records: RecordStore) -> None:
+        with self._lock:
+            self._active = (collection_name, backend, records)
+            self.generation += 1
+
+    def stage(self) -> "VectorStore":
+        """Return an empty store for the next version of the collection.
+
+        Fill and flush it, then ``activate`` it; until then queries are
+        served from the active version. Leftovers of a build that never
+        finished are cleared.
+        """
+        self._check_writable()
+        versions = [self.collection_name, self.previous, *self._retired]
+        version = max(self._version(name) for name in versions if name) + 1
+        staged = VectorStore(
+            str(self.persist_dir), f"{self.base_name}-v{version}", self.backend_name, staging=True
+        )
+        if staged.count() or staged.records.count():
+            staged.reset()
+        return staged
+
+    def activate(self, staged: "VectorStore") -> None:
+        """Swap a version built with ``stage`` in as the active one.
+
+        The pointer is replaced atomically, so readers in this and other
+        processes move from one complete version to the other. The replaced
+        version becomes the rollback target and the one before it is retired.
+        """
+        self._check_writable()
+        staged.flush()
+        with self._lock:
+            if self.previous and self.previous not in self._retired:
+                self._retired.append(self.previous)
+            self.previous = self.collection_name
+        self._switch(staged.collection_name, staged.backend, staged.records)
+        self._publish()
+        self.logger.info(f"Activated index version {self.collection_name} (previous {self.previous})")
+        self.collect_garbage()
+
+    def rollback(self) -> str:
+        """Make the previous version active again, returning its name.
+
+        The version rolled back from becomes the previous one, so rolling
+        back twice restores it.
+        """
+        self._check_writable()
+        if not self.previous:
+            raise ValueError("No previous index version to roll back to")
+        target = self.previous
+        self.previous = self.collection_name
+        self._switch(target, *self._open(target))
+        self._publish()
+        self.logger.info(f"Rolled back to index version {target}")
+        return target
+
+    def collect_garbage(self) -> List[str]:
+        """Delete retired versions that no query is using; returns their names.
+
+        Versions with queries still in flight are dropped when the last one
+        finishes. A read-only store leaves them to the writer.
+        """
+        if self.read_only:
+            return []
+        with self._lock:
+            idle = [name for name in self._retired if not self._inflight[name]]
+        dropped = []
+        for name in idle:
+            try:
+                drop_backend(self.backend_name, str(self.persist_dir), name)
+                (self.persist_dir / f"{name}.records").unlink(missing_ok=True)
+                (self.persist_dir / f"{name}.records.json").unlink(missing_ok=True)
+            except Exception as e:
+                self.logger.error(f"Error deleting index version {name}: {str(e)}")
+                continue
+            dropped.append(name)
+            self.logger.info(f"Deleted retired index version {name}")
+        # The pointer catches up on the next publish; dropping twice is harmless
+        with self._lock:
+            self._retired = [name for name in self._retired if name not in dropped]
+        return dropped
+
+    def migrate_records(self, batch_size: int = 1000) -> int:
+        """Rewrite a store written before the record store existed.
+
+        Such stores kept the title, description and a combined content
+        string in every vector's metadata, plus the content again as the
+        document. The fields are copied into the record store, which is
+        saved before the backend is stripped so an interrupted migration
+        never loses text. Returns the number of vectors rewritten.
+        """
+        self._check_writable()
+        self.logger.info("Migrating vector store to compact records")
+        for ids, _, metadatas in self.backend.scan(batch_size):
+            for vector_id, metadata in zip(ids, metadatas):
+                if "title" not in metadata:
+                    continue
+                doc = {
+                    "type": metadata["type"],
+                    "data": {field: metadata.get(field, "") for field in ("title", "description", "link")},
+                }
+                self.records.put(metadata.get("parent_id", vector_id), metadata["source"], doc)
+        self.records.save()
+
+        rewritten = 0
+        for ids, embeddings, metadatas in self.backend.scan(batch_size):
+            compact = [{k: v for k, v in m.items() if k not in LEGACY_FIELDS} for m in metadatas]
+            self.backend.rewrite(ids, embeddings, compact)
+            rewritten += len(ids)
+        self.backend.flush()
+
+        # The lexical index used to persist its own copy of the documents
+        legacy_lexical = self.persist_dir / "lexical.json"
+        if legacy_lexical.exists():
+            legacy_lexical.unlink()
+        self.generation += 1
+        self.logger.info(f"Migrated {rewritten} vectors and {self.records.count()} document records")
+        return rewritten
 
     def reset(self) -> None:
         """Reset the vector store by deleting all documents."""
+        self._check_writable()
         try:
-            # Get all document IDs
-            result = self.collection.get()
-            if result and result['ids']:
-                # Delete all documents by their IDs
-                self.collection.delete(ids=result['ids'])
+            self.backend.reset()
+            self.records.reset()
+            self.records.save()
+            self._publish()
+            self.generation += 1
             self.logger.info("Reset vector store")
         except Exception as e:
             self.logger.error(f"Error resetting vector store: {str(e)}")
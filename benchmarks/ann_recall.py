@@ -0,0 +1,76 @@
+"""Recall/latency trade-off of the IVF approximate index against exact search.
+
+Usage::
+
+    python -m benchmarks.ann_recall --rows 200000 --dim 384 --queries 200 --nprobe 1 4 8 16 32
+
+Prints one JSON object with the exact float32 baseline, the IVF training
+time and, per ``nprobe`` value, recall@k against the exact results and
+p50/p99 query latency.
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+from app.services.backends.ivf_backend import IVFBackend
+from app.services.backends.numpy_backend import NumpyBackend
+from benchmarks.quantized_index import clustered_vectors, recall, timed_queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF cells, 0 for sqrt(rows)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.rows, args.dim, args.clusters, seed=0)
+    queries = list(clustered_vectors(args.queries, args.dim, args.clusters, seed=1))
+    ids = [f"doc_{i}" for i in range(args.rows)]
+    metadatas = [{"row": i} for i in range(args.rows)]
+    documents = [None] * args.rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        exact = NumpyBackend(tmp / "exact.npz")
+        exact.upsert(ids, vectors, metadatas, documents)
+        expected, latencies = timed_queries(exact, queries, args.k)
+        report = {
+            "rows": args.rows,
+            "dim": args.dim,
+            "k": args.k,
+            "exact": {
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+            },
+        }
+
+        ivf = IVFBackend(tmp / "ivf.npz", nlist=args.nlist, min_train_size=0)
+        ivf.upsert(ids, vectors, metadatas, documents)
+        start = time.perf_counter()
+        ivf.train()
+        report["ivf"] = {
+            "nlist": len(ivf._centroids),
+            "train_ms": (time.perf_counter() - start) * 1000,
+        }
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            actual, latencies = timed_queries(ivf, queries, args.k)
+            report["ivf"][f"nprobe_{nprobe}"] = {
+                "recall": recall(expected, actual),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Compare two benchmark reports written by ``benchmarks.pipeline``.
+
+Usage::
+
+    python -m benchmarks.compare baseline.json current.json
+
+Prints one JSON object mapping every numeric stage result present in both
+reports (e.g. ``query.p99_ms``) to its baseline and current values and the
+relative change, where positive means the current run is larger.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+
+def flatten(values: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Map dotted paths to the numeric leaves of a nested dict."""
+    flat = {}
+    for key, value in values.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    before = flatten(baseline.get("stages", {}))
+    after = flatten(current.get("stages", {}))
+    return {
+        path: {
+            "baseline": before[path],
+            "current": after[path],
+            "change": (after[path] - before[path]) / before[path] if before[path] else None,
+        }
+        for path in before if path in after
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    args = parser.parse_args()
+    print(json.dumps(compare(json.loads(args.baseline.read_text()), json.loads(args.current.read_text())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
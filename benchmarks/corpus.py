@@ -0,0 +1,123 @@
+"""Synthetic products.yml/pages.yml corpora in the format of documents/.
+
+Usage::
+
+    python -m benchmarks.corpus --documents 100000 --output /tmp/corpus
+
+Titles, links and descriptions are drawn from a small vocabulary with a
+fixed seed, so the same arguments always produce the same files. Titles
+are mostly unique but share words, like a real catalogue, and a fraction
+of descriptions is long enough to be split into chunks. Documents are
+written as they are generated, so memory use does not grow with the
+corpus size.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, TextIO
+import numpy as np
+
+ADJECTIVES = [
+    "peaceful", "playful", "curious", "sleepy", "golden", "quiet", "bright", "ancient", "wild", "gentle",
+    "misty", "silver", "hidden", "rustic", "vivid", "frozen", "sunny", "stormy", "tiny", "grand",
+]
+NOUNS = [
+    "cat", "dog", "forest", "river", "mountain", "harbor", "garden", "city", "meadow", "lighthouse",
+    "owl", "fox", "bridge", "desert", "island", "village", "canyon", "lake", "train", "castle",
+]
+TOPICS = [
+    "pricing", "license", "shipping", "support", "gallery", "about", "contact", "faq", "terms", "blog",
+]
+FILLER = [
+    "picture", "print", "image", "high", "resolution", "personal", "use", "framed", "canvas", "colour",
+    "light", "evening", "morning", "detail", "soft", "shadow", "view", "classic", "modern", "style",
+]
+
+
+def sentences(rng: np.random.Generator, words: int) -> List[str]:
+    """Short lowercase sentences totalling about ``words`` words."""
+    vocabulary = ADJECTIVES + NOUNS + FILLER
+    lines = []
+    while words > 0:
+        length = int(min(words, rng.integers(6, 14)))
+        picked = rng.choice(len(vocabulary), size=length)
+        lines.append("This " + " ".join(vocabulary[i] for i in picked) + ".")
+        words -= length
+    return lines
+
+
+def iter_documents(count: int, kind: str, seed: int, words: int,
+                   long_fraction: float, long_words: int) -> Iterator[Dict[str, object]]:
+    """Yield ``count`` documents of kind "product" or "page"."""
+    rng = np.random.default_rng([seed, 0 if kind == "product" else 1])
+    for i in range(count):
+        if kind == "product":
+            title = f"{ADJECTIVES[rng.integers(len(ADJECTIVES))].title()} {NOUNS[rng.integers(len(NOUNS))].title()} {i}"
+            link = f"/products/{title.lower().replace(' ', '-')}"
+        else:
+            topic = TOPICS[rng.integers(len(TOPICS))]
+            title = f"{topic.title()} {i}"
+            link = f"/pages/{topic}-{i}.html"
+        length = long_words if rng.random() < long_fraction else int(rng.integers(words // 2, words * 3 // 2 + 1))
+        yield {"title": title, "link": link, "description": sentences(rng, length)}
+
+
+def write_yaml(f: TextIO, label: str, documents: Iterator[Dict[str, object]]) -> int:
+    """Write documents as a YAML sequence of ``label`` items, returning the count."""
+    f.write("---\n")
+    written = 0
+    for doc in documents:
+        f.write(f"\n- {label}:\n    title: {doc['title']}\n    link: {doc['link']}\n    description: |\n")
+        for line in doc["description"]:
+            f.write(f"      {line}\n")
+        written += 1
+    return written
+
+
+def generate(output: Path, documents: int, page_fraction: float = 0.2, seed: int = 0, words: int = 40,
+             long_fraction: float = 0.02, long_words: int = 600) -> Dict[str, object]:
+    """Write products.yml and pages.yml under ``output`` and describe them."""
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    pages = int(round(documents * page_fraction))
+    counts = {}
+    for name, label, kind, count in (
+        ("products.yml", "Product", "product", documents - pages),
+        ("pages.yml", "Page", "page", pages),
+    ):
+        with open(output / name, "w", buffering=1 << 20) as f:
+            counts[name] = write_yaml(f, label, iter_documents(count, kind, seed, words, long_fraction, long_words))
+    return {
+        "directory": str(output),
+        "documents": documents,
+        "files": counts,
+        "bytes": sum((output / name).stat().st_size for name in counts),
+        "seed": seed,
+        "words": words,
+        "long_fraction": long_fraction,
+        "long_words": long_words,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--page-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--words", type=int, default=40, help="Mean description length in words")
+    parser.add_argument("--long-fraction", type=float, default=0.02,
+                        help="Fraction of descriptions long enough to be chunked")
+    parser.add_argument("--long-words", type=int, default=600)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, required=True)
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(generate(
+        args.output, args.documents, args.page_fraction, args.seed, args.words, args.long_fraction, args.long_words
+    ), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Throughput and drift of the embedding inference backends.
+
+Usage::
+
+    python -m benchmarks.inference --variants torch torch-int8 onnx onnx-int8 --threads 4
+
+Embeds the same synthetic documents and queries (from ``benchmarks.corpus``)
+with each variant and reports document throughput, single-query latency,
+and the cosine similarity of each variant's vectors to the first variant's
+(normally the ``torch`` reference). ONNX exports are cached in
+``--model-cache`` (``MODEL_CACHE_DIR`` by default), so the first ONNX run
+includes a one-time export that is not timed.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+from benchmarks import corpus
+from benchmarks.pipeline import environment, latency_summary
+
+VARIANTS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def parse_variant(variant: str) -> Tuple[str, bool]:
+    """Split a variant such as ``onnx-int8`` into (backend, quantize)."""
+    backend, _, suffix = variant.partition("-")
+    return backend, suffix == "int8"
+
+
+def sample_documents(count: int, seed: int, words: int) -> List[Dict[str, Any]]:
+    return [
+        {"data": {"title": doc["title"], "description": " ".join(doc["description"])}}
+        for doc in corpus.iter_documents(count, "product", seed, words, 0.0, words)
+    ]
+
+
+def sample_queries(count: int, seed: int) -> List[str]:
+    rng = np.random.default_rng(seed)
+    vocabulary = corpus.ADJECTIVES + corpus.NOUNS + corpus.FILLER
+    return [
+        " ".join(vocabulary[i] for i in rng.choice(len(vocabulary), size=int(rng.integers(2, 6))))
+        for _ in range(count)
+    ]
+
+
+def bench_variant(variant: str, model_name: str, threads: int, cache_dir: str, batch_size: int,
+                  documents: List[Dict[str, Any]], queries: List[str]) -> Tuple[Dict[str, Any], np.ndarray]:
+    from app.services.embeddings import EmbeddingService
+    from app.services.model_registry import ModelRegistry
+    backend, quantize = parse_variant(variant)
+    registry = ModelRegistry(backend=backend, quantize=quantize, threads=threads, cache_dir=cache_dir)
+    service = EmbeddingService(model_name, batch_size=batch_size, registry=registry)
+    start = time.perf_counter()
+    service.warm_up()
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embeddings = service.generate_embeddings(documents, use_cache=False)
+    seconds = time.perf_counter() - start
+
+    # One query per encode, as the batcher sees under light load
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        service.encode_queries([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "backend": registry.describe(),
+        "load_seconds": load_seconds,
+        "documents": len(documents),
+        "seconds": seconds,
+        "docs_per_sec": len(documents) / seconds,
+        "query": latency_summary(latencies),
+    }, embeddings
+
+
+def main() -> None:
+    from app.core.config import settings
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    parser.add_argument("--model-cache", default=settings.MODEL_CACHE_DIR)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=40, help="Mean description length in words")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=argparse.FileType("w"))
+    args = parser.parse_args()
+
+    documents = sample_documents(args.documents, args.seed, args.words)
+    queries = sample_queries(args.queries, args.seed)
+    report: Dict[str, Any] = {"environment": environment(), "config": {
+        k: v for k, v in vars(args).items() if k != "output"
+    }}
+    report["variants"] = {}
+    reference = None
+    for variant in args.variants:
+        print(f"Running {variant}", file=sys.stderr)
+        result, embeddings = bench_variant(
+            variant, args.model, args.threads, args.model_cache, args.batch_size, documents, queries
+        )
+        if reference is None:
+            reference = (variant, embeddings)
+        else:
+            # Vectors are L2-normalized, so the row-wise dot product is the cosine
+            cosines = (embeddings * reference[1]).sum(axis=1)
+            result["cosine_to_reference"] = {
+                "reference": reference[0],
+                "min": float(cosines.min()),
+                "mean": float(cosines.mean()),
+            }
+            result["speedup"] = result["docs_per_sec"] / report["variants"][reference[0]]["docs_per_sec"]
+        report["variants"][variant] = result
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Latency of the lexical fast path on a synthetic corpus.
+
+Usage::
+
+    python -m benchmarks.lexical --documents 200000 --queries 200
+
+Saves ``benchmarks.corpus`` products to a record store, which builds the
+segment with the BM25 postings, opens a ``LexicalIndex`` on it as a reader
+would, and times, per query class:
+
+- ``title``: exact product titles, which the index answers itself
+- ``title_term``: a title word shared by thousands of titles ("cat"), which
+  has to be scored before it falls through
+- ``non_title``: description words that no title contains, the common case
+  for natural-language queries
+
+For each class it reports the title check (``may_serve``, the only part
+that runs on the event loop), ``search`` with the default posting cap and
+``search`` scanning every posting, plus how many queries were served.
+Prints one JSON object, including the time to save the segment and to open
+it.
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+import numpy as np
+
+from app.services.lexical_index import LexicalIndex
+from app.services.record_store import RecordStore
+from benchmarks import corpus
+
+
+def timed(call: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        call(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed + 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "documents.records"
+        records = RecordStore(path)
+        titles = []
+        for i, doc in enumerate(corpus.iter_documents(args.documents, "product", args.seed, args.words, 0.0, 0)):
+            titles.append(doc["title"])
+            records.put(f"doc_{i}", "products.yml", {
+                "type": "product",
+                "data": {"title": doc["title"], "description": " ".join(doc["description"]), "link": doc["link"]},
+            })
+        start = time.perf_counter()
+        records.save()
+        save_seconds = time.perf_counter() - start
+
+        # What a reader, a lazily loaded corpus or a snapshot reload pays
+        start = time.perf_counter()
+        index = LexicalIndex(RecordStore(path))
+        open_ms = (time.perf_counter() - start) * 1000
+
+        queries = {
+            "title": [titles[i] for i in rng.integers(len(titles), size=args.queries)],
+            "title_term": [corpus.NOUNS[i] for i in rng.integers(len(corpus.NOUNS), size=args.queries)],
+            "non_title": [
+                " ".join(corpus.FILLER[j] for j in rng.choice(len(corpus.FILLER), size=3, replace=False))
+                for _ in range(args.queries)
+            ],
+        }
+        report = {"documents": args.documents, "queries": args.queries, "save_seconds": save_seconds,
+                  "open_ms": open_ms, "segment_bytes": path.stat().st_size, "max_postings": index.max_postings}
+        capped = index.max_postings
+        for name, batch in queries.items():
+            served = sum(index.search(query) is not None for query in batch)
+            index.max_postings = args.documents
+            uncapped = timed(index.search, batch)
+            index.max_postings = capped
+            report[name] = {
+                "may_serve": timed(index.may_serve, batch),
+                "search": timed(index.search, batch),
+                "search_uncapped": uncapped,
+                "served": served,
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""End-to-end ingest and query benchmark on a synthetic corpus.
+
+Usage::
+
+    python -m benchmarks.pipeline --documents 100000 --backend numpy --concurrency 16 \
+        --output results.json
+
+Generates a corpus with ``benchmarks.corpus`` (or reads ``--corpus``) and
+measures, each as its own stage:
+
+- ``parse``: ``DocumentProcessor`` throughput over the YAML files
+- ``embed``: ``EmbeddingService`` documents/sec on a sample of the corpus
+- ``write``: ``VectorStore.add_documents`` rate in indexer-sized batches;
+  the vectors are computed outside the timed section
+- ``query``: ``/api/query`` p50/p95/p99 latency and throughput under
+  concurrent load, through an in-process ASGI client against the store
+  built by ``write``
+
+``--vectors`` picks what ``write`` stores. ``model`` (the default when the
+query stage runs) embeds the corpus, which takes as long as indexing it;
+queries then find neighbours like real ones do, so chunk collapsing, the
+score threshold and the result cache behave as in production. ``random``
+(the default otherwise) stores unit-length random vectors, which is much
+faster but makes query results meaningless: every query is a full scan
+with near-equal distances, and the score threshold drops nearly every
+hit, so latencies measure the scan alone. The report records which was
+used.
+
+Prints one JSON object (and writes it to ``--output``) with the run's
+configuration, environment and per-stage results; compare two runs with
+``python -m benchmarks.compare``. Everything is written under a scratch
+directory, never to the configured store.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+
+from benchmarks import corpus
+
+STAGES = ("parse", "embed", "write", "query")
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(np.mean(latencies_ms)),
+        "max_ms": float(np.max(latencies_ms)),
+    }
+
+
+def batches(documents: Iterator[Tuple[str, Dict[str, Any]]], size: int) -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+    """Group streamed (source, document) pairs into batches keyed by source."""
+    batch: Dict[str, List[Dict[str, Any]]] = {}
+    count = 0
+    for source, doc in documents:
+        batch.setdefault(source, []).append(doc)
+        count += 1
+        if count == size:
+            yield batch
+            batch, count = {}, 0
+    if count:
+        yield batch
+
+
+def bench_parse(directory: Path, workers: int) -> Dict[str, Any]:
+    from app.services.document_processor import DocumentProcessor
+    processor = DocumentProcessor(parse_workers=workers)
+    # Chunking needs the tokenizer; load it outside the timed loop
+    processor.tokenizer
+    start = time.perf_counter()
+    documents = chunks = 0
+    for _, doc in processor.iter_directory(directory):
+        chunks += 1
+        documents += doc.get("chunk", 0) == 0
+    seconds = time.perf_counter() - start
+    size = sum(path.stat().st_size for path in directory.glob("*.yml"))
+    return {
+        "workers": workers,
+        "documents": documents,
+        "chunks": chunks,
+        "seconds": seconds,
+        "docs_per_sec": documents / seconds,
+        "mb_per_sec": size / seconds / 1e6,
+    }
+
+
+def bench_embed(directory: Path, sample: int) -> Dict[str, Any]:
+    from app.services.document_processor import DocumentProcessor
+    from app.services.embeddings import EmbeddingService
+    docs = []
+    for _, doc in DocumentProcessor().iter_directory(directory):
+        docs.append(doc)
+        if len(docs) == sample:
+            break
+    service = EmbeddingService()
+    service.warm_up()
+    start = time.perf_counter()
+    # Measure the model, not the persistent embedding cache
+    service.generate_embeddings(docs, use_cache=False)
+    seconds = time.perf_counter() - start
+    return {
+        "documents": len(docs),
+        "seconds": seconds,
+        "docs_per_sec": len(docs) / seconds,
+        "batch_size": service.batch_size,
+    }
+
+
+def bench_write(directory: Path, store_dir: Path, backend: str, dim: int, batch_size: int,
+                vectors: str) -> Dict[str, Any]:
+    from app.services.document_processor import DocumentProcessor
+    from app.services.vector_store import VectorStore
+    store = VectorStore(persist_dir=str(store_dir), backend=backend)
+    service = None
+    if vectors == "model":
+        from app.services.embeddings import EmbeddingService
+        service = EmbeddingService()
+    rng = np.random.default_rng(0)
+    written = 0
+    seconds = embed_seconds = 0.0
+    for batch in batches(DocumentProcessor().iter_directory(directory), batch_size):
+        start = time.perf_counter()
+        if service is not None:
+            embeddings = service.generate_embeddings_by_source(batch, use_cache=False)
+        else:
+            embeddings = {}
+            for source, docs in batch.items():
+                random = rng.normal(size=(len(docs), dim)).astype(np.float32)
+                embeddings[source] = random / np.linalg.norm(random, axis=1, keepdims=True)
+        embed_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        store.add_documents(batch, embeddings)
+        seconds += time.perf_counter() - start
+        written += sum(len(docs) for docs in batch.values())
+    start = time.perf_counter()
+    store.flush()
+    flush_seconds = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "vectors": written,
+        "vector_source": vectors,
+        "batch_size": batch_size,
+        "embed_seconds": embed_seconds,
+        "seconds": seconds,
+        "flush_seconds": flush_seconds,
+        "vectors_per_sec": written / (seconds + flush_seconds),
+    }
+
+
+def query_texts(directory: Path, count: int, title_fraction: float, seed: int) -> List[str]:
+    """Mostly distinct free-text queries, with a share of exact titles."""
+    from app.services.document_processor import DocumentProcessor
+    rng = np.random.default_rng(seed)
+    titles = []
+    for _, doc in DocumentProcessor().iter_directory(directory):
+        titles.append(doc["data"]["title"])
+        if len(titles) == 10000:
+            break
+    vocabulary = corpus.ADJECTIVES + corpus.NOUNS + corpus.FILLER
+    queries = []
+    for _ in range(count):
+        if titles and rng.random() < title_fraction:
+            queries.append(titles[rng.integers(len(titles))])
+        else:
+            picked = rng.choice(len(vocabulary), size=int(rng.integers(2, 6)))
+            queries.append(" ".join(vocabulary[i] for i in picked))
+    return queries
+
+
+async def bench_query(queries: List[str], store_dir: Path, concurrency: int, limit: int,
+                      warmup: int) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+    from app.api.routes import corpora, query_batcher
+    if corpora.persist_dir != store_dir:
+        raise RuntimeError(f"The app was configured for {corpora.persist_dir} before the benchmark ran")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        # Load the model and fill the pools before timing
+        for query in queries[:warmup]:
+            await client.post("/api/query", json={"query": f"warmup {query}", "limit": limit})
+
+        latencies: List[float] = []
+        errors = 0
+        pending = iter(queries)
+
+        async def worker() -> None:
+            nonlocal errors
+            for query in pending:
+                start = time.perf_counter()
+                response = await client.post("/api/query", json={"query": query, "limit": limit})
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+        stats = (await client.get("/api/cache/stats")).json()
+    await query_batcher.close()
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "limit": limit,
+        "errors": errors,
+        "seconds": seconds,
+        "requests_per_sec": len(latencies) / seconds,
+        **latency_summary(latencies),
+        "lexical": stats.get("lexical"),
+    }
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    corpus.add_arguments(parser)
+    parser.add_argument("--corpus", type=Path, help="Benchmark an existing documents directory instead")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--backend", default="numpy", choices=["chroma", "numpy", "ivf", "mmap"])
+    parser.add_argument("--parse-workers", type=int, default=0)
+    parser.add_argument("--embed-documents", type=int, default=2000)
+    parser.add_argument("--vectors", choices=["model", "random"],
+                        help="Vectors the write stage stores (default: model when queries run, else random)")
+    parser.add_argument("--dim", type=int, default=384, help="Vector size when no model is loaded")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--title-fraction", type=float, default=0.1,
+                        help="Share of queries that are exact titles (the lexical fast path)")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scratch", type=Path, help="Keep the corpus and store here instead of a temporary directory")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    stages = [stage for stage in STAGES if stage in args.stages]
+    # Queries run against the store that the write stage builds
+    if "query" in stages and "write" not in stages:
+        stages.insert(stages.index("query"), "write")
+    if args.vectors is None:
+        args.vectors = "model" if "query" in stages else "random"
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as scratch:
+        scratch = args.scratch or Path(scratch)
+        store_dir = scratch / "store"
+        # Settings are read on import, so point the app at the scratch
+        # store before anything under app/ is imported
+        os.environ["CHROMADB_DIR"] = str(store_dir)
+        os.environ["VECTOR_BACKEND"] = args.backend
+
+        report: Dict[str, Any] = {"environment": environment()}
+        report["config"] = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}
+        if args.corpus:
+            directory = args.corpus
+            report["corpus"] = {"directory": str(directory)}
+        else:
+            directory = scratch / "documents"
+            start = time.perf_counter()
+            report["corpus"] = corpus.generate(
+                directory, args.documents, args.page_fraction, args.seed,
+                args.words, args.long_fraction, args.long_words
+            )
+            report["corpus"]["generate_seconds"] = time.perf_counter() - start
+        os.environ["DOCUMENTS_DIR"] = str(directory)
+
+        dim = args.dim
+        if "embed" in stages or "query" in stages or args.vectors == "model":
+            from app.services.embeddings import EmbeddingService
+            dim = EmbeddingService().model.get_sentence_embedding_dimension()
+        report["config"]["dim"] = dim
+        report["stages"] = {}
+
+        for stage in stages:
+            print(f"Running {stage} stage", file=sys.stderr)
+            if stage == "parse":
+                result = bench_parse(directory, args.parse_workers)
+            elif stage == "embed":
+                result = bench_embed(directory, args.embed_documents)
+            elif stage == "write":
+                result = bench_write(directory, store_dir, args.backend, dim, args.batch_size, args.vectors)
+            else:
+                queries = query_texts(directory, args.queries, args.title_fraction, args.seed)
+                result = asyncio.run(bench_query(queries, store_dir, args.concurrency, args.limit, args.warmup))
+            report["stages"][stage] = result
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
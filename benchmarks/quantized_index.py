@@ -0,0 +1,105 @@
+"""Recall/latency comparison of the quantized mmap index against float32 exact search.
+
+Usage::
+
+    python -m benchmarks.quantized_index --rows 100000 --dim 384 --queries 200
+
+Prints one JSON object with, per storage type, recall@k against the float32
+NumpyBackend results, p50/p99 query latency, the time to open the index and
+answer a first query, and the on-disk size.
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+from app.services.backends.mmap_backend import MmapBackend
+from app.services.backends.numpy_backend import NumpyBackend
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Normalized vectors drawn around random centroids, like real embeddings."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim))
+    vectors = centroids[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def timed_queries(backend, queries, k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(backend.query([query], k)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def recall(expected, actual) -> float:
+    found = sum(len({h["id"] for h in e} & {h["id"] for h in a}) for e, a in zip(expected, actual))
+    return found / sum(len(e) for e in expected)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.rows, args.dim, args.clusters, seed=0)
+    queries = list(clustered_vectors(args.queries, args.dim, args.clusters, seed=1))
+    ids = [f"doc_{i}" for i in range(args.rows)]
+    metadatas = [{"row": i} for i in range(args.rows)]
+    documents = [None] * args.rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        exact = NumpyBackend(tmp / "exact.npz")
+        exact.upsert(ids, vectors, metadatas, documents)
+        exact.flush()
+        start = time.perf_counter()
+        cold = NumpyBackend(tmp / "exact.npz")
+        cold.query(queries[:1], args.k)
+        float32_cold_ms = (time.perf_counter() - start) * 1000
+        expected, latencies = timed_queries(exact, queries, args.k)
+        report = {
+            "rows": args.rows,
+            "dim": args.dim,
+            "k": args.k,
+            "float32": {
+                "recall": 1.0,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "cold_first_query_ms": float32_cold_ms,
+                "bytes": (tmp / "exact.npz").stat().st_size,
+            },
+        }
+
+        for dtype in ("float16", "int8"):
+            path = tmp / f"{dtype}.idx"
+            writer = MmapBackend(path, dtype=dtype)
+            writer.upsert(ids, vectors, metadatas, documents)
+            writer.flush()
+            start = time.perf_counter()
+            backend = MmapBackend(path, dtype=dtype)
+            backend.query(queries[:1], args.k)
+            cold_ms = (time.perf_counter() - start) * 1000
+            actual, latencies = timed_queries(backend, queries, args.k)
+            report[dtype] = {
+                "recall": recall(expected, actual),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "cold_first_query_ms": cold_ms,
+                "bytes": path.stat().st_size,
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Per-worker memory of ``python -m app.serve`` before and after a full reindex.
+
+Usage::
+
+    python -m benchmarks.workers --workers 4 --documents 50000
+
+Generates a corpus with ``benchmarks.corpus``, starts the multi-worker
+server on it (scratch store, ``VECTOR_BACKEND=mmap``), indexes it through
+``/api/process``, then runs a full reindex. After each index has been
+loaded by the readers and queried by them, it reads every server process's
+``/proc/<pid>/smaps_rollup``:
+
+- ``rss_mb``: resident memory, counting pages shared with other processes
+- ``pss_mb``: resident memory with each shared page split between its users
+- ``private_mb``: pages only this process maps so far; file-backed ones
+  are still page cache the next process to touch them shares
+- ``anonymous_mb``: heap and other anonymous memory, i.e. what a worker
+  costs on its own
+
+Prints one JSON object. The writer is the last process the supervisor
+starts; the others are readers.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+
+from benchmarks import corpus
+
+
+def request(url: str, body: Any = None, method: str = "GET") -> Dict[str, Any]:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=600) as response:
+        return json.loads(response.read())
+
+
+def wait_for(url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            request(url)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"{url} did not answer within {timeout:.0f}s")
+
+
+def index(base: str, full: bool) -> Dict[str, Any]:
+    job = request(f"{base}/api/process?full={str(full).lower()}", method="POST")
+    while job["status"] not in ("completed", "failed"):
+        time.sleep(1.0)
+        job = request(f"{base}/api/process/{job['job_id']}")
+    if job["status"] != "completed":
+        raise RuntimeError(f"Indexing failed: {job.get('error')}")
+    return job["result"]
+
+
+def children(pid: int) -> List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return sorted(int(child) for child in f.read().split())
+
+
+def memory(pid: int) -> Dict[str, float]:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": fields["Rss"],
+        "pss_mb": fields["Pss"],
+        "private_mb": fields["Private_Clean"] + fields["Private_Dirty"],
+        "anonymous_mb": fields["Anonymous"],
+    }
+
+
+def snapshot(server: int) -> Dict[str, Any]:
+    pids = children(server)
+    processes = {"supervisor": memory(server)}
+    for i, pid in enumerate(pids[:-1]):
+        processes[f"reader_{i}"] = memory(pid)
+    processes["writer"] = memory(pids[-1])
+    readers = [processes[name] for name in processes if name.startswith("reader_")]
+    return {
+        "processes": processes,
+        "reader_anonymous_mb_mean": float(np.mean([r["anonymous_mb"] for r in readers])),
+        "total_pss_mb": sum(p["pss_mb"] for p in processes.values()),
+    }
+
+
+def query_load(base: str, titles: List[str], queries: int) -> None:
+    rng = np.random.default_rng(2)
+    bodies = []
+    for i in range(queries):
+        # Titles take the lexical path, description words the vector search
+        text = titles[rng.integers(len(titles))] if i % 2 else " ".join(rng.choice(corpus.FILLER, size=3))
+        bodies.append({"query": text, "limit": 5})
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda body: request(f"{base}/api/query", body, method="POST"), bodies))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    corpus.add_arguments(parser)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backend", default="mmap")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.set_defaults(documents=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        generated = corpus.generate(
+            tmp / "documents", args.documents, args.page_fraction, args.seed, args.words,
+            args.long_fraction, args.long_words
+        )
+        titles = [doc["title"] for doc in corpus.iter_documents(200, "product", args.seed, args.words, 0.0, 0)]
+        env = dict(
+            os.environ, WORKERS=str(args.workers), VECTOR_BACKEND=args.backend, HOST="127.0.0.1",
+            PORT=str(args.port), DOCUMENTS_DIR=str(tmp / "documents"), CHROMADB_DIR=str(tmp / "store"),
+            EMBEDDING_CACHE_DIR=str(tmp / "embedding_cache"), SNAPSHOT_POLL_SECONDS="0.5",
+        )
+        # Keep the server's access log out of the JSON report
+        server = subprocess.Popen([sys.executable, "-m", "app.serve"], env=env, stdout=sys.stderr)
+        base = f"http://127.0.0.1:{args.port}"
+        report: Dict[str, Any] = {"workers": args.workers, "backend": args.backend, "corpus": generated}
+        try:
+            wait_for(f"{base}/health", args.startup_timeout)
+            report["started"] = snapshot(server.pid)
+            for stage, full in (("indexed", False), ("reindexed", True)):
+                started = time.perf_counter()
+                result = index(base, full)
+                # Give every reader a few polls to load the new snapshot
+                time.sleep(2.0)
+                query_load(base, titles, args.queries)
+                report[stage] = dict(snapshot(server.pid), seconds=time.perf_counter() - started, result=result)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(60)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
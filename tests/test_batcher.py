@@ -0,0 +1,75 @@
+import asyncio
+import numpy as np
+
+from app.core.metrics import metrics
+from app.services.batcher import QueryEmbeddingBatcher
+from app.services.cache import LRUCache
+
+
+def bucket(name, label, le):
+    """Read one cumulative bucket of a histogram from the /metrics text."""
+    prefix = f'rag_{name}_bucket{{{label}="query_embedding",le="{le}"}} '
+    lines = [line for line in metrics.render().splitlines() if line.startswith(prefix)]
+    return int(lines[0][len(prefix):]) if lines else 0
+
+
+class FakeEmbeddingService:
+    """Records batch sizes instead of running a model."""
+
+    def __init__(self):
+        self.batches = []
+        self.query_cache = LRUCache(max_size=0)
+
+    def cached_query_embedding(self, query):
+        return None
+
+    def encode_queries(self, queries):
+        self.batches.append(list(queries))
+        return [np.full(4, len(query), dtype=np.float32) for query in queries]
+
+
+def test_concurrent_queries_share_one_encode():
+    service = FakeEmbeddingService()
+    batcher = QueryEmbeddingBatcher(service, window_ms=20, max_batch_size=16)
+    queries = ["a", "bb", "ccc", "dddd"]
+    batches_of_4 = bucket("batch_size", "kind", 4) - bucket("batch_size", "kind", 2)
+    depths_to_4 = bucket("queue_depth", "queue", 4)
+
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.embed(q) for q in queries))
+        finally:
+            await batcher.close()
+
+    results = asyncio.run(main())
+    assert service.batches == [queries], "Concurrent queries should be encoded in one batch"
+    assert [int(r[0]) for r in results] == [1, 2, 3, 4], "Vectors should be fanned out in order"
+    stats = batcher.stats()
+    assert stats["batches"] == 1
+    assert stats["max_queue_depth"] == 4
+    assert bucket("batch_size", "kind", 4) - bucket("batch_size", "kind", 2) == batches_of_4 + 1
+    assert bucket("queue_depth", "queue", 4) == depths_to_4 + 4, "Every enqueue should record the depth"
+
+
+def test_batches_are_capped_at_max_size():
+    service = FakeEmbeddingService()
+    batcher = QueryEmbeddingBatcher(service, window_ms=20, max_batch_size=2)
+
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.embed(str(i)) for i in range(5)))
+        finally:
+            await batcher.close()
+
+    asyncio.run(main())
+    assert [len(b) for b in service.batches] == [2, 2, 1]
+
+
+def test_disabled_batcher_encodes_directly():
+    service = FakeEmbeddingService()
+    batcher = QueryEmbeddingBatcher(service, window_ms=0, max_batch_size=16)
+
+    result = asyncio.run(batcher.embed("abc"))
+    assert int(result[0]) == 3
+    assert service.batches == [["abc"]]
+    assert batcher.stats()["batches"] == 0
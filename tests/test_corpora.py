@@ -0,0 +1,115 @@
+import pytest
+
+from app.services.corpora import CorpusRegistry
+from app.services.document_processor import DocumentProcessor
+from app.services.embeddings import EmbeddingService
+from app.services.model_registry import ModelRegistry
+
+SHOES = """
+- Product:
+    title: Trail Runner
+    link: /trail-runner
+    description: |
+      A lightweight running shoe for rocky trails.
+"""
+
+LAMPS = """
+- Product:
+    title: Desk Lamp
+    link: /desk-lamp
+    description: |
+      An adjustable lamp with a warm LED light.
+
+- Product:
+    title: Floor Lamp
+    link: /floor-lamp
+    description: |
+      A tall reading lamp for the living room.
+"""
+
+
+@pytest.fixture(scope="module")
+def embedding_service():
+    return EmbeddingService()
+
+
+@pytest.fixture
+def directories(tmp_path):
+    paths = {}
+    for name, documents in (("shoes", SHOES), ("lamps", LAMPS)):
+        directory = tmp_path / "documents" / name
+        directory.mkdir(parents=True)
+        (directory / "products.yml").write_text(documents)
+        paths[name] = str(directory)
+    return paths
+
+
+def registry(tmp_path, directories, embedding_service, budget=0):
+    return CorpusRegistry(
+        DocumentProcessor(), embedding_service, directories=directories,
+        persist_dir=str(tmp_path / "store"), memory_budget_bytes=budget, backend="numpy"
+    )
+
+
+def index(corpora, name):
+    with corpora.pinned(name) as corpus:
+        return corpus.indexer.run()
+
+
+def test_corpora_are_indexed_and_searched_separately(tmp_path, directories, embedding_service):
+    corpora = registry(tmp_path, directories, embedding_service)
+    assert corpora.loaded() == [], "Corpora load on first use"
+    assert index(corpora, "shoes")["total_chunks"] == 1
+    assert index(corpora, "lamps")["total_chunks"] == 2
+    assert (tmp_path / "store" / "corpora" / "lamps" / "manifest.json").exists()
+
+    query = embedding_service.generate_query_embeddings(["lamp"])[0]
+    assert [r["data"]["title"] for r in corpora.get("shoes").vector_store.query(query)] == ["Trail Runner"]
+    assert {r["data"]["title"] for r in corpora.get("lamps").vector_store.query(query)} == {"Desk Lamp", "Floor Lamp"}
+
+    # A new process (or a reloaded corpus) reads each index back from its own directory
+    reopened = registry(tmp_path, directories, embedding_service)
+    stats = reopened.corpus_stats()
+    assert not stats["lamps"]["loaded"]
+    assert reopened.get("lamps").lexical_index.search("Desk Lamp")[0]["data"]["title"] == "Desk Lamp"
+    stats = reopened.corpus_stats()
+    assert (stats["lamps"]["documents"], stats["lamps"]["vectors"]) == (2, 2)
+    with pytest.raises(KeyError):
+        reopened.get("unknown")
+
+
+def test_least_recently_used_corpus_is_evicted_past_the_budget(tmp_path, directories, embedding_service):
+    corpora = registry(tmp_path, directories, embedding_service)
+    index(corpora, "shoes")
+    index(corpora, "lamps")
+    # Room for the larger corpus (as loaded from disk) but not for both
+    sizing = registry(tmp_path, directories, embedding_service)
+    budget = max(sizing.get(name).memory_bytes() for name in ("shoes", "lamps")) + 1
+    corpora = registry(tmp_path, directories, embedding_service, budget=budget)
+
+    shoes = corpora.get("shoes")
+    corpora.get("lamps")
+    assert [corpus.name for corpus in corpora.loaded()] == ["lamps"]
+    assert corpora.stats()["evictions"] == 1
+    assert shoes.vector_store.count() == 1, "An evicted corpus keeps serving queries already holding it"
+
+    with corpora.pinned("lamps"):
+        corpora.get("shoes")
+        assert {corpus.name for corpus in corpora.loaded()} == {"lamps", "shoes"}, "A pinned corpus is kept"
+    assert [corpus.name for corpus in corpora.loaded()] == ["shoes"]
+    assert corpora.stats()["loads"] == 3
+
+
+def test_switching_inference_backend_rebuilds_the_index(tmp_path, directories, embedding_service, monkeypatch):
+    assert index(registry(tmp_path, directories, embedding_service), "lamps")["added"] == 2
+
+    # Serve the same weights through a registry that describes another backend
+    onnx = ModelRegistry(backend="onnx", quantize=True)
+    monkeypatch.setattr(onnx, "get", embedding_service.registry.get)
+    switched = EmbeddingService(registry=onnx, cache_max_mb=0)
+    assert switched.vector_space != embedding_service.vector_space
+
+    stats = index(registry(tmp_path, directories, switched), "lamps")
+    assert stats["added"] == 2, "Vectors from another backend should all be re-embedded"
+    assert stats["unchanged"] == 0
+    assert index(registry(tmp_path, directories, switched), "lamps")["unchanged"] == 2
@@ -0,0 +1,139 @@
+import io
+
+import pytest
+import yaml
+
+from app.services.document_processor import DocumentProcessor, StreamingLoader, iter_yaml_items
+
+MULTI_DOCUMENT = """
+- Product:
+    title: Peaceful Dreams
+    link: /peaceful-dreams
+    description: |
+      This a picture of a
+      peaceful dreaming cat.
+- Product:
+    title: Playful Cat
+    link: &link /playful-cat
+    description: This a picture of a playful cat.
+- Product:
+    title: Playful Cat Poster
+    link: *link
+    description: A poster of a playful cat.
+---
+Product:
+  title: Curious Cat
+  link: /curious-cat
+  description: This a picture of a curious cat.
+---
+"""
+
+
+@pytest.mark.parametrize("loader", [StreamingLoader, yaml.SafeLoader])
+def test_iter_yaml_items_streams_sequence_items_and_documents(loader):
+    items = list(iter_yaml_items(io.StringIO(MULTI_DOCUMENT), loader=loader))
+    assert [item["Product"]["title"] for item in items] == [
+        "Peaceful Dreams", "Playful Cat", "Playful Cat Poster", "Curious Cat"
+    ]
+    assert items[2]["Product"]["link"] == "/playful-cat", "Aliases should resolve across items"
+
+
+def test_iter_yaml_items_is_lazy():
+    stream = io.StringIO("- a: 1\n- b: [unclosed\n")
+    items = iter_yaml_items(stream)
+    assert next(items) == {"a": 1}, "Items before a syntax error should be yielded first"
+    with pytest.raises(yaml.YAMLError):
+        next(items)
+
+
+def test_streamed_documents_match_whole_file_parse(tmp_path):
+    path = tmp_path / "products.yml"
+    path.write_text(MULTI_DOCUMENT.split("---")[0])
+    processor = DocumentProcessor()
+
+    streamed = processor.process_document(path)
+    content = processor.read_yaml_file(path)
+    assert content == yaml.safe_load(path.read_text())
+    expected = processor.process_yaml_content(content, "product")
+    seen = {}
+    for doc in expected:
+        processor.assign_document_id(str(path), doc, seen)
+    assert streamed == expected
+    assert [doc for _, doc in processor.iter_directory(tmp_path)] == expected
+    assert streamed[0]["data"]["description"] == "This a picture of a peaceful dreaming cat."
+
+
+def test_parallel_parsing_matches_sequential(tmp_path):
+    for i in range(6):
+        (tmp_path / f"products_{i}.yml").write_text(
+            MULTI_DOCUMENT.replace("Playful Cat", f"Playful Cat {i}")
+        )
+    (tmp_path / "pages.yml").write_text("- Page:\n    title: About\n    link: /about\n    description: About us.\n")
+
+    sequential = list(DocumentProcessor(parse_workers=0).iter_directory(tmp_path))
+    parallel = list(DocumentProcessor(parse_workers=3).iter_directory(tmp_path))
+    assert parallel == sequential
+    assert [source for source, _ in sequential][0].endswith("pages.yml")
+    assert len({doc["id"] for _, doc in parallel}) == len(parallel)
+
+
+class WhitespaceTokenizer:
+    """Slow-tokenizer stand-in: one token per whitespace-separated word."""
+
+    is_fast = False
+
+
+def long_document(words):
+    return {
+        "id": "pages.yml_abc",
+        "type": "page",
+        "data": {
+            "title": "Guide",
+            "description": " ".join(f"w{i}" for i in range(words)),
+            "link": "/guide",
+        },
+    }
+
+
+def test_short_documents_are_not_chunked():
+    processor = DocumentProcessor(tokenizer=WhitespaceTokenizer(), max_seq_length=64)
+    doc = long_document(10)
+    assert processor.chunk_document(doc) == [doc]
+
+
+def test_long_documents_are_chunked_within_the_model_limit():
+    processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200,
+                                  tokenizer=WhitespaceTokenizer(), max_seq_length=32)
+    doc = long_document(100)
+    chunks = processor.chunk_document(doc)
+
+    # 32 tokens minus 2 special tokens and the 3-token "Guide Guide Guide." prefix
+    budget = processor.chunk_budget("Guide")
+    assert budget == 27
+    assert len(chunks) > 1
+    assert [c["id"] for c in chunks] == [f"pages.yml_abc#{i}" for i in range(len(chunks))]
+    assert all(c["parent_id"] == "pages.yml_abc" and c["data"] is doc["data"] for c in chunks)
+    assert all(len(c["text"].split()) <= budget for c in chunks)
+
+    # Adjacent chunks overlap by 20% of the budget and cover every word
+    words = [c["text"].split() for c in chunks]
+    assert words[0][-5:] == words[1][:5]
+    assert words[-1][-1] == "w99"
+    assert set(w for chunk in words for w in chunk) == set(doc["data"]["description"].split())
+
+
+def test_chunks_respect_subword_boundaries(tmp_path):
+    from transformers import BertTokenizerFast
+
+    vocab = tmp_path / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "guide", ".", "run", "##ning", "fast"]))
+    tokenizer = BertTokenizerFast(str(vocab))
+    processor = DocumentProcessor(tokenizer=tokenizer, max_seq_length=16)
+    doc = long_document(0)
+    doc["data"]["description"] = " ".join(["running fast"] * 20)
+
+    chunks = processor.chunk_document(doc)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["text"].startswith("running") and chunk["text"].endswith("fast")
+        assert len(tokenizer(chunk["text"], add_special_tokens=False)["input_ids"]) <= processor.chunk_budget("Guide")
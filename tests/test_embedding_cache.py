@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import EmbeddingService
+from app.services.model_registry import ModelRegistry
+
+
+class CountingModel:
+    """Returns one-hot vectors and records every text it encodes."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.encoded = []
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            out[i, len(text) % self.dim] = 1.0
+        return out
+
+
+def vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def write_texts(directory, start, count):
+    cache = EmbeddingCache(directory, "model", max_bytes=0)
+    for i in range(start, start + count):
+        cache.put_many([f"text {i}"], np.full((1, 8), i, dtype=np.float32))
+
+
+def test_vectors_persist_across_instances(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", max_bytes=0)
+    stored = vectors(3)
+    cache.put_many(["a", "b", "c"], stored)
+
+    other = EmbeddingCache(tmp_path, "model", max_bytes=0)
+    found = other.get_many(["c", "missing", "a"])
+    np.testing.assert_array_equal(found[0], stored[2])
+    assert found[1] is None
+    np.testing.assert_array_equal(found[2], stored[0])
+    assert EmbeddingCache(tmp_path, "other model", max_bytes=0).get_many(["a"]) == [None]
+
+
+def test_torn_append_is_ignored_and_repaired(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", max_bytes=0)
+    cache.put_many(["a"], vectors(1))
+    with open(cache.path, "ab") as f:
+        f.write(b"\x00" * 20)  # a writer died mid-record
+
+    reader = EmbeddingCache(tmp_path, "model", max_bytes=0)
+    assert reader.get_many(["a"])[0] is not None
+    reader.put_many(["b"], vectors(1, seed=1))
+    assert reader.stats()["entries"] == 2
+    np.testing.assert_array_equal(EmbeddingCache(tmp_path, "model", 0).get_many(["b"])[0], vectors(1, seed=1)[0])
+
+
+def test_compaction_keeps_recently_used_entries_under_the_cap(tmp_path):
+    record = EmbeddingCache.DIGEST_SIZE + 4 * 8
+    cache = EmbeddingCache(tmp_path, "model", max_bytes=EmbeddingCache.HEADER_SIZE + 10 * record)
+    cache.put_many([f"t{i}" for i in range(8)], vectors(8))
+    cache.get_many(["t0"])  # used recently, so kept over newer entries
+    cache.put_many(["t8", "t9", "t10"], vectors(3, seed=1))
+
+    stats = cache.stats()
+    assert stats["compactions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+    found = EmbeddingCache(tmp_path, "model", max_bytes=0).get_many(["t0", "t1", "t10"])
+    assert found[0] is not None and found[2] is not None
+    assert found[1] is None, "The oldest unused entry should be evicted"
+
+
+def test_concurrent_writers_in_separate_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=write_texts, args=(tmp_path, i * 50, 50)) for i in range(4)]
+    reader = EmbeddingCache(tmp_path, "model", max_bytes=0)
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    found = reader.get_many([f"text {i}" for i in range(200)])
+    assert all(v is not None and v[0] == i for i, v in enumerate(found))
+    size = os.stat(reader.path).st_size
+    assert size == EmbeddingCache.HEADER_SIZE + 200 * (EmbeddingCache.DIGEST_SIZE + 4 * 8)
+
+
+def test_generate_embeddings_only_encodes_new_texts(tmp_path):
+    model = CountingModel()
+    registry = ModelRegistry()
+    registry._models["counting"] = model
+    service = EmbeddingService("counting", registry=registry, cache_dir=str(tmp_path))
+    docs = [{"data": {"title": f"doc {i}", "description": "x" * i}} for i in range(5)]
+
+    first = service.generate_embeddings(docs[:3])
+    assert len(model.encoded) == 3
+
+    # A new service (e.g. after a restart or for another collection) reuses the vectors
+    rebuilt = EmbeddingService("counting", registry=registry, cache_dir=str(tmp_path))
+    second = rebuilt.generate_embeddings(docs)
+    assert len(model.encoded) == 5, "Only the two new documents should be encoded"
+    np.testing.assert_array_equal(second[:3], first)
+    np.testing.assert_array_equal(second, service.generate_embeddings(docs, use_cache=False))
+
+
+def test_query_normalization_never_loads_the_model(tmp_path):
+    registry = ModelRegistry()
+    service = EmbeddingService("counting", registry=registry, cache_dir=str(tmp_path))
+    # Unknown until the model loads, so case is kept rather than loading it on the event loop
+    assert service.normalize_query("  Curious   Cat ") == "Curious Cat"
+    assert registry._models == {}
+
+    model = CountingModel()
+    model.tokenizer = type("Tokenizer", (), {"do_lower_case": True})()
+    registry._models["counting"] = model
+    service.generate_embeddings([{"data": {"title": "doc", "description": "x"}}])
+    assert service.normalize_query("Curious Cat") == "curious cat"
+    assert EmbeddingService("counting", registry=registry, cache_dir=str(tmp_path), lowercase=False).normalize_query("Cat") == "Cat"
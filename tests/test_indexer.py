@@ -0,0 +1,150 @@
+import pytest
+from pathlib import Path
+
+from app.services.document_processor import DocumentProcessor
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import VectorStore
+from app.services.index_manifest import IndexManifest
+from app.services.indexer import Indexer, prefetch
+from app.services.lexical_index import LexicalIndex
+
+PRODUCTS = """
+- Product:
+    title: Peaceful Dreams
+    link: /peaceful-dreams
+    description: |
+      This a picture of a peaceful dreaming cat.
+
+- Product:
+    title: Playful Cat
+    link: /playful-cat
+    description: |
+      This a picture of a playful cat.
+
+- Product:
+    title: Curious Cat
+    link: /curious-cat
+    description: |
+      This a picture of a curious cat.
+"""
+
+
+class CountingEmbeddingService:
+    """Wraps the embedding service and counts how many documents it embeds."""
+
+    def __init__(self, service: EmbeddingService):
+        self.service = service
+        self.embedded = 0
+
+    def generate_embeddings_by_source(self, documents):
+        self.embedded += sum(len(docs) for docs in documents.values())
+        return self.service.generate_embeddings_by_source(documents)
+
+
+class TestIncrementalIndexing:
+    @pytest.fixture(scope="class")
+    def embedding_service(self):
+        return EmbeddingService()
+
+    @pytest.fixture
+    def documents_dir(self, tmp_path) -> Path:
+        directory = tmp_path / "documents"
+        directory.mkdir()
+        (directory / "products.yml").write_text(PRODUCTS)
+        return directory
+
+    @pytest.fixture
+    def indexer(self, tmp_path, documents_dir, embedding_service):
+        store = VectorStore(persist_dir=str(tmp_path / "chromadb"))
+        manifest = IndexManifest(path=tmp_path / "manifest.json")
+        lexical_index = LexicalIndex(store.records)
+        return Indexer(DocumentProcessor(), CountingEmbeddingService(embedding_service), store, manifest,
+                       lexical_index=lexical_index, documents_dir=documents_dir)
+
+    def test_unchanged_corpus_is_not_reembedded(self, indexer):
+        first = indexer.run()
+        assert first["added"] == 3
+        assert indexer.embedding_service.embedded == 3
+
+        second = indexer.run()
+        assert second["unchanged"] == 3
+        assert second["added"] == second["updated"] == second["deleted"] == 0
+        assert indexer.embedding_service.embedded == 3, "Unchanged documents should not be re-embedded"
+
+    def test_single_edit_reembeds_one_document(self, indexer, documents_dir):
+        indexer.run()
+        products = documents_dir / "products.yml"
+        products.write_text(PRODUCTS.replace("a playful cat", "a very playful cat"))
+
+        stats = indexer.run()
+        assert stats["updated"] == 1
+        assert stats["unchanged"] == 2
+        assert indexer.embedding_service.embedded == 4
+        assert indexer.vector_store.count() == 3
+
+    def test_removed_documents_are_deleted(self, indexer, documents_dir):
+        indexer.run()
+        products = documents_dir / "products.yml"
+        products.write_text(PRODUCTS.split("- Product:\n    title: Curious Cat")[0])
+
+        stats = indexer.run()
+        assert stats["deleted"] == 1
+        assert indexer.vector_store.count() == 2
+        assert indexer.vector_store.records.count() == 2, "Records of removed documents should be pruned"
+        assert indexer.lexical_index.count() == 2
+        assert indexer.lexical_index.search("Curious Cat") is None
+
+    def test_deleting_every_file_empties_the_index(self, indexer, documents_dir):
+        indexer.run()
+        (documents_dir / "products.yml").unlink()
+
+        stats = indexer.run()
+        assert stats["total_documents"] == 0
+        assert stats["deleted"] == 3
+        assert indexer.vector_store.count() == 0
+        assert indexer.vector_store.records.count() == 0
+        assert indexer.lexical_index.search("Curious Cat") is None
+        assert indexer.manifest.load() and indexer.manifest.entries == {}
+
+        assert indexer.run()["deleted"] == 0
+
+    def test_full_rebuild_reembeds_everything(self, indexer):
+        indexer.run()
+        stats = indexer.run(full=True)
+        assert stats["added"] == 3
+        assert indexer.embedding_service.embedded == 6
+
+    def test_full_rebuild_serves_the_old_version_until_swapped(self, indexer, monkeypatch):
+        indexer.run()
+        store = indexer.vector_store
+        active = store.collection_name
+        during = []
+        generate = indexer.embedding_service.generate_embeddings_by_source
+
+        def observe(documents):
+            during.append((store.count(), indexer.lexical_index.count(), store.collection_name))
+            return generate(documents)
+
+        monkeypatch.setattr(indexer.embedding_service, "generate_embeddings_by_source", observe)
+        indexer.run(full=True)
+        assert during == [(3, 3, active)], "Queries should see the complete old index while rebuilding"
+        assert store.previous == active
+        assert store.collection_name != active
+        assert store.count() == 3
+
+        assert indexer.run()["unchanged"] == 3, "The new version continues incrementally"
+        store.rollback()
+        assert indexer.run()["added"] == 3, "After a rollback the manifest no longer applies"
+
+
+def test_prefetch_preserves_order_and_reraises():
+    assert list(prefetch(range(10), depth=2)) == list(range(10))
+
+    def failing():
+        yield 1
+        raise ValueError("parse error")
+
+    items = prefetch(failing(), depth=2)
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)
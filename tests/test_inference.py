@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.embeddings import EmbeddingService
+from app.services.inference import load_model
+from app.services.model_registry import ModelRegistry
+
+# Minimum cosine similarity to the PyTorch vectors, per (backend, quantize)
+DRIFT_BOUNDS = {
+    ("torch", True): 0.98,
+    ("onnx", False): 0.9999,
+    ("onnx", True): 0.98,
+}
+
+DOCUMENTS = [
+    {"data": {"title": title, "description": description}}
+    for title, description in [
+        ("Sunset Over the Bay", "A framed print of the harbour at dusk, warm orange light on the water."),
+        ("Mountain Trail", "High resolution photograph of a winding path through pine forest."),
+        ("Shipping and Returns", "Orders ship within two days. Unused prints can be returned for 30 days."),
+        ("Contact", "Write to us about commissions, licensing or custom framing."),
+        ("Ciudad de noche", "Fotografía nocturna de la ciudad con luces de neón y lluvia."),
+    ]
+]
+QUERIES = ["ocean at dusk", "how do I return an order", "forest hiking photo"]
+
+
+def service(backend: str, quantize: bool, cache_dir: str) -> EmbeddingService:
+    registry = ModelRegistry(backend=backend, quantize=quantize, cache_dir=cache_dir)
+    return EmbeddingService(settings.EMBEDDING_MODEL, registry=registry)
+
+
+@pytest.fixture(scope="module")
+def reference(tmp_path_factory):
+    """PyTorch vectors of the configured model; skipped when it cannot be loaded (e.g. offline)."""
+    torch_service = service("torch", False, str(tmp_path_factory.mktemp("models")))
+    try:
+        torch_service.model
+    except Exception as e:
+        pytest.skip(f"Embedding model unavailable: {e}")
+    return (
+        torch_service.generate_embeddings(DOCUMENTS),
+        np.stack(torch_service.encode_queries(QUERIES)),
+    )
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        load_model(settings.EMBEDDING_MODEL, backend="tensorrt")
+
+
+@pytest.mark.parametrize("backend,quantize", list(DRIFT_BOUNDS))
+def test_backend_vectors_stay_close_to_pytorch(backend, quantize, reference, tmp_path):
+    if backend == "onnx":
+        pytest.importorskip("optimum.onnxruntime")
+    documents, queries = reference
+    candidate = service(backend, quantize, str(tmp_path))
+
+    candidate_documents = candidate.generate_embeddings(DOCUMENTS)
+    candidate_queries = np.stack(candidate.encode_queries(QUERIES))
+    # Vectors are L2-normalized, so the row-wise dot product is the cosine
+    assert (candidate_documents * documents).sum(axis=1).min() >= DRIFT_BOUNDS[(backend, quantize)]
+    assert (candidate_queries * queries).sum(axis=1).min() >= DRIFT_BOUNDS[(backend, quantize)]
+    # Drift must not change which document a query retrieves
+    expected = (queries @ documents.T).argmax(axis=1)
+    assert ((candidate_queries @ candidate_documents.T).argmax(axis=1) == expected).all()
+
+    if backend == "onnx":
+        # The export is cached: a second load reuses it
+        exported = {p: p.stat().st_mtime_ns for p in tmp_path.rglob("*.onnx")}
+        service(backend, quantize, str(tmp_path)).model
+        assert {p: p.stat().st_mtime_ns for p in tmp_path.rglob("*.onnx")} == exported
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from app.services.jobs import JobManager
+
+
+def wait_for(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status not in ("completed", "failed") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_job_reports_progress_and_result():
+    manager = JobManager()
+    release = threading.Event()
+
+    def work(job):
+        job.update("parsed", 3)
+        release.wait(5)
+        job.update("embedded", 3)
+        job.update("written", 3)
+        return {"total_chunks": 3}
+
+    job = manager.submit(work)
+    assert manager.get(job.id) is job
+
+    while job.progress["parsed"] == 0:
+        time.sleep(0.01)
+    assert job.status == "running"
+    release.set()
+
+    wait_for(job)
+    state = job.to_dict()
+    assert state["status"] == "completed"
+    assert state["progress"] == {"parsed": 3, "embedded": 3, "written": 3, "deleted": 0}
+    assert state["result"] == {"total_chunks": 3}
+    assert state["finished_at"] is not None
+
+
+def test_failed_job_records_error():
+    manager = JobManager()
+
+    def work(job):
+        raise ValueError("No documents found")
+
+    job = wait_for(manager.submit(work))
+    assert job.status == "failed"
+    assert job.error == "No documents found"
+
+
+def test_jobs_run_one_at_a_time():
+    manager = JobManager()
+    running = []
+    overlaps = []
+
+    def work(job):
+        running.append(job.id)
+        overlaps.append(len(running))
+        time.sleep(0.02)
+        running.remove(job.id)
+        return {}
+
+    jobs = [manager.submit(work) for _ in range(3)]
+    for job in jobs:
+        wait_for(job)
+    assert max(overlaps) == 1, "Indexing jobs should never overlap"
+
+
+def test_old_jobs_are_pruned():
+    manager = JobManager(max_jobs=2)
+    jobs = [wait_for(manager.submit(lambda job: {})) for _ in range(3)]
+    assert manager.get(jobs[0].id) is None
+    assert manager.get(jobs[2].id) is jobs[2]
+
+
+def test_shared_jobs_run_in_the_writer_process(tmp_path):
+    reader = JobManager(directory=tmp_path)
+    writer = JobManager(directory=tmp_path)
+
+    def work(job):
+        job.update("parsed", 2)
+        job.update("written", 2)
+        return {"total_chunks": 2}
+
+    job = reader.enqueue(full=True)
+    assert reader.get(job.id).status == "queued"
+    assert writer.run_queued(work) == 1
+    assert writer.run_queued(work) == 0, "A job runs once"
+
+    state = reader.get(job.id).to_dict()
+    assert state["status"] == "completed"
+    assert state["full"] is True
+    assert state["progress"]["written"] == 2
+    assert state["result"] == {"total_chunks": 2}
+    assert state["finished_at"] >= state["started_at"] >= state["created_at"]
+    assert reader.get("../../etc/passwd") is None
+
+
+def test_writer_restart_fails_interrupted_jobs(tmp_path):
+    manager = JobManager(directory=tmp_path)
+    job = manager.enqueue()
+    job.status = "running"
+    manager._save(job)
+
+    assert JobManager(directory=tmp_path).recover() == 1
+    assert manager.get(job.id).status == "failed"
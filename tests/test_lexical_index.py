@@ -0,0 +1,113 @@
+from app.services.backends.base import MetadataFilter
+from app.services.lexical_index import LexicalIndex, tokenize
+from app.services.record_store import RecordStore
+
+
+def product(doc_id, title, description):
+    return {
+        "id": doc_id,
+        "type": "product",
+        "data": {"title": title, "description": description, "link": f"/{doc_id}"},
+    }
+
+
+DOCUMENTS = {
+    "products.yml": [
+        product("peaceful", "Peaceful Dreams", "This a picture of a peaceful dreaming cat."),
+        product("playful", "Playful Cat", "This a picture of a playful cat."),
+        product("curious", "Curious Cat", "This a picture of a curious cat."),
+    ]
+}
+
+
+def build_index(tmp_path):
+    records = RecordStore(tmp_path / "documents.records")
+    for source, docs in DOCUMENTS.items():
+        for doc in docs:
+            records.put(doc["id"], source, doc)
+    records.save()
+    return LexicalIndex(records)
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Curious  Cat!") == ["curious", "cat"]
+
+
+def test_exact_title_is_served_from_the_index(tmp_path):
+    index = build_index(tmp_path)
+    results = index.search("curious cat", limit=5)
+
+    assert results is not None, "Exact title matches should be answered lexically"
+    assert results[0]["data"]["title"] == "Curious Cat"
+    assert results[0]["score"] == 1.0
+    assert all(0 <= r["score"] <= 1 for r in results)
+    assert {"id", "source", "score", "type", "data"} <= results[0].keys()
+    assert index.stats()["served"] == 1
+
+
+def test_ambiguous_query_falls_through(tmp_path):
+    index = build_index(tmp_path)
+    assert index.search("cat", limit=5) is None, "A term shared by several titles is ambiguous"
+    assert index.search("sleepy dog", limit=5) is None, "Unknown terms should fall through"
+    assert index.stats()["fallthrough"] == 2
+
+
+def test_unique_title_terms_are_confident(tmp_path):
+    index = build_index(tmp_path)
+    results = index.search("Peaceful", limit=1)
+    assert [r["id"] for r in results] == ["peaceful"]
+
+
+def test_filters_scope_lexical_matches(tmp_path):
+    index = build_index(tmp_path)
+    assert index.search("curious cat", where=MetadataFilter(type="page")) is None
+    results = index.search("cat", where=MetadataFilter(link_prefix="/curious"))
+    assert [r["id"] for r in results] == ["curious"], "A term that is ambiguous overall can be unique in scope"
+
+
+def test_fuse_reranks_vector_results(tmp_path):
+    index = build_index(tmp_path)
+    vector_results = [
+        {"id": "playful", "score": 0.6},
+        {"id": "curious", "score": 0.55},
+    ]
+    fused = index.fuse("curious", vector_results, weight=0.5)
+    assert [r["id"] for r in fused] == ["curious", "playful"]
+    assert vector_results[0]["score"] == 0.6, "Fusion should not modify the input results"
+
+
+def test_index_serves_the_saved_record_store(tmp_path):
+    records = RecordStore(tmp_path / "documents.records")
+    for doc in DOCUMENTS["products.yml"]:
+        records.put(doc["id"], "products.yml", doc)
+    records.save()
+
+    index = LexicalIndex(RecordStore(tmp_path / "documents.records"))
+    assert index.count() == 3
+    assert index.search("Playful Cat")[0]["id"] == "playful"
+
+    generation = index.generation
+    index.records.delete(["playful"])
+    index.refresh()
+    assert index.search("Playful Cat")[0]["id"] == "playful", "Unsaved changes are not indexed yet"
+    index.records.save()
+    index.refresh()
+    assert index.generation == generation + 2
+    assert index.search("Playful Cat") is None
+
+
+def test_title_check_rejects_queries_without_scoring(tmp_path):
+    index = build_index(tmp_path)
+    assert index.may_serve("Curious Cat")
+    assert index.may_serve("cat"), "Shared title terms still need scoring to decide"
+    assert not index.may_serve("sleepy dog")
+    assert not index.may_serve("picture"), "Description-only terms can never be confident"
+    assert index.stats()["fallthrough"] == 2
+
+
+def test_common_terms_only_rescore_matched_documents(tmp_path):
+    index = build_index(tmp_path)
+    index.max_postings = 1
+    # "cat" occurs in every document, so it only re-scores what "curious" and the title match found
+    assert [r["id"] for r in index.search("curious cat")] == ["curious"]
+    assert index.search("cat") is None, "The unscanned documents still count against the margin"
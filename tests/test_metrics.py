@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.timing import TimedRoute
+from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.metrics import Histogram, Metrics, metrics
+
+
+def build_app():
+    router = APIRouter(route_class=TimedRoute)
+
+    def blocking_search():
+        with metrics.stage("search"):
+            time.sleep(0.002)
+        return ["result"]
+
+    @router.get("/search")
+    async def search():
+        results = await run_blocking(blocking_search)
+        return {"results": results}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    return app
+
+
+def server_timing(response):
+    return dict(
+        (entry.split(";dur=")[0], float(entry.split(";dur=")[1]))
+        for entry in response.headers["Server-Timing"].split(", ")
+    )
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", "stage", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe("embed", value)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="embed",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="embed",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="embed",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="embed"} 3' in lines
+
+
+def test_stage_timings_follow_the_request_onto_the_pool():
+    registry = Metrics()
+
+    def blocking():
+        with registry.stage("search"):
+            pass
+
+    async def handle():
+        timings, token = registry.start_request()
+        try:
+            await run_blocking(blocking)
+        finally:
+            registry.end_request(token)
+        return timings
+
+    timings = asyncio.run(handle())
+    assert "search" in timings.stages, "Timers on the inference pool should reach the request"
+
+    blocking()
+    assert registry.current_request() is None
+    assert 'rag_stage_duration_seconds_count{stage="search"} 2' in registry.render()
+
+
+def test_timed_route_reports_server_timing_and_metrics():
+    client = TestClient(build_app())
+    response = client.get("/api/search")
+    assert response.status_code == 200
+
+    stages = server_timing(response)
+    assert {"search", "endpoint", "serialize", "total"} <= stages.keys()
+    assert stages["search"] >= 2.0
+    assert stages["total"] >= stages["endpoint"] >= stages["search"]
+    # Whether the label carries the router prefix depends on the FastAPI version
+    assert any(
+        line.startswith("rag_request_duration_seconds_count{route=") and '/search"}' in line
+        for line in metrics.render().splitlines()
+    )
+
+
+def test_collectors_expose_component_stats():
+    registry = Metrics()
+    registry.register("query_result_cache", lambda: {"hits": 3, "enabled": True, "histogram": {}})
+    text = registry.render()
+    assert "rag_query_result_cache_hits 3" in text
+    assert "rag_query_result_cache_enabled" not in text
+    assert "rag_query_result_cache_histogram" not in text
+
+
+def test_profile_trace_is_opt_in(tmp_path, monkeypatch):
+    client = TestClient(build_app())
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    response = client.get("/api/search", headers={"X-Profile": "1"})
+    assert "X-Profile-Trace" not in response.headers, "Profiling must be enabled server-side"
+
+    monkeypatch.setattr(settings, "PROFILE_REQUESTS", True)
+    response = client.get("/api/search", headers={"X-Profile": "1"})
+    assert (tmp_path / response.headers["X-Profile-Trace"]).exists()
+    assert "X-Profile-Trace" not in client.get("/api/search").headers
@@ -0,0 +1,69 @@
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.models.documents import Page, Product
+from app.models.payloads import render_batch_response, render_query_response, render_results
+from app.models.schemas import BatchQueryResponse, QueryResponse, SearchResult
+from app.services.record_store import RecordStore
+
+PRODUCT = {"type": "product", "data": {"title": "Café \"Noir\" mug", "description": "Holds 350 ml ☕\nDishwasher safe", "link": "https://example.com/p/1"}}
+PAGE = {"type": "page", "data": {"title": "", "description": "Shipping & returns — 30 days", "link": "https://example.com/returns"}}
+
+
+def results_for(records):
+    return [
+        dict(records.get("product"), score=0.8125),
+        dict(records.get("page"), score=1 / 3),
+    ]
+
+
+def expected_body(model):
+    """Render a response model the way FastAPI does for a response_model route."""
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def search_result(result):
+    model = Product if result["type"] == "product" else Page
+    return SearchResult(source=result["source"], score=result["score"], document=model(**result["data"]))
+
+
+def test_pre_rendered_response_matches_fastapi(tmp_path):
+    records = RecordStore(tmp_path / "documents.records")
+    records.put("product", "docs/products.yaml", PRODUCT)
+    records.put("page", "docs/pages.yaml", PAGE)
+    results = results_for(records)
+
+    expected = QueryResponse(
+        query="mug ☕", results=[search_result(r) for r in results], total_results=2
+    )
+    body = render_query_response("mug ☕", render_results(results)).encode("utf-8")
+    assert body == expected_body(expected)
+
+    batch = BatchQueryResponse(results=[expected, QueryResponse(query="none", results=[], total_results=0)])
+    body = render_batch_response(
+        [("mug ☕", render_results(results)), ("none", render_results([]))]
+    ).encode("utf-8")
+    assert body == expected_body(batch)
+
+
+def test_fragments_survive_a_reload(tmp_path):
+    records = RecordStore(tmp_path / "documents.records")
+    records.put("page", "docs/pages.yaml", PAGE)
+    records.save()
+
+    reloaded = RecordStore(tmp_path / "documents.records")
+    assert reloaded.get("page")["fragment"] == records.get("page")["fragment"]
+    # Results without a fragment (e.g. built outside the store) render the same
+    result = dict(reloaded.get("page"), score=0.5)
+    assert render_results([result]) == render_results([dict(result, fragment=None)])
+
+
+def test_scores_are_clamped_and_unknown_types_skipped():
+    page = dict(PAGE, source="docs/pages.yaml")
+    array, total = render_results([
+        dict(page, score=1.0000001),
+        dict(page, score=-0.2),
+        dict(page, type="video", score=0.9),
+    ])
+    assert total == 2
+    assert '"score":1.0,' in array and '"score":0.0,' in array
@@ -93,6 +93,25 @@ class TestRAGPipeline:
             assert all(isinstance(emb, np.ndarray) for emb in embeddings), "All embeddings should be numpy arrays"
             assert all(emb.shape == embeddings[0].shape for emb in embeddings), "All embeddings should have same dimensions"
 
+    def test_batched_embeddings_match_unbatched(self, embedding_service, processed_chunks):
+        """Test that batched, length-bucketed encoding matches one-at-a-time encoding."""
+        docs = [doc for docs in processed_chunks.values() for doc in docs]
+        batched = embedding_service.generate_embeddings(docs, use_cache=False)
+        unbatched = embedding_service.generate_embeddings(docs, batch_size=1, use_cache=False)
+
+        assert batched.shape == unbatched.shape, "Batching should not change the output shape"
+        np.testing.assert_allclose(batched, unbatched, atol=1e-5)
+        cosine = np.sum(batched * unbatched, axis=1)
+        assert np.all(cosine > 0.99999), "Batched embeddings should match batch_size=1 embeddings"
+
+    def test_embeddings_by_source_preserve_order(self, embedding_service, processed_chunks):
+        """Test that the single-pass embedding returns vectors in per-source input order."""
+        # Bypass the embedding cache, or both sides could be the same cached vectors
+        by_source = embedding_service.generate_embeddings_by_source(processed_chunks, use_cache=False)
+        for source, docs in processed_chunks.items():
+            expected = embedding_service.generate_embeddings(docs, batch_size=1, use_cache=False)
+            np.testing.assert_allclose(by_source[source], expected, atol=1e-5)
+
     @pytest.mark.parametrize("test_case", test_cases, ids=lambda tc: tc["name"])
     def test_query_pipeline(self, populated_vector_store, embedding_service, test_case):
         """Test the complete RAG query pipeline with different test cases."""
@@ -126,6 +145,36 @@ class TestRAGPipeline:
             assert found, \
                 f"Result '{content_lower}' should contain at least one of the keywords: {keywords}"
 
+    def test_model_is_shared(self, embedding_service):
+        """Test that embedding services share one lazily loaded model instance."""
+        other = EmbeddingService()
+        assert other.model is embedding_service.model, "Services should share the registry model"
+
+    def test_query_embedding_cache(self, embedding_service):
+        """Test that repeated queries are served from the query embedding cache."""
+        before = embedding_service.cache_stats()
+        first = embedding_service.generate_query_embedding("Curious  Cat")
+        second = embedding_service.generate_query_embedding("Curious Cat ")
+        after = embedding_service.cache_stats()
+
+        assert second is first, "Equivalent queries should share one cached vector"
+        assert after["hits"] >= before["hits"] + 1, "Repeated query should be a cache hit"
+        assert not first.flags.writeable, "Cached vectors should be read-only"
+
+    def test_batch_query_matches_single_queries(self, populated_vector_store, embedding_service):
+        """Test that a batched query returns the same results as individual queries."""
+        queries = [case["input_query"] for case in test_cases]
+        limits = [settings.MAX_RESULTS, 2]
+
+        embeddings = embedding_service.generate_query_embeddings(queries)
+        batched = populated_vector_store.query_batch(embeddings, limits)
+
+        assert len(batched) == len(queries), "Should get one result list per query"
+        for query, limit, results in zip(queries, limits, batched):
+            single = populated_vector_store.query(embedding_service.generate_query_embedding(query), limit)
+            assert [r["data"] for r in results] == [r["data"] for r in single]
+            assert [r["score"] for r in results] == pytest.approx([r["score"] for r in single], abs=1e-5)
+
     def test_vector_store_operations(self, vector_store, processed_chunks, document_embeddings):
         """Test vector store operations."""
         # Test reset
@@ -0,0 +1,57 @@
+import json
+
+from app.services.record_store import RecordStore
+
+
+def product(title):
+    return {"type": "product", "data": {"title": title, "description": f"All about {title}.", "link": f"/{title}"}}
+
+
+def test_unsaved_changes_overlay_the_saved_segment(tmp_path):
+    records = RecordStore(tmp_path / "documents.records")
+    for name in ("mug", "lamp", "desk"):
+        records.put(name, "products.yml", product(name))
+    records.save()
+
+    records.put("chair", "products.yml", product("chair"))
+    records.put("mug", "products.yml", product("cup"))
+    records.put("lamp", "products.yml", product("lamp"))
+    assert records.delete(["desk", "unknown"]) == 1
+    assert records.count() == 3
+    assert records.get("mug")["data"]["title"] == "cup"
+    assert records.get("desk") is None
+    assert records.ids() == {"mug", "lamp", "chair"}
+    assert records.segment.count == 3, "The segment holds only what was saved"
+    unsaved = sum(
+        len(doc_id) + (len(record["source"]) + len(record["type"]) + sum(map(len, record["data"].values()))
+                       + len(record["fragment"]) if record else 0)
+        for doc_id, record in ((doc_id, records.get(doc_id)) for doc_id in ("chair", "mug", "desk"))
+    )
+    assert records.memory_bytes() == records.segment.nbytes + unsaved
+    records.put("rug", "rugs.yml", product("rug"))
+    assert records.sources() == {"products.yml", "rugs.yml"}
+    records.delete(["rug"])
+    assert records.sources() == {"products.yml"}
+
+    records.save()
+    reopened = RecordStore(tmp_path / "documents.records")
+    assert reopened.count() == 3
+    assert reopened.get("chair")["data"]["title"] == "chair"
+    assert reopened.get("mug")["fragment"] == records.get("mug")["fragment"]
+    assert reopened.segment.titles.lookup("cup")[0].tolist() == [reopened.segment.row("mug")]
+
+
+def test_json_store_is_rewritten_as_a_segment(tmp_path):
+    legacy = tmp_path / "documents.records.json"
+    legacy.write_text(json.dumps({
+        "version": 1,
+        "fields": list(RecordStore.FIELDS),
+        "records": {"mug": ["product", "products.yml", "mug", "A mug.", "/mug"]},
+    }))
+
+    records = RecordStore(tmp_path / "documents.records")
+    assert records.loaded and records.get("mug")["data"]["description"] == "A mug."
+    assert records.get("mug")["fragment"]
+    records.save()
+    assert not legacy.exists()
+    assert RecordStore(tmp_path / "documents.records").get("mug") == records.get("mug")
@@ -0,0 +1,495 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.backends.numpy_backend import NumpyBackend
+from app.services.backends.mmap_backend import MmapBackend
+from app.services.backends.ivf_backend import IVFBackend
+from app.services.backends.base import MetadataFilter
+from app.services.vector_store import VectorStore
+
+DIM = 32
+
+
+def random_documents(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    docs = [
+        {
+            "id": f"doc_{i}",
+            "type": "product" if i % 2 else "page",
+            "data": {"title": f"Title {i}", "description": f"Description {i}", "link": f"/item-{i}"},
+        }
+        for i in range(n)
+    ]
+    return {"source.yml": docs}, {"source.yml": vectors}
+
+
+def random_queries(n, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = rng.normal(size=(n, DIM)).astype(np.float32)
+    return list(queries / np.linalg.norm(queries, axis=1, keepdims=True))
+
+
+@pytest.fixture
+def documents():
+    return random_documents(200)
+
+
+def test_numpy_backend_matches_chroma(tmp_path, documents):
+    docs, embeddings = documents
+    chroma = VectorStore(persist_dir=str(tmp_path / "chroma"), backend="chroma")
+    numpy_store = VectorStore(persist_dir=str(tmp_path / "numpy"), backend="numpy")
+    chroma.add_documents(docs, embeddings)
+    numpy_store.add_documents(docs, embeddings)
+
+    queries = random_queries(10)
+    for expected, actual in zip(chroma.query_batch(queries, [5] * 10), numpy_store.query_batch(queries, [5] * 10)):
+        assert [r["data"]["link"] for r in actual] == [r["data"]["link"] for r in expected]
+        assert [r["score"] for r in actual] == pytest.approx([r["score"] for r in expected], abs=1e-4)
+
+    # Sizes are cached on writes, matching what the collection holds
+    assert chroma.count() == numpy_store.count() == 200
+    assert chroma.backend.memory_bytes() == 200 * DIM * 4
+    chroma.delete_documents(["doc_0", "doc_1"])
+    assert chroma.count() == chroma.backend.collection.count() == 198
+    reopened = VectorStore(persist_dir=str(tmp_path / "chroma"), backend="chroma")
+    assert reopened.backend.memory_bytes() == chroma.backend.memory_bytes() == 198 * DIM * 4
+
+
+def test_numpy_backend_upsert_delete_and_persist(tmp_path, documents):
+    docs, embeddings = documents
+    path = tmp_path / "index.npz"
+    backend = NumpyBackend(path)
+    ids = [doc["id"] for doc in docs["source.yml"]]
+    metadatas = [{"link": doc["data"]["link"]} for doc in docs["source.yml"]]
+    vectors = embeddings["source.yml"]
+    backend.upsert(ids, vectors, metadatas, [None] * len(ids))
+    assert backend.count() == 200
+
+    # Re-upserting an existing ID replaces it rather than adding a row
+    backend.upsert(["doc_0"], vectors[1:2], [{"link": "/replaced"}], [None])
+    assert backend.count() == 200
+
+    backend.delete(["doc_1", "doc_5", "missing"])
+    assert backend.count() == 198
+
+    hits = backend.query([vectors[1]], n_results=1)[0]
+    assert hits[0]["id"] == "doc_0", "Replaced vector should now be nearest to its new embedding"
+    assert hits[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+
+    backend.flush()
+    reloaded = NumpyBackend(path)
+    assert reloaded.count() == 198
+    for query in random_queries(5):
+        assert [h["id"] for h in reloaded.query([query], 10)[0]] == [h["id"] for h in backend.query([query], 10)[0]]
+
+    reloaded.reset()
+    assert NumpyBackend(path).count() == 0
+
+
+def clustered_vectors(n, dim=64, clusters=20, seed=0):
+    """Normalized vectors drawn around a few centroids, like real embeddings."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim))
+    vectors = centroids[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_mmap_backend_recall_against_exact(tmp_path, dtype):
+    vectors = clustered_vectors(3000)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    metadatas = [{"row": i} for i in range(len(vectors))]
+
+    exact = NumpyBackend(tmp_path / "exact.npz")
+    exact.upsert(ids, vectors, metadatas, [None] * len(ids))
+    quantized = MmapBackend(tmp_path / "index.idx", dtype=dtype)
+    quantized.upsert(ids, vectors, metadatas, [None] * len(ids))
+    quantized.flush()
+
+    queries = list(clustered_vectors(50, seed=1))
+    expected = exact.query(queries, 10)
+    actual = MmapBackend(tmp_path / "index.idx", dtype=dtype).query(queries, 10)
+    found = sum(len({h["id"] for h in e} & {h["id"] for h in a}) for e, a in zip(expected, actual))
+    assert found / (10 * len(queries)) >= 0.95, "Quantized search should keep recall@10 above 0.95"
+    for e, a in zip(expected, actual):
+        assert a[0]["distance"] == pytest.approx(e[0]["distance"], abs=0.02)
+
+
+def test_mmap_backend_staged_writes(tmp_path):
+    vectors = clustered_vectors(100)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    path = tmp_path / "index.idx"
+    backend = MmapBackend(path)
+    backend.upsert(ids, vectors, [{"row": i} for i in range(len(ids))], [None] * len(ids))
+
+    # Staged writes are searchable before the file is written
+    assert backend.query([vectors[3]], 1)[0][0]["id"] == "doc_3"
+    backend.flush()
+    assert backend.count() == 100
+
+    mapped = backend.memory_bytes()
+    backend.delete(["doc_3"])
+    backend.upsert(["doc_4"], vectors[7:8], [{"row": 7}], [None])
+    assert backend.count() == 99
+    # Writing the same IDs again shadows no more rows
+    backend.delete(["doc_3", "missing"])
+    backend.upsert(["doc_4", "doc_100"], vectors[7:9], [{"row": 7}, {"row": 8}], [None, None])
+    backend.delete(["doc_100"])
+    assert backend.count() == 99
+    assert backend.memory_bytes() > mapped, "Staged vectors are held in memory"
+    assert backend.query([vectors[3]], 1)[0][0]["id"] != "doc_3"
+    assert {h["id"] for h in backend.query([vectors[7]], 2)[0]} == {"doc_4", "doc_7"}
+    backend.flush()
+    assert backend.memory_bytes() == path.stat().st_size, "The flush empties the staging matrix"
+
+    reopened = MmapBackend(path)
+    assert reopened.count() == 99
+    assert reopened._base_ids is None, "Counting a file without staged writes reads only its header"
+    assert reopened.generation == 2
+    assert {h["id"] for h in reopened.query([vectors[7]], 2)[0]} == {"doc_4", "doc_7"}
+    assert reopened.query([vectors[7]], 1)[0][0]["metadata"] in ({"row": 7},)
+
+    reopened.reset()
+    assert MmapBackend(path).count() == 0
+
+
+def test_mmap_backend_queries_past_staged_writes(tmp_path):
+    vectors = clustered_vectors(200, clusters=1)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    backend = MmapBackend(tmp_path / "index.idx")
+    backend.upsert(ids, vectors, [{"row": i} for i in range(len(ids))], [None] * len(ids))
+    backend.flush()
+
+    # Shadow the file's nearest rows, far more of them than the page holds
+    nearest = [h["id"] for h in backend.query([vectors[0]], 60)[0]]
+    backend.delete(nearest[:40])
+    # Staged vectors point away from the cluster, so only staged writes are near them
+    backend.upsert(nearest[40:50], -vectors[100:110], [{"row": -1}] * 10, [None] * 10)
+    backend.upsert(nearest[40:45], -vectors[110:115], [{"row": -2}] * 5, [None] * 5)
+    backend.delete(nearest[45:48])
+    hits = backend.query([vectors[0]], 5)[0]
+    assert len(hits) == 5
+    assert not {h["id"] for h in hits} & set(nearest[:40] + nearest[45:48])
+    assert backend.count() == 200 - 43
+
+    hits = backend.query([-vectors[100]], 7)[0]
+    assert {h["id"] for h in hits} == set(nearest[40:45] + nearest[48:50])
+    assert all(h["metadata"] == {"row": -2} for h in hits if h["id"] in nearest[40:45]), "Replaced rows are masked"
+
+    backend.flush()
+    reopened = MmapBackend(tmp_path / "index.idx")
+    assert reopened.count() == 200 - 43
+    hits = reopened.query([-vectors[100]], 7)[0]
+    assert {h["id"] for h in hits} == set(nearest[40:45] + nearest[48:50])
+    assert all(h["metadata"] == {"row": -2} for h in hits if h["id"] in nearest[40:45])
+
+
+def test_ivf_backend_recall_and_incremental_inserts(tmp_path):
+    vectors = clustered_vectors(4000)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    metadatas = [{"row": i} for i in range(len(vectors))]
+
+    exact = NumpyBackend(tmp_path / "exact.npz")
+    exact.upsert(ids, vectors, metadatas, [None] * len(ids))
+    ivf = IVFBackend(tmp_path / "ivf.npz", nlist=32, nprobe=8, min_train_size=1000)
+    ivf.upsert(ids[:3000], vectors[:3000], metadatas[:3000], [None] * 3000)
+    ivf.flush()
+    assert ivf.trained
+
+    # Rows inserted after training are assigned to their nearest cell
+    ivf.upsert(ids[3000:], vectors[3000:], metadatas[3000:], [None] * 1000)
+    ivf.delete(["doc_0"])
+    exact.delete(["doc_0"])
+
+    queries = list(clustered_vectors(50, seed=1))
+    expected = exact.query(queries, 10)
+    actual = ivf.query(queries, 10)
+    found = sum(len({h["id"] for h in e} & {h["id"] for h in a}) for e, a in zip(expected, actual))
+    assert found / (10 * len(queries)) >= 0.9, "IVF with nprobe=8 of 32 should keep recall@10 above 0.9"
+    assert ivf.query([vectors[3500]], 1)[0][0]["id"] == "doc_3500"
+
+    ivf.flush()
+    reloaded = IVFBackend(tmp_path / "ivf.npz", nlist=32, nprobe=8, min_train_size=1000)
+    assert reloaded.trained
+    assert reloaded.count() == 3999
+    assert [h["id"] for h in reloaded.query(queries[:5], 10)[0]] == [h["id"] for h in ivf.query(queries[:5], 10)[0]]
+
+
+def test_ivf_backend_is_exact_until_trained(tmp_path):
+    vectors = clustered_vectors(200)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    ivf = IVFBackend(tmp_path / "ivf.npz", min_train_size=1000)
+    ivf.upsert(ids, vectors, [{}] * len(ids), [None] * len(ids))
+    ivf.flush()
+    assert not ivf.trained
+
+    exact = NumpyBackend(tmp_path / "exact.npz")
+    exact.upsert(ids, vectors, [{}] * len(ids), [None] * len(ids))
+    query = list(clustered_vectors(1, seed=3))
+    assert [h["id"] for h in ivf.query(query, 10)[0]] == [h["id"] for h in exact.query(query, 10)[0]]
+
+
+def test_chunk_hits_collapse_to_one_result_per_document(tmp_path):
+    vectors = clustered_vectors(3, dim=DIM)
+    data = {"title": "Guide", "description": "A long guide.", "link": "/guide"}
+    docs = {"pages.yml": [
+        {"id": f"guide#{i}", "type": "page", "data": data, "parent_id": "guide", "chunk": i, "text": f"part {i}"}
+        for i in range(2)
+    ] + [{"id": "other", "type": "page", "data": dict(data, link="/other")}]}
+    store = VectorStore(persist_dir=str(tmp_path), backend="numpy")
+    store.add_documents(docs, {"pages.yml": vectors})
+
+    results = store.query(vectors[1], limit=5)
+    ids = [r["id"] for r in results]
+    assert ids[0] == "guide"
+    assert len(ids) == len(set(ids)), "Each document should appear once"
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-5), "The best matching chunk should score the document"
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy", "ivf", "mmap"])
+def test_many_chunk_document_leaves_room_for_a_full_page(tmp_path, backend):
+    rng = np.random.default_rng(3)
+    query = rng.normal(size=DIM).astype(np.float32)
+    query /= np.linalg.norm(query)
+
+    def near(n, spread):
+        vectors = query + spread * rng.normal(size=(n, DIM)).astype(np.float32) / np.sqrt(DIM)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    data = {"title": "Guide", "description": "A long guide.", "link": "/guide"}
+    # Every chunk of the guide is nearer the query than any other document
+    docs = [
+        {"id": f"guide#{i}", "type": "page", "data": data, "parent_id": "guide", "chunk": i, "text": f"part {i}"}
+        for i in range(30)
+    ] + [{"id": f"page_{i}", "type": "page", "data": dict(data, link=f"/page-{i}")} for i in range(6)]
+    store = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    store.add_documents({"pages.yml": docs}, {"pages.yml": np.vstack([near(30, 0.05), near(6, 0.5)])})
+
+    ids = [r["id"] for r in store.query(query, limit=5)]
+    assert ids[0] == "guide" and len(ids) == 5 == len(set(ids))
+    assert len(store.query(query, limit=10)) == 7, "A store with fewer documents than the limit returns them all"
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy", "ivf", "mmap"])
+def test_filtered_queries_return_a_full_page_of_matches(tmp_path, backend, documents):
+    docs, _ = documents
+    # One tight cluster, so every document clears the score threshold
+    vectors = clustered_vectors(200, dim=DIM, clusters=1)
+    store = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    store.add_documents(docs, {"source.yml": vectors})
+    store.flush()
+
+    queries = list(vectors[:5])
+    where = MetadataFilter(type="product", link_prefix="/item-1")
+    expected_links = {
+        doc["data"]["link"] for doc in docs["source.yml"]
+        if doc["type"] == "product" and doc["data"]["link"].startswith("/item-1")
+    }
+    for results in store.query_batch(queries, [5] * len(queries), where):
+        assert len(results) == 5, "Scoped queries should still fill the page"
+        assert all(r["type"] == "product" and r["data"]["link"] in expected_links for r in results)
+
+    # The filtered ranking is the unfiltered ranking restricted to matches
+    unscoped = store.query_batch(queries, [200] * len(queries))
+    scoped = store.query_batch(queries, [5] * len(queries), where)
+    for full, filtered in zip(unscoped, scoped):
+        matching = [r["data"]["link"] for r in full if r["data"]["link"] in expected_links]
+        assert [r["data"]["link"] for r in filtered] == matching[:5]
+
+
+def test_ivf_filtered_query_widens_past_probed_cells(tmp_path):
+    vectors = clustered_vectors(2000)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    # Only 1% of rows match, far fewer than one probed cell holds
+    metadatas = [{"type": "page" if i % 100 == 0 else "product"} for i in range(len(vectors))]
+    ivf = IVFBackend(tmp_path / "ivf.npz", nlist=32, nprobe=1, min_train_size=1000)
+    ivf.upsert(ids, vectors, metadatas, [None] * len(ids))
+    ivf.flush()
+    assert ivf.trained
+
+    exact = NumpyBackend(tmp_path / "exact.npz")
+    exact.upsert(ids, vectors, metadatas, [None] * len(ids))
+    where = MetadataFilter(type="page")
+    query = list(clustered_vectors(1, seed=3))
+    hits = ivf.query(query, 10, where)[0]
+    assert len(hits) == 10
+    assert [h["id"] for h in hits] == [h["id"] for h in exact.query(query, 10, where)[0]]
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy", "mmap"])
+def test_records_store_each_field_once(tmp_path, backend):
+    docs, embeddings = random_documents(20)
+    store = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    store.add_documents(docs, embeddings)
+    store.flush()
+
+    _, _, metadatas = next(store.backend.scan())
+    assert set(metadatas[0]) == {"source", "type", "link"}, "Only filter fields belong next to the vectors"
+
+    reopened = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    result = reopened.query(embeddings["source.yml"][3], limit=1)[0]
+    assert result["id"] == "doc_3"
+    assert result["data"] == docs["source.yml"][3]["data"]
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy", "mmap"])
+def test_legacy_store_is_migrated_to_compact_records(tmp_path, backend):
+    docs, embeddings = random_documents(20)
+    legacy = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    ids = [doc["id"] for doc in docs["source.yml"]]
+    # The layout written before the record store existed
+    metadatas = [
+        {
+            "source": "source.yml",
+            "type": doc["type"],
+            "title": doc["data"]["title"],
+            "description": doc["data"]["description"],
+            "link": doc["data"]["link"],
+            "content": f"{doc['data']['title']}. {doc['data']['description']}",
+        }
+        for doc in docs["source.yml"]
+    ]
+    documents = [m["content"] for m in metadatas]
+    legacy.backend.upsert(ids, embeddings["source.yml"], metadatas, documents)
+    legacy.backend.flush()
+    (tmp_path / "lexical.json").write_text("{}")
+
+    store = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    assert store.records.count() == 20
+    assert not (tmp_path / "lexical.json").exists()
+    assert store.count() == 20
+    for batch_ids, _, batch_metadatas in store.backend.scan():
+        assert all(set(m) == {"source", "type", "link"} for m in batch_metadatas)
+    hits = store.backend.query([embeddings["source.yml"][7]], 1)[0]
+    assert not hits[0]["document"], "Migrated records should not keep the document text"
+
+    result = store.query(embeddings["source.yml"][7], limit=1)[0]
+    assert result["id"] == "doc_7"
+    assert result["data"] == docs["source.yml"][7]["data"]
+
+
+def test_read_only_store_never_migrates_or_writes(tmp_path):
+    docs, embeddings = random_documents(10)
+    legacy = VectorStore(persist_dir=str(tmp_path), backend="mmap")
+    metadatas = [
+        {"source": "source.yml", "type": doc["type"], **doc["data"]} for doc in docs["source.yml"]
+    ]
+    legacy.backend.upsert([doc["id"] for doc in docs["source.yml"]], embeddings["source.yml"], metadatas,
+                          ["" for _ in metadatas])
+    legacy.backend.flush()
+    index_file = legacy.backend.path
+    written = index_file.stat().st_mtime_ns
+
+    replica = VectorStore(persist_dir=str(tmp_path), backend="mmap", read_only=True)
+    assert not replica.records.loaded, "Migrating is left to the writer"
+    assert not (tmp_path / "documents.records").exists()
+    assert index_file.stat().st_mtime_ns == written
+    for write in (replica.flush, replica.stage, replica.rollback, replica.reset):
+        with pytest.raises(PermissionError):
+            write()
+    assert replica.collect_garbage() == []
+
+    writer = VectorStore(persist_dir=str(tmp_path), backend="mmap")
+    assert writer.records.count() == 10
+    writer.flush()
+    assert replica.reload()
+    assert replica.query(embeddings["source.yml"][4], limit=1)[0]["data"] == docs["source.yml"][4]["data"]
+
+
+@pytest.mark.parametrize("backend", ["numpy", "ivf", "mmap"])
+def test_replicas_load_published_snapshots(tmp_path, backend):
+    docs, embeddings = random_documents(20)
+    writer = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    writer.add_documents({"source.yml": docs["source.yml"][:10]}, {"source.yml": embeddings["source.yml"][:10]})
+    writer.flush()
+
+    replica = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    assert not replica.reload(), "A replica starts from the current snapshot"
+    generation = replica.generation
+
+    writer.add_documents(docs, embeddings)
+    writer.delete_documents(["doc_0"])
+    assert not replica.reload(), "Unflushed writes are not published"
+    writer.flush()
+
+    assert replica.reload()
+    assert replica.generation > generation, "Caches keyed on the generation must be invalidated"
+    assert replica.count() == 19
+    result = replica.query(embeddings["source.yml"][15], limit=1)[0]
+    assert result["id"] == "doc_15"
+    assert result["data"] == docs["source.yml"][15]["data"]
+    assert not replica.reload()
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy", "mmap"])
+def test_staged_versions_swap_in_atomically_and_roll_back(tmp_path, backend):
+    docs, embeddings = random_documents(20)
+    store = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    store.add_documents({"source.yml": docs["source.yml"][:10]}, {"source.yml": embeddings["source.yml"][:10]})
+    store.flush()
+    replica = VectorStore(persist_dir=str(tmp_path), backend=backend)
+
+    staged = store.stage()
+    assert staged.collection_name == "documents-v1"
+    staged.add_documents(docs, embeddings)
+    assert store.count() == 10, "Queries are served from the active version while the next one builds"
+    assert store.query(embeddings["source.yml"][15], limit=1)[0]["id"] != "doc_15"
+    store.activate(staged)
+    assert store.count() == 20
+    assert store.query(embeddings["source.yml"][15], limit=1)[0]["id"] == "doc_15"
+
+    assert replica.reload()
+    assert replica.collection_name == "documents-v1"
+    assert replica.query(embeddings["source.yml"][15], limit=1)[0]["id"] == "doc_15"
+
+    # A second rebuild retires the original version and keeps v1 for rollback
+    staged = store.stage()
+    staged.add_documents({"source.yml": docs["source.yml"][10:]}, {"source.yml": embeddings["source.yml"][10:]})
+    store.activate(staged)
+    assert (store.collection_name, store.previous) == ("documents-v2", "documents-v1")
+    assert not (tmp_path / "documents.records").exists(), "Retired versions are deleted"
+
+    assert store.rollback() == "documents-v1"
+    assert store.count() == 20
+    reopened = VectorStore(persist_dir=str(tmp_path), backend=backend)
+    assert (reopened.collection_name, reopened.previous) == ("documents-v1", "documents-v2")
+    assert reopened.query(embeddings["source.yml"][3], limit=1)[0]["id"] == "doc_3"
+
+
+def test_retired_version_is_deleted_after_in_flight_queries_drain(tmp_path):
+    docs, embeddings = random_documents(20)
+    store = VectorStore(persist_dir=str(tmp_path), backend="numpy")
+    store.add_documents(docs, embeddings)
+    store.flush()
+
+    started, release = threading.Event(), threading.Event()
+    query = store.backend.query
+
+    def slow_query(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return query(*args, **kwargs)
+
+    store.backend.query = slow_query
+    results = []
+    thread = threading.Thread(target=lambda: results.append(store.query(embeddings["source.yml"][4], limit=1)))
+    thread.start()
+    assert started.wait(5)
+
+    for _ in range(2):
+        staged = store.stage()
+        staged.add_documents(docs, embeddings)
+        store.activate(staged)
+    assert store.collection_name == "documents-v2"
+    assert (tmp_path / "numpy" / "documents.npz").exists(), "A version still being queried is kept"
+
+    release.set()
+    thread.join(5)
+    assert results[0][0]["id"] == "doc_4", "The in-flight query completes on the version it started on"
+    assert not (tmp_path / "numpy" / "documents.npz").exists()
+    assert not (tmp_path / "documents.records").exists()